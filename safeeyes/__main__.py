@@ -32,6 +32,12 @@ def main():
     """Start the Safe Eyes."""
     system_locale = translations.setup()
 
+    if "--simulate" in sys.argv:
+        # Opens no window and needs no running instance, but still imports GTK
+        from safeeyes import simulation
+
+        sys.exit(simulation.main(sys.argv[1:]))
+
     config = Config.load()
 
     safe_eyes = SafeEyes(system_locale, config)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Break catalogs stored outside of safeeyes.json.
+
+Additional breaks can be provided as JSON-lines files in the breaks.d directory of
+the config directory. Files named short_breaks*.jsonl add short breaks, and files
+named long_breaks*.jsonl add long breaks, after the ones in safeeyes.json. Every
+line is one break, in the same format as in safeeyes.json:
+
+    {"name": "Look away", "duration": 20, "image": "look_away.png"}
+
+Empty lines and lines starting with # are ignored. Relative image paths are
+resolved against the directory of the file, and then against the resources.
+
+The files are only indexed when they are loaded - the breaks are decoded once the
+break queue reaches them. These breaks can not be edited in the settings.
+"""
+
+import array
+import json
+import logging
+import os
+import typing
+
+from safeeyes import utility
+
+CATALOG_TYPES = ("short_breaks", "long_breaks")
+CATALOG_EXTENSION = ".jsonl"
+
+# path -> catalog, reused as long as the file does not change
+__catalogs: dict[str, "BreakCatalog"] = {}
+
+
+class BreakCatalog:
+    """The index of a JSON-lines break catalog."""
+
+    path: str
+    # (st_mtime_ns, st_size) of the indexed file
+    stat: tuple[int, int]
+
+    def __init__(self, path: str, stat: tuple[int, int]) -> None:
+        self.path = path
+        self.stat = stat
+        # byte offset of every break in the file
+        self.__offsets = array.array("Q")
+
+        offset = 0
+        with open(path, "rb") as catalog_file:
+            for line in catalog_file:
+                content = line.strip()
+                if content and not content.startswith(b"#"):
+                    self.__offsets.append(offset)
+                offset += len(line)
+
+    def __len__(self) -> int:
+        return len(self.__offsets)
+
+    def get(self, index: int) -> dict:
+        """Decode the break config at the given index.
+
+        Raises ValueError if the line is not a valid break.
+        """
+        with open(self.path, "rb") as catalog_file:
+            catalog_file.seek(self.__offsets[index])
+            break_config = json.loads(catalog_file.readline())
+
+        if not isinstance(break_config, dict) or not isinstance(
+            break_config.get("name"), str
+        ):
+            raise ValueError("a break must be an object with a name")
+
+        image = break_config.get("image")
+        if image:
+            break_config["image"] = self.__resolve_image(image)
+        return break_config
+
+    def location(self, index: int) -> str:
+        """Describe where the break at the given index is, for error messages."""
+        return "{}@{}".format(self.path, self.__offsets[index])
+
+    def __resolve_image(self, image: str) -> typing.Optional[str]:
+        path = os.path.join(os.path.dirname(self.path), image)
+        if os.path.isfile(path):
+            return path
+        return utility.get_resource_path(image)
+
+
+def load_catalogs(catalog_type: str) -> list[BreakCatalog]:
+    """Load the catalogs of the given type ("short_breaks" or "long_breaks").
+
+    Catalogs that did not change since they were last loaded are not indexed again.
+    """
+    try:
+        file_names = sorted(os.listdir(utility.BREAKS_DIRECTORY))
+    except OSError:
+        # No catalogs
+        return []
+
+    catalogs = []
+    for file_name in file_names:
+        if not (
+            file_name.startswith(catalog_type) and file_name.endswith(CATALOG_EXTENSION)
+        ):
+            continue
+
+        path = os.path.join(utility.BREAKS_DIRECTORY, file_name)
+        try:
+            stat_result = os.stat(path)
+            stat = (stat_result.st_mtime_ns, stat_result.st_size)
+            catalog = __catalogs.get(path)
+            if catalog is None or catalog.stat != stat:
+                catalog = BreakCatalog(path, stat)
+                __catalogs[path] = catalog
+                logging.info("Indexed %d breaks in %s", len(catalog), path)
+        except OSError:
+            logging.exception("Failed to load the break catalog %s", path)
+            continue
+
+        catalogs.append(catalog)
+
+    return catalogs
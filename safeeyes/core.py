@@ -20,26 +20,25 @@
 
 import datetime
 import logging
+import math
 import typing
 
+from safeeyes.history import BreakEvent, BreakHistory
 from safeeyes.model import Break
 from safeeyes.model import BreakType
 from safeeyes.model import BreakQueue
 from safeeyes.model import EventHook
+from safeeyes.model import PendingResult
 from safeeyes.model import State
 from safeeyes.model import Config
-
-import gi
-
-gi.require_version("GLib", "2.0")
-from gi.repository import GLib
+from safeeyes.timers import Timer, TimerService
 
 
 class SafeEyesCore:
     """Core of Safe Eyes runs the scheduler and notifies the breaks."""
 
+    # wall-clock time of the next break, only used for display purposes
     scheduled_next_break_time: typing.Optional[datetime.datetime] = None
-    scheduled_next_break_timestamp: int = -1
     running: bool = False
     paused_time: float = -1
     postpone_duration: int = 0
@@ -48,22 +47,41 @@ class SafeEyesCore:
 
     _break_queue: typing.Optional[BreakQueue] = None
 
-    # set while __wait_for is running
-    _timeout_id: typing.Optional[int] = None
+    # monotonic deadline of the next break, see TimerService.monotonic_time
+    _next_break_deadline: typing.Optional[float] = None
+    # monotonic deadline requested through start(next_break_time)
+    _requested_break_deadline: typing.Optional[float] = None
+
+    # set while __wait_until is running
+    _timer: typing.Optional[Timer] = None
     _callback: typing.Optional[typing.Callable[[], None]] = None
 
     # set while __fire_hook is running
     _firing_hook: bool = False
 
+    # set while waiting for the handlers of __fire_hook_async
+    _pending_result: typing.Optional[PendingResult] = None
+    _result_callback: typing.Optional[typing.Callable[[bool], None]] = None
+
+    # records the breaks, if set
+    history: typing.Optional[BreakHistory] = None
+
     # set while taking a break
-    _countdown: typing.Optional[int] = 0
+    _break_start_time: typing.Optional[float] = None
+    _break_end_deadline: typing.Optional[float] = None
+    _last_countdown: typing.Optional[int] = None
     _taking_break: typing.Optional[Break] = None
 
     # set to true when a break was requested
     _take_break_now: bool = False
 
-    def __init__(self, context) -> None:
-        """Create an instance of SafeEyesCore and initialize the variables."""
+    def __init__(
+        self, context, timer_service: typing.Optional[TimerService] = None
+    ) -> None:
+        """Create an instance of SafeEyesCore and initialize the variables.
+
+        The timer_service can be replaced to drive the core without a GLib main loop.
+        """
         # This event is fired before <time-to-prepare> for a break
         self.on_pre_break = EventHook()
         # This event is fired just before the start of a break
@@ -76,27 +94,43 @@ class SafeEyesCore:
         self.on_stop_break = EventHook()
         # This event is fired when deciding the next break time
         self.on_update_next_break = EventHook()
+        # Timers of the core, the UI and the plugins share this service
+        self.timer_service = timer_service or TimerService()
         self.context = context
         self.context["skipped"] = False
         self.context["postponed"] = False
         self.context["skip_button_disabled"] = False
         self.context["postpone_button_disabled"] = False
+        # id of the plugin that skipped the last break before it was shown
+        self.context["vetoed_by"] = None
         self.context["state"] = State.WAITING
 
     def initialize(self, config: Config):
         """Initialize the internal properties from configuration."""
         logging.info("Initialize the core")
-        self.pre_break_warning_time = config.get("pre_break_warning_time")
         self._break_queue = BreakQueue.create(config, self.context)
-        self.default_postpone_duration = int(config.get("postpone_duration"))
-        self.postpone_unit = config.get("postpone_unit")
+        self.update_settings(config)
+
+    def update_settings(self, config: Config) -> None:
+        """Apply the settings that do not affect the break queue.
+
+        Unlike initialize(), this keeps the schedule of the next break.
+        """
+        settings = config.snapshot()
+        self.pre_break_warning_time = settings.pre_break_warning_time
+        self.default_postpone_duration = int(settings.postpone_duration)
+        self.postpone_unit = settings.postpone_unit
         if self.postpone_unit != "seconds":
             self.default_postpone_duration *= 60
 
         self.postpone_duration = self.default_postpone_duration
 
     def start(self, next_break_time=-1, reset_breaks=False) -> None:
-        """Start Safe Eyes is it is not running already."""
+        """Start Safe Eyes is it is not running already.
+
+        If next_break_time is given, it is a wall-clock timestamp for the next break.
+        It is converted to a monotonic deadline right away.
+        """
         if self._break_queue is None:
             logging.info("No breaks defined, not starting the core")
             return
@@ -107,16 +141,30 @@ class SafeEyesCore:
                 self._break_queue.reset()
 
             self.running = True
-            self.scheduled_next_break_timestamp = int(next_break_time)
+            if next_break_time > 0:
+                self._requested_break_deadline = self.timer_service.monotonic_time() + (
+                    next_break_time - self.timer_service.time()
+                )
+            else:
+                self._requested_break_deadline = None
             self.__scheduler_job()
 
-    def stop(self, is_resting=False) -> None:
-        """Stop Safe Eyes if it is running."""
+    def stop(
+        self, is_resting=False, paused_since: typing.Optional[float] = None
+    ) -> None:
+        """Stop Safe Eyes if it is running.
+
+        paused_since is the boot_time() at which the pause started, if that was
+        earlier than now.
+        """
         if not self.running:
             return
 
         logging.info("Stop Safe Eyes core")
-        self.paused_time = datetime.datetime.now().timestamp()
+        if paused_since is not None:
+            self.paused_time = paused_since
+        else:
+            self.paused_time = self.timer_service.boot_time()
         # Stop the break thread
         self.running = False
         if self.context["state"] != State.QUIT:
@@ -124,6 +172,15 @@ class SafeEyesCore:
 
         self.__wakeup_scheduler()
 
+    def refresh_next_break(self) -> None:
+        """Pass the scheduled next break to the listeners again."""
+        if (
+            self.running
+            and self.context["state"] == State.WAITING
+            and self.scheduled_next_break_time is not None
+        ):
+            self.__fire_on_update_next_break(self.scheduled_next_break_time)
+
     def skip(self) -> None:
         """User skipped the break using Skip button."""
         self.context["skipped"] = True
@@ -143,11 +200,11 @@ class SafeEyesCore:
         """Returns the next break time."""
         if self._break_queue is None:
             return None
-        break_obj = self._break_queue.get_break_with_type(break_type)
-        if not break_obj or self.scheduled_next_break_time is None:
+        upcoming = self._break_queue.get_upcoming(break_type)
+        if upcoming is None or self.scheduled_next_break_time is None:
             return None
         time = self.scheduled_next_break_time + datetime.timedelta(
-            minutes=break_obj.time - self._break_queue.get_break().time
+            minutes=upcoming.offset
         )
         return time
 
@@ -189,12 +246,11 @@ class SafeEyesCore:
             # This will only be called by methods which check this
             return
 
-        current_time = datetime.datetime.now()
-        current_timestamp = current_time.timestamp()
+        current_time = self.timer_service.monotonic_time()
 
         if self.context["state"] == State.RESTING and self.paused_time > -1:
             # Safe Eyes was resting
-            paused_duration = int(current_timestamp - self.paused_time)
+            paused_duration = int(self.timer_service.boot_time() - self.paused_time)
             self.paused_time = -1
             next_long = self._break_queue.get_break_with_type(BreakType.LONG_BREAK)
             if next_long is not None and paused_duration > next_long.duration:
@@ -211,18 +267,20 @@ class SafeEyesCore:
             logging.info("Prepare for postponed break")
             time_to_wait = self.postpone_duration
             self.context["postponed"] = False
-        elif current_timestamp < self.scheduled_next_break_timestamp:
+        elif (
+            self._requested_break_deadline is not None
+            and current_time < self._requested_break_deadline
+        ):
             # Non-standard break was set.
-            time_to_wait = round(
-                self.scheduled_next_break_timestamp - current_timestamp
-            )
-            self.scheduled_next_break_timestamp = -1
+            time_to_wait = round(self._requested_break_deadline - current_time)
         else:
             # Use next break, convert to seconds
             time_to_wait = self._break_queue.get_break().time * 60
+        self._requested_break_deadline = None
 
-        self.scheduled_next_break_time = current_time + datetime.timedelta(
-            seconds=time_to_wait
+        self._next_break_deadline = current_time + time_to_wait
+        self.scheduled_next_break_time = datetime.datetime.fromtimestamp(
+            self.timer_service.time() + time_to_wait
         )
         self.context["state"] = State.WAITING
         self.__fire_on_update_next_break(self.scheduled_next_break_time)
@@ -233,15 +291,19 @@ class SafeEyesCore:
         else:
             logging.info("Waiting for %d minutes until next break", (time_to_wait / 60))
 
-        self.__wait_for(time_to_wait, self.__do_pre_break)
+        self.__wait_until(self._next_break_deadline, self.__do_pre_break)
 
     def __fire_on_update_next_break(self, next_break_time: datetime.datetime) -> None:
         """Pass the next break information to the registered listeners."""
         if self._break_queue is None:
             # This will only be called by methods which check this
             return
+        # Nothing depends on the result, so slow handlers are not waited for
         self.__fire_hook(
-            self.on_update_next_break, self._break_queue.get_break(), next_break_time
+            self.on_update_next_break,
+            self._break_queue.get_break(),
+            next_break_time,
+            wait=False,
         )
 
     def __do_pre_break(self) -> None:
@@ -266,9 +328,19 @@ class SafeEyesCore:
             # This will only be called by methods which check this
             return
         self.context["state"] = State.PRE_BREAK
-        proceed = self.__fire_hook(self.on_pre_break, self._break_queue.get_break())
+        self.context["vetoed_by"] = None
+        self.__fire_hook_async(
+            self.on_pre_break, self.__on_pre_break_result, self._break_queue.get_break()
+        )
+
+    def __on_pre_break_result(self, proceed: bool) -> None:
+        if not self.running:
+            # Stopped while waiting for the plugins
+            return
         if not proceed:
             # Plugins wanted to ignore this break
+            if self._break_queue is not None:
+                self.__record_break(self._break_queue.get_break(), vetoed=True)
             self.__start_next_break()
             return
 
@@ -279,10 +351,19 @@ class SafeEyesCore:
             "Wait for %d seconds before the break", self.pre_break_warning_time
         )
         # Wait for the pre break warning period
-        self.__wait_for(self.pre_break_warning_time, self.__do_start_break)
+        # This is relative to the break deadline, so that slow on_pre_break handlers do
+        # not push the break further back
+        if self._next_break_deadline is not None:
+            deadline = self._next_break_deadline + self.pre_break_warning_time
+        else:
+            deadline = self.timer_service.monotonic_time() + self.pre_break_warning_time
+        self.__wait_until(deadline, self.__do_start_break)
 
     def __postpone_break(self) -> None:
-        self.__wait_for(self.postpone_duration, self.__do_start_break)
+        self._next_break_deadline = (
+            self.timer_service.monotonic_time() + self.postpone_duration
+        )
+        self.__wait_until(self._next_break_deadline, self.__do_start_break)
 
     def __do_start_break(self) -> None:
         if self._take_break_now:
@@ -294,15 +375,30 @@ class SafeEyesCore:
         if self._break_queue is None:
             # This will only be called by methods which check this
             return
-        break_obj = self._break_queue.get_break()
         # Show the break screen
-        proceed = self.__fire_hook(self.on_start_break, break_obj)
+        self.context["vetoed_by"] = None
+        self.__fire_hook_async(
+            self.on_start_break,
+            self.__on_start_break_result,
+            self._break_queue.get_break(),
+        )
+
+    def __on_start_break_result(self, proceed: bool) -> None:
+        if not self.running:
+            # Stopped while waiting for the plugins
+            return
+        if self._break_queue is None:
+            # This will only be called by methods which check this
+            return
+        break_obj = self._break_queue.get_break()
         if not proceed:
             # Plugins want to ignore this break
+            self.__record_break(break_obj, vetoed=True)
             self.__start_next_break()
             return
         if self.context["postponed"]:
             # Plugins want to postpone this break
+            self.__record_break(break_obj)
             self.context["postponed"] = False
 
             if self.scheduled_next_break_time is None:
@@ -328,38 +424,97 @@ class SafeEyesCore:
         self.context["state"] = State.BREAK
         break_obj = self._break_queue.get_break()
         self._taking_break = break_obj
-        self._countdown = break_obj.duration
+        self._break_start_time = self.timer_service.time()
+        # The end of the break is fixed once, every tick derives the remaining time
+        # from it. This way, main loop stalls do not make the break longer.
+        self._break_end_deadline = (
+            self.timer_service.monotonic_time() + break_obj.duration
+        )
+        self._last_countdown = None
 
         self.__cycle_break_countdown()
 
     def __cycle_break_countdown(self) -> None:
-        if self._taking_break is None or self._countdown is None:
+        if self._taking_break is None or self._break_end_deadline is None:
             raise Exception("countdown running without countdown or break")
 
         if self._take_break_now:
             logging.warning("Break requested while already taking a break")
             self._take_break_now = False
 
+        # Seconds left in the break, rounded the same way as __on_wakeup tolerates
+        # early wakeups
+        countdown = max(
+            0,
+            math.ceil(
+                self._break_end_deadline - self.timer_service.monotonic_time() - 0.5
+            ),
+        )
+
         if (
-            self._countdown > 0
+            countdown > 0
             and self.running
             and not self.context["skipped"]
             and not self.context["postponed"]
         ):
-            countdown = self._countdown
-            self._countdown -= 1
-
-            total_break_time = self._taking_break.duration
-            seconds = total_break_time - countdown
-            self.__fire_hook(self.on_count_down, countdown, seconds)
-            # Sleep for 1 second
-            self.__wait_for(1, self.__cycle_break_countdown)
+            if countdown != self._last_countdown:
+                # If the main loop lagged, the skipped ticks are not delivered
+                self.__fire_count_down(countdown)
+
+            # Sleep until the next full second of the break
+            self.__wait_until(
+                self._break_end_deadline - (countdown - 1),
+                self.__cycle_break_countdown,
+            )
         else:
-            self._countdown = None
+            if self._break_start_time is not None:
+                duration = self._taking_break.duration - (
+                    self._break_end_deadline - self.timer_service.monotonic_time()
+                )
+                self.__record_break(
+                    self._taking_break,
+                    started=self._break_start_time,
+                    duration=min(max(0, duration), self._taking_break.duration),
+                )
+            self._break_start_time = None
+            self._break_end_deadline = None
+            self._last_countdown = None
             self._taking_break = None
 
             self.__fire_stop_break()
 
+    def __record_break(
+        self,
+        break_obj: Break,
+        started: typing.Optional[float] = None,
+        duration: float = 0,
+        vetoed: bool = False,
+    ) -> None:
+        """Add the outcome of the break to the history."""
+        if self.history is None or self.scheduled_next_break_time is None:
+            return
+        self.history.record(
+            BreakEvent(
+                type=break_obj.type,
+                name=break_obj.name,
+                scheduled=self.scheduled_next_break_time.timestamp(),
+                started=started,
+                duration=duration,
+                skipped=self.context["skipped"],
+                postponed=self.context["postponed"],
+                vetoed_by=(self.context["vetoed_by"] or "unknown") if vetoed else None,
+            )
+        )
+
+    def __fire_count_down(self, countdown: int) -> None:
+        """Pass the remaining and elapsed seconds of the break to the listeners."""
+        if self._taking_break is None:
+            # This will only be called by methods which check this
+            return
+        self._last_countdown = countdown
+        seconds = self._taking_break.duration - countdown
+        self.__fire_hook(self.on_count_down, countdown, seconds)
+
     def __fire_stop_break(self) -> None:
         # Loop terminated because of timeout (not skipped) -> Close the break alert
         if not self.context["skipped"] and not self.context["postponed"]:
@@ -377,31 +532,41 @@ class SafeEyesCore:
         duration: int,
         callback: typing.Callable[[], None],
     ) -> None:
-        """Wait until someone wake up or the timeout happens."""
-        if self._callback is not None or self._timeout_id is not None:
+        """Wait until someone wake up or the given number of seconds passed."""
+        self.__wait_until(self.timer_service.monotonic_time() + duration, callback)
+
+    def __wait_until(
+        self,
+        deadline: float,
+        callback: typing.Callable[[], None],
+    ) -> None:
+        """Wait until someone wake up or the monotonic deadline is reached."""
+        if (
+            self._callback is not None
+            or self._timer is not None
+            or self._pending_result is not None
+        ):
             raise Exception("this should not be called reentrantly")
 
         self._callback = callback
-        self._timeout_id = GLib.timeout_add_seconds(duration, self.__on_wakeup)
+        self._timer = self.timer_service.set_deadline(deadline, self.__on_wakeup)
 
-    def __on_wakeup(self) -> bool:
-        if self._callback is None or self._timeout_id is None:
+    def __on_wakeup(self) -> None:
+        if self._callback is None or self._timer is None:
             raise Exception("Woken up but no callback")
 
         callback = self._callback
 
-        self._timeout_id = None
+        self._timer = None
         self._callback = None
 
         callback()
 
-        # This signals that the callback should only be called once
-        return GLib.SOURCE_REMOVE
-
     def __fire_hook(
         self,
         hook: EventHook,
         *args,
+        wait: bool = True,
         **kwargs,
     ) -> bool:
         if self._firing_hook:
@@ -409,14 +574,72 @@ class SafeEyesCore:
 
         self._firing_hook = True
 
-        proceed = hook.fire(*args, **kwargs)
+        if wait:
+            proceed = hook.fire(*args, **kwargs)
+        else:
+            proceed = hook.fire_async(*args) is not False
 
         self._firing_hook = False
 
         return proceed
 
+    def __fire_hook_async(
+        self,
+        hook: EventHook,
+        callback: typing.Callable[[bool], None],
+        *args,
+    ) -> None:
+        """Fire the hook, and call the callback once all handlers returned.
+
+        Handlers may return a PendingResult. Until it resolves, the core waits like
+        in __wait_until, and can be woken up by stop().
+        """
+        if self._firing_hook:
+            raise Exception("this should not be called reentrantly")
+
+        self._firing_hook = True
+
+        result = hook.fire_async(*args)
+
+        self._firing_hook = False
+
+        if not isinstance(result, PendingResult):
+            callback(result)
+            return
+
+        if self._callback is not None or self._pending_result is not None:
+            raise Exception("this should not be called reentrantly")
+
+        self._pending_result = result
+        self._result_callback = callback
+        result.add_done_callback(self.__on_hook_result)
+
+    def __on_hook_result(self, result: PendingResult) -> None:
+        if result is not self._pending_result:
+            # The core was woken up before the handlers finished
+            return
+        if self._result_callback is None:
+            raise Exception("Result received but no callback")
+
+        callback = self._result_callback
+
+        self._pending_result = None
+        self._result_callback = None
+
+        callback(result.result)
+
     def __wakeup_scheduler(self) -> None:
-        if (self._callback is None) != (self._timeout_id is None):
+        if self._pending_result is not None:
+            # Stop waiting for the plugins, the callback checks whether the core is
+            # still running
+            result_callback = self._result_callback
+            self._pending_result = None
+            self._result_callback = None
+            if result_callback is not None:
+                result_callback(True)
+            return
+
+        if (self._callback is None) != (self._timer is None):
             # either both are set or none are set
             raise Exception("This should never happen")
 
@@ -427,11 +650,11 @@ class SafeEyesCore:
             # both are set
             raise Exception("This should never happen")
 
-        if self._callback is not None and self._timeout_id is not None:
+        if self._callback is not None and self._timer is not None:
             callback = self._callback
 
-            GLib.source_remove(self._timeout_id)
-            self._timeout_id = None
+            self._timer.cancel()
+            self._timer = None
             self._callback = None
 
             callback()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Watch the files in the config directory, to reload them while running.
+
+Tools that manage the config usually write a file in several steps, so the
+callbacks are only called once no change happened for DEBOUNCE_SECONDS.
+"""
+
+import logging
+import os
+import typing
+
+import gi
+
+gi.require_version("Gio", "2.0")
+from gi.repository import Gio
+
+from safeeyes import utility
+from safeeyes.timers import Timer, TimerService
+
+# seconds to wait for more changes before reloading
+DEBOUNCE_SECONDS = 1
+
+
+class FileMonitor:
+    """Watches the config files, the custom stylesheet and the user plugins."""
+
+    def __init__(
+        self,
+        timer_service: TimerService,
+        on_config_changed: typing.Callable[[], None],
+        on_style_changed: typing.Callable[[], None],
+        on_plugin_changed: typing.Callable[[str], None],
+    ) -> None:
+        self.__timer_service = timer_service
+        self.__on_config_changed = on_config_changed
+        self.__on_style_changed = on_style_changed
+        self.__on_plugin_changed = on_plugin_changed
+        # path -> Gio.FileMonitor, the monitors stop once they are not referenced
+        self.__monitors: dict[str, Gio.FileMonitor] = {}
+        # pending reloads, by the path or plugin they reload
+        self.__pending: dict[str, Timer] = {}
+
+    def start(self) -> None:
+        """Start watching the files."""
+        self.__watch(utility.CONFIG_FILE_PATH, directory=False)
+        for path in utility.POLICY_CONFIG_FILE_PATHS:
+            self.__watch(path, directory=False)
+        self.__watch(utility.CUSTOM_STYLE_SHEET_PATH, directory=False)
+        self.__watch(utility.USER_PLUGINS_DIR, directory=True)
+        if os.path.isdir(utility.USER_PLUGINS_DIR):
+            for plugin_id in os.listdir(utility.USER_PLUGINS_DIR):
+                self.__watch_plugin(plugin_id)
+
+    def stop(self) -> None:
+        """Stop watching the files, and drop the pending reloads."""
+        for monitor in self.__monitors.values():
+            monitor.cancel()
+        self.__monitors.clear()
+        for timer in self.__pending.values():
+            timer.cancel()
+        self.__pending.clear()
+
+    def on_path_changed(self, path: str) -> None:
+        """Schedule the reload for a changed path."""
+        if path == utility.CONFIG_FILE_PATH or path in utility.POLICY_CONFIG_FILE_PATHS:
+            # Debounce the config files together, they are merged into one config
+            self.__schedule(utility.CONFIG_FILE_PATH, self.__on_config_changed)
+        elif path == utility.CUSTOM_STYLE_SHEET_PATH:
+            self.__schedule(path, self.__on_style_changed)
+        else:
+            relative_path = os.path.relpath(path, utility.USER_PLUGINS_DIR)
+            if relative_path == "." or relative_path.startswith(".."):
+                return
+            plugin_id = relative_path.split(os.sep)[0]
+            if plugin_id.startswith(".") or plugin_id == "__pycache__":
+                return
+            if relative_path == plugin_id:
+                # A plugin was added or replaced
+                self.__watch_plugin(plugin_id)
+            elif relative_path.split(os.sep)[1] == "__pycache__":
+                # Written by importing the plugin
+                return
+            self.__schedule(plugin_id, self.__on_plugin_changed, plugin_id)
+
+    def __watch_plugin(self, plugin_id: str) -> None:
+        path = os.path.join(utility.USER_PLUGINS_DIR, plugin_id)
+        if os.path.isdir(path):
+            self.__watch(path, directory=True)
+
+    def __watch(self, path: str, directory: bool) -> None:
+        previous = self.__monitors.pop(path, None)
+        if previous is not None:
+            previous.cancel()
+
+        file = Gio.File.new_for_path(path)
+        try:
+            if directory:
+                monitor = file.monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+            else:
+                monitor = file.monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        except Exception:
+            logging.warning("Failed to watch %s for changes", path)
+            return
+
+        monitor.connect("changed", self.__on_event)
+        self.__monitors[path] = monitor
+
+    def __on_event(self, monitor, file, other_file, event_type) -> None:
+        if event_type in (
+            Gio.FileMonitorEvent.ATTRIBUTE_CHANGED,
+            Gio.FileMonitorEvent.PRE_UNMOUNT,
+            Gio.FileMonitorEvent.UNMOUNTED,
+        ):
+            return
+
+        for changed_file in (file, other_file):
+            if changed_file is not None:
+                path = changed_file.get_path()
+                if path is not None:
+                    self.on_path_changed(path)
+
+    def __schedule(self, key: str, callback: typing.Callable, *args) -> None:
+        timer = self.__pending.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self.__pending[key] = self.__timer_service.set_timeout(
+            DEBOUNCE_SECONDS, self.__fire, key, callback, *args
+        )
+
+    def __fire(self, key: str, callback: typing.Callable, *args) -> None:
+        del self.__pending[key]
+        logging.info("Reload after changes to %s", key)
+        callback(*args)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""The history of all breaks, stored in an SQLite database.
+
+The core records every break once it is over. The records are inserted in batches
+by a background thread. Plugins can query statistics through
+context["api"]["get_break_stats"], which are answered by the same thread with its
+connection, after the breaks recorded before. Code running in the main thread uses
+context["api"]["request_break_stats"] instead, which does not wait for the answer.
+"""
+
+import concurrent.futures
+import dataclasses
+import datetime
+import logging
+import queue
+import sqlite3
+import threading
+import typing
+from contextlib import closing
+
+from safeeyes import utility
+from safeeyes.model import BreakType
+
+# increase when the schema changes, and migrate the old schema in __create_schema
+SCHEMA_VERSION = 1
+# seconds to wait for the answer to a query, before giving up
+QUERY_TIMEOUT = 2
+STATS_COLUMNS = (
+    "COUNT(started), SUM(started IS NOT NULL AND NOT skipped AND NOT postponed),"
+    " SUM(skipped), SUM(postponed), COUNT(vetoed_by), SUM(duration)"
+)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class BreakEvent:
+    """The record of a single break."""
+
+    type: BreakType
+    name: str
+    # timestamp at which the break was scheduled
+    scheduled: float
+    # timestamp at which the break screen was shown, or None if it was not shown
+    started: typing.Optional[float] = None
+    # seconds the break screen was shown
+    duration: float = 0
+    skipped: bool = False
+    postponed: bool = False
+    # id of the plugin that skipped the break before it was shown
+    vetoed_by: typing.Optional[str] = None
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class BreakStats:
+    """Statistics of the breaks in a period."""
+
+    # breaks shown, including the ones that were skipped or postponed
+    breaks: int = 0
+    # breaks shown until the end
+    completed: int = 0
+    skipped: int = 0
+    postponed: int = 0
+    # breaks skipped by a plugin before they were shown
+    vetoed: int = 0
+    # seconds of all breaks shown
+    duration: float = 0
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class _Query:
+    """A query to be answered by the background thread."""
+
+    sql: str
+    parameters: list
+    result: concurrent.futures.Future
+
+
+class BreakHistory:
+    """The break history database."""
+
+    closed: bool = False
+
+    def __init__(self, path: str) -> None:
+        self.__path = path
+        self.__queue: queue.Queue[typing.Union[BreakEvent, _Query, None]] = (
+            queue.Queue()
+        )
+        self.__writer = threading.Thread(
+            target=self.__write_events, name="WorkThread BreakHistory", daemon=True
+        )
+        self.__writer.start()
+
+    def record(self, event: BreakEvent) -> None:
+        """Store the event. It is written by the background thread."""
+        if self.closed:
+            logging.warning("Break recorded after the history was closed")
+            return
+        self.__queue.put(event)
+
+    def flush(self) -> None:
+        """Wait until all recorded events are written."""
+        if not self.closed:
+            self.__queue.join()
+
+    def close(self) -> None:
+        """Write the recorded events, and stop the background thread."""
+        if not self.closed:
+            self.closed = True
+            self.__queue.put(None)
+            self.__writer.join()
+
+    def stats(
+        self,
+        since: typing.Optional[datetime.datetime] = None,
+        until: typing.Optional[datetime.datetime] = None,
+        break_type: typing.Optional[BreakType] = None,
+    ) -> BreakStats:
+        """Return the statistics of the breaks scheduled in the given period."""
+        (where, parameters) = self.__filter(since, until, break_type)
+        rows = self.__query(
+            "SELECT " + STATS_COLUMNS + " FROM breaks" + where, parameters
+        )
+        return self.__to_stats(rows[0]) if rows else BreakStats()
+
+    def request_stats(
+        self,
+        callback: typing.Callable[[BreakStats], None],
+        since: typing.Optional[datetime.datetime] = None,
+        until: typing.Optional[datetime.datetime] = None,
+        break_type: typing.Optional[BreakType] = None,
+    ) -> None:
+        """Pass the statistics of the breaks scheduled in the given period to the
+        callback, in the main thread. This does not wait for the background thread.
+        """
+        if self.closed:
+            return
+        (where, parameters) = self.__filter(since, until, break_type)
+        query = _Query(
+            "SELECT " + STATS_COLUMNS + " FROM breaks" + where,
+            parameters,
+            concurrent.futures.Future(),
+        )
+
+        def on_answered(result: concurrent.futures.Future) -> None:
+            try:
+                rows = result.result()
+            except sqlite3.Error:
+                logging.exception("Failed to query the break history")
+                return
+            callback(self.__to_stats(rows[0]) if rows else BreakStats())
+
+        query.result.add_done_callback(
+            lambda result: utility.execute_main_thread(on_answered, result)
+        )
+        self.__queue.put(query)
+
+    def daily_stats(
+        self,
+        since: datetime.date,
+        break_type: typing.Optional[BreakType] = None,
+    ) -> dict[datetime.date, BreakStats]:
+        """Return the statistics of every day since the given day, by day.
+
+        Days without breaks are left out.
+        """
+        (where, parameters) = self.__filter(
+            datetime.datetime.combine(since, datetime.time()), None, break_type
+        )
+        rows = self.__query(
+            "SELECT day, "
+            + STATS_COLUMNS
+            + " FROM breaks"
+            + where
+            + " GROUP BY day ORDER BY day",
+            parameters,
+        )
+        return {
+            datetime.date.fromisoformat(row[0]): self.__to_stats(row[1:])
+            for row in rows
+        }
+
+    @staticmethod
+    def __filter(
+        since: typing.Optional[datetime.datetime],
+        until: typing.Optional[datetime.datetime],
+        break_type: typing.Optional[BreakType],
+    ) -> tuple[str, list]:
+        # The day columns narrow the range using the indexes, the timestamps make it
+        # exact
+        conditions = []
+        parameters: list[typing.Any] = []
+        if break_type is not None:
+            conditions.append("type = ?")
+            parameters.append(break_type.name)
+        if since is not None:
+            conditions.append("day >= ? AND scheduled >= ?")
+            parameters += [since.date().isoformat(), since.timestamp()]
+        if until is not None:
+            conditions.append("day <= ? AND scheduled < ?")
+            parameters += [until.date().isoformat(), until.timestamp()]
+        if not conditions:
+            return ("", parameters)
+        return (" WHERE " + " AND ".join(conditions), parameters)
+
+    @staticmethod
+    def __to_stats(row: typing.Sequence) -> BreakStats:
+        (breaks, completed, skipped, postponed, vetoed, duration) = row
+        return BreakStats(
+            breaks=breaks,
+            completed=completed or 0,
+            skipped=skipped or 0,
+            postponed=postponed or 0,
+            vetoed=vetoed,
+            duration=duration or 0,
+        )
+
+    def __query(self, sql: str, parameters: list) -> list[tuple]:
+        if self.closed:
+            try:
+                with closing(self.__connect()) as connection:
+                    return connection.execute(sql, parameters).fetchall()
+            except sqlite3.Error:
+                logging.exception("Failed to query the break history")
+                return []
+
+        # Plugins may query from their own threads, so the queries are answered by
+        # the background thread, which already has a connection
+        query = _Query(sql, parameters, concurrent.futures.Future())
+        self.__queue.put(query)
+        try:
+            return query.result.result(timeout=QUERY_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            logging.warning("The break history did not answer a query in time")
+            return []
+        except sqlite3.Error:
+            logging.exception("Failed to query the break history")
+            return []
+
+    def __connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.__path)
+        self.__create_schema(connection)
+        return connection
+
+    @staticmethod
+    def __create_schema(connection: sqlite3.Connection) -> None:
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version == SCHEMA_VERSION:
+            return
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS breaks ("
+                " id INTEGER PRIMARY KEY,"
+                " day TEXT NOT NULL,"
+                " type TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " scheduled REAL NOT NULL,"
+                " started REAL,"
+                " duration REAL NOT NULL,"
+                " skipped INTEGER NOT NULL,"
+                " postponed INTEGER NOT NULL,"
+                " vetoed_by TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS breaks_day ON breaks (day, scheduled)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS breaks_type_day ON breaks"
+                " (type, day, scheduled)"
+            )
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __write_events(self) -> None:
+        connection: typing.Optional[sqlite3.Connection] = None
+        running = True
+        while running:
+            # Wait for an event, and write all events recorded until then at once
+            events = [self.__queue.get()]
+            while True:
+                try:
+                    events.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            queries = [event for event in events if isinstance(event, _Query)]
+
+            try:
+                if connection is None:
+                    connection = self.__connect()
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO breaks (day, type, name, scheduled, started,"
+                        " duration, skipped, postponed, vetoed_by)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (
+                                datetime.date.fromtimestamp(
+                                    event.scheduled
+                                ).isoformat(),
+                                event.type.name,
+                                event.name,
+                                event.scheduled,
+                                event.started,
+                                event.duration,
+                                event.skipped,
+                                event.postponed,
+                                event.vetoed_by,
+                            )
+                            for event in events
+                            if isinstance(event, BreakEvent)
+                        ],
+                    )
+            except sqlite3.Error:
+                logging.exception("Failed to write the break history")
+            finally:
+                for query in queries:
+                    self.__answer(connection, query)
+                running = None not in events
+                for _ in events:
+                    self.__queue.task_done()
+
+        if connection is not None:
+            connection.close()
+
+    @staticmethod
+    def __answer(
+        connection: typing.Optional[sqlite3.Connection], query: _Query
+    ) -> None:
+        if connection is None:
+            query.result.set_exception(sqlite3.Error("no connection"))
+            return
+        try:
+            query.result.set_result(
+                connection.execute(query.sql, query.parameters).fetchall()
+            )
+        except sqlite3.Error as e:
+            query.result.set_exception(e)
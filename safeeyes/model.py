@@ -20,7 +20,11 @@
 plugins.
 """
 
+import bisect
+import collections
 import copy
+import functools
+import json
 import logging
 import random
 from enum import Enum
@@ -35,6 +39,7 @@ import gi
 gi.require_version("Gtk", "4.0")
 from gi.repository import Gtk
 
+from safeeyes import catalog
 from safeeyes import utility
 from safeeyes.translations import translate as _
 
@@ -49,12 +54,15 @@ class BreakType(Enum):
 class Break:
     """An entity class which represents a break."""
 
+    __slots__ = ("type", "name", "time", "duration", "image", "plugins")
+
     type: BreakType
     name: str
     time: int
     duration: int
     image: typing.Optional[str]  # path
-    plugins: dict
+    # ids of the plugins enabled for this break, shared between breaks
+    plugins: typing.Optional[frozenset[str]]
 
     def __init__(
         self,
@@ -63,7 +71,7 @@ class Break:
         time: int,
         duration: int,
         image: typing.Optional[str],
-        plugins: dict,
+        plugins: typing.Optional[frozenset[str]],
     ):
         self.type = break_type
         self.name = name
@@ -96,36 +104,301 @@ class Break:
             return is_plugin_enabled
 
 
+@dataclass(frozen=True)
+class UpcomingBreak:
+    """A break in the lookahead timeline of the BreakQueue."""
+
+    type: BreakType
+    # minutes between the start of the current break and the start of this break
+    offset: int
+    # None if the break is only chosen by a shuffle that has not happened yet
+    break_obj: Optional[Break]
+
+
+class _BreakList:
+    """The breaks of one type, in the order of the config.
+
+    The breaks in safeeyes.json are built up front, the breaks in the catalogs are
+    only decoded once they are accessed, and then kept.
+    """
+
+    __slots__ = ("__breaks", "__catalogs", "__starts", "__size", "__decoded", "__build")
+
+    __breaks: list[Break]
+    __catalogs: list[catalog.BreakCatalog]
+    # index of the first break of each catalog, after the breaks in the config
+    __starts: list[int]
+    __size: int
+    __decoded: dict[int, Break]
+    __build: typing.Optional[typing.Callable[[dict], Break]]
+
+    def __init__(
+        self,
+        breaks: list[Break],
+        catalogs: typing.Sequence[catalog.BreakCatalog] = (),
+        build: typing.Optional[typing.Callable[[dict], Break]] = None,
+    ) -> None:
+        self.__breaks = breaks
+        self.__catalogs = list(catalogs)
+        self.__starts = []
+        self.__size = len(breaks)
+        for break_catalog in catalogs:
+            self.__starts.append(self.__size - len(breaks))
+            self.__size += len(break_catalog)
+        self.__decoded = {}
+        self.__build = build
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def __getitem__(self, index: int) -> Break:
+        if not 0 <= index < self.__size:
+            raise IndexError("break index out of range")
+        if index < len(self.__breaks):
+            return self.__breaks[index]
+
+        break_obj = self.__decoded.get(index)
+        if break_obj is None:
+            break_obj = self.__decode(index - len(self.__breaks))
+            self.__decoded[index] = break_obj
+        return break_obj
+
+    def has_catalogs(self) -> bool:
+        """Check whether some of the breaks are only decoded once accessed."""
+        return bool(self.__catalogs)
+
+    def materialized(self) -> typing.Iterator[Break]:
+        """Iterate over the breaks that were built so far."""
+        yield from self.__breaks
+        yield from self.__decoded.values()
+
+    def __decode(self, index: int) -> Break:
+        if self.__build is None:
+            raise Exception("this should never happen")
+
+        position = bisect.bisect_right(self.__starts, index) - 1
+        break_catalog = self.__catalogs[position]
+        index -= self.__starts[position]
+        try:
+            break_config = break_catalog.get(index)
+        except (OSError, ValueError) as e:
+            # The queue already counts this break, show where it is broken
+            logging.error("Invalid break in %s: %s", break_catalog.location(index), e)
+            break_config = {"name": break_catalog.location(index)}
+
+        try:
+            return self.__build(break_config)
+        except ValueError:
+            logging.error("Invalid break duration in: " + str(break_config))
+            del break_config["duration"]
+            return self.__build(break_config)
+
+
+class _BreakOrder:
+    """The breaks of one type, and the order in which they are taken.
+
+    With random order, each round through the breaks is a Fisher-Yates shuffle that
+    is only done as far as the breaks are needed, one swap per break. The breaks
+    taken last in the previous round are not taken first in the next round. The
+    state of a round is only its seed and those breaks, so it is small enough to be
+    stored in the session - the swaps are replayed on demand.
+    """
+
+    # number of breaks at the end of a round that are not repeated at the start
+    # of the next round, if there are enough breaks
+    AVOID_LAST = 3
+
+    __slots__ = (
+        "breaks",
+        "__random_order",
+        "__seed",
+        "__random",
+        "__swaps",
+        "__drawn",
+        "__avoid",
+        "__state",
+    )
+
+    breaks: _BreakList
+    __random_order: bool
+    __seed: typing.Optional[int]
+    __random: typing.Optional[random.Random]
+    # position -> index in breaks, for the positions that were swapped
+    __swaps: dict[int, int]
+    # number of positions that were drawn in this round
+    __drawn: int
+    # indexes of the breaks kept at the end for the first draws
+    __avoid: tuple[int, ...]
+    __state: typing.Optional[dict]
+
+    def __init__(self, breaks: _BreakList, is_random_order: bool) -> None:
+        self.breaks = breaks
+        self.__random_order = is_random_order
+        self.__start_round(None, ())
+
+    def __len__(self) -> int:
+        return len(self.breaks)
+
+    def __getitem__(self, position: int) -> Break:
+        if not 0 <= position < len(self.breaks):
+            raise IndexError("break position out of range")
+        return self.breaks[self.__index(position)]
+
+    def shuffle(self) -> None:
+        """Start the next round, in a new random order."""
+        size = len(self.breaks)
+        window = min(self.AVOID_LAST, size // 2)
+        self.__start_round(
+            None, tuple(self.__index(pos) for pos in range(size - window, size))
+        )
+
+    def get_state(self) -> dict:
+        """Return the state of the round as stored in the session."""
+        if self.__state is None:
+            self.__state = {
+                "size": len(self.breaks),
+                "seed": self.__seed,
+                "avoid": list(self.__avoid),
+            }
+        return self.__state
+
+    def parse_state(self, state: dict) -> tuple[typing.Optional[int], tuple[int, ...]]:
+        """Validate a state stored in the session."""
+        size = int(state["size"])
+        seed = state["seed"]
+        avoid = tuple(int(index) for index in state["avoid"])
+        if size != len(self.breaks):
+            raise ValueError("the breaks have changed")
+        if (seed is not None) != self.__random_order:
+            raise ValueError("random_order has changed")
+        if seed is not None:
+            seed = int(seed)
+        if len(avoid) > size // 2 or len(set(avoid)) != len(avoid):
+            raise ValueError("invalid avoided breaks")
+        if any(not 0 <= index < size for index in avoid):
+            raise ValueError("invalid avoided breaks")
+        return (seed, avoid)
+
+    def set_state(self, state: tuple[typing.Optional[int], tuple[int, ...]]) -> None:
+        self.__start_round(*state)
+
+    def __start_round(self, seed: typing.Optional[int], avoid: tuple[int, ...]) -> None:
+        if self.__random_order and seed is None:
+            seed = random.getrandbits(32)
+        self.__seed = seed
+        self.__random = random.Random(seed) if seed is not None else None
+        self.__swaps = {}
+        self.__drawn = 0
+        self.__avoid = avoid
+        self.__state = None
+
+        # Move the avoided breaks to the end, where the first draws do not reach
+        size = len(self.breaks)
+        for offset, index in enumerate(avoid):
+            position = next(
+                (pos for (pos, value) in self.__swaps.items() if value == index), index
+            )
+            self.__swap(position, size - 1 - offset)
+
+    def __index(self, position: int) -> int:
+        """Return the index in breaks of the break at the given position."""
+        rng = self.__random
+        if rng is None:
+            return position
+
+        avoided = len(self.__avoid)
+        while self.__drawn <= position:
+            drawn = self.__drawn
+            # The first draws do not reach the avoided breaks at the end
+            end = len(self.breaks) - avoided if drawn < avoided else len(self.breaks)
+            self.__swap(drawn, rng.randrange(drawn, end))
+            self.__drawn += 1
+
+        return self.__swaps.get(position, position)
+
+    def __swap(self, first: int, second: int) -> None:
+        swaps = self.__swaps
+        (swaps[first], swaps[second]) = (
+            swaps.get(second, second),
+            swaps.get(first, first),
+        )
+
+
+class _TimelineCursor:
+    """The state of the BreakQueue after the last break in the timeline."""
+
+    short_index: int
+    long_index: int
+    long_time: int
+    previous_is_long: bool
+    # False once the queue is shuffled again before reaching this point
+    shorts_known: bool = True
+    longs_known: bool = True
+    # True once every long break has been taken, and was reset
+    longs_wrapped: bool = False
+
+    def __init__(
+        self, short_index: int, long_index: int, long_time: int, previous_is_long: bool
+    ) -> None:
+        self.short_index = short_index
+        self.long_index = long_index
+        self.long_time = long_time
+        self.previous_is_long = previous_is_long
+
+
 class BreakQueue:
+    # minimum number of breaks kept in the lookahead timeline
+    LOOKAHEAD = 10
+    # the timeline is extended up to this size to include a break of each type
+    MAX_LOOKAHEAD = 1000
+
     __current_break: Break
     __current_long: int = 0
     __current_short: int = 0
     __short_break_time: int
     __long_break_time: int
     __is_random_order: bool
-    __long_queue: typing.Optional[list[Break]]
-    __short_queue: typing.Optional[list[Break]]
+    __long_queue: typing.Optional[_BreakOrder]
+    __short_queue: typing.Optional[_BreakOrder]
+    # (absolute offset, type, break) of the next breaks, starting with the current
+    __timeline: collections.deque[tuple[int, BreakType, Optional[Break]]]
+    __timeline_by_type: dict[
+        BreakType, collections.deque[tuple[int, BreakType, Optional[Break]]]
+    ]
+    __timeline_cursor: _TimelineCursor
+
+    # the settings read by create(), the queue must be created again if they change
+    SETTINGS = frozenset(
+        {
+            "short_breaks",
+            "long_breaks",
+            "short_break_interval",
+            "long_break_interval",
+            "short_break_duration",
+            "long_break_duration",
+            "random_order",
+        }
+    )
 
     @classmethod
     def create(cls, config: "Config", context) -> typing.Optional["BreakQueue"]:
-        short_break_time = config.get("short_break_interval")
-        long_break_time = config.get("long_break_interval")
-        is_random_order = config.get("random_order")
+        settings = config.snapshot()
+        short_break_time = settings.short_break_interval
+        long_break_time = settings.long_break_interval
+        is_random_order = settings.random_order
 
         short_queue = cls.__build_queue(
             BreakType.SHORT_BREAK,
             config.get("short_breaks"),
             short_break_time,
-            config.get("short_break_duration"),
-            is_random_order,
+            settings.short_break_duration,
         )
 
         long_queue = cls.__build_queue(
             BreakType.LONG_BREAK,
             config.get("long_breaks"),
             long_break_time,
-            config.get("long_break_duration"),
-            is_random_order,
+            settings.long_break_duration,
         )
 
         if short_queue is None and long_queue is None:
@@ -146,34 +419,50 @@ class BreakQueue:
         short_break_time: int,
         long_break_time: int,
         is_random_order: bool,
-        short_queue: typing.Optional[list[Break]],
-        long_queue: typing.Optional[list[Break]],
+        short_queue: typing.Optional[_BreakList],
+        long_queue: typing.Optional[_BreakList],
     ) -> None:
         """Constructor for BreakQueue. Do not call this directly.
 
         Instead, use BreakQueue.create() instead.
         short_queue and long_queue must not both be None, and must not be an empty
-        list.
+        list. They are in the order of the config, and shuffled here if needed.
         """
         self.context = context
         self.__short_break_time = short_break_time
         self.__long_break_time = long_break_time
         self.__is_random_order = is_random_order
-        self.__short_queue = short_queue
-        self.__long_queue = long_queue
+        self.__short_queue = None
+        self.__long_queue = None
+        if short_queue is not None:
+            self.__short_queue = _BreakOrder(short_queue, is_random_order)
+        if long_queue is not None:
+            self.__long_queue = _BreakOrder(long_queue, is_random_order)
+
+        # Sessions of older versions only have the name of the last break
+        last_break = context["session"].get("break")
 
-        # load first break
-        self.__set_next_break()
+        # Restore the queue from the session, or load the first break
+        restored = self.__restore_session(context["session"].get("break_queue"))
+        if not restored:
+            self.__set_next_break()
+        self.__build_timeline()
 
-        # Restore the last break from session
-        last_break = context["session"].get("break")
-        if last_break is not None:
+        if not restored and last_break is not None and not self.__has_catalogs():
+            # Finding the break by name decodes the breaks of the catalogs, so
+            # queues with catalogs start from the first break instead
             current_break = self.get_break()
             if last_break != current_break.name:
                 brk = self.next()
                 while brk != current_break and brk.name != last_break:
                     brk = self.next()
 
+    def __has_catalogs(self) -> bool:
+        return any(
+            queue is not None and queue.breaks.has_catalogs()
+            for queue in (self.__short_queue, self.__long_queue)
+        )
+
     def get_break(self) -> Break:
         return self.__current_break
 
@@ -192,6 +481,35 @@ class BreakQueue:
             return None
         return self.__short_queue[self.__current_short]
 
+    def get_upcoming(
+        self, break_type: typing.Optional[BreakType] = None
+    ) -> typing.Optional[UpcomingBreak]:
+        """Return the next break with the given type, and when it starts.
+
+        The current break is returned if it has that type. This does not modify
+        the queue.
+        """
+        if break_type is None:
+            entries = self.__timeline
+        else:
+            entries = self.__timeline_by_type[break_type]
+            if not entries:
+                return None
+
+        (offset, entry_type, break_obj) = entries[0]
+        return UpcomingBreak(entry_type, offset - self.__timeline[0][0], break_obj)
+
+    def get_timeline(self) -> list[UpcomingBreak]:
+        """Return the next breaks, starting with the current one.
+
+        This covers at least LOOKAHEAD breaks. This does not modify the queue.
+        """
+        base = self.__timeline[0][0]
+        return [
+            UpcomingBreak(entry_type, offset - base, break_obj)
+            for (offset, entry_type, break_obj) in self.__timeline
+        ]
+
     def is_long_break(self) -> bool:
         return self.__current_break.type == BreakType.LONG_BREAK
 
@@ -205,6 +523,7 @@ class BreakQueue:
         shorts = self.__short_queue
         longs = self.__long_queue
         previous_break = self.__current_break
+        shuffled = False
 
         # Reset break that has just ended
         if previous_break.is_long_break():
@@ -212,7 +531,8 @@ class BreakQueue:
             if self.__current_long == 0 and self.__is_random_order:
                 # Shuffle queue
                 if self.__long_queue is not None:
-                    random.shuffle(self.__long_queue)
+                    self.__long_queue.shuffle()
+                    shuffled = True
         else:
             # Reduce the break time from the next long break (default)
             if longs:
@@ -224,10 +544,22 @@ class BreakQueue:
                 longs[self.__current_long].time -= shorts[self.__current_short].time
             if self.__current_short == 0 and self.__is_random_order:
                 if self.__short_queue is not None:
-                    random.shuffle(self.__short_queue)
+                    self.__short_queue.shuffle()
+                    shuffled = True
 
         self.__set_next_break(break_type)
 
+        if (
+            break_type is None
+            and not shuffled
+            and len(self.__timeline) > 1
+            and self.__timeline[1][2] is self.__current_break
+        ):
+            # The timeline predicted this break, keep the rest of it
+            self.__advance_timeline()
+        else:
+            self.__build_timeline()
+
         return self.__current_break
 
     def __set_next_break(self, break_type: typing.Optional[BreakType] = None) -> None:
@@ -247,17 +579,20 @@ class BreakQueue:
             break_obj = self.__next_short()
 
         self.__current_break = break_obj
-        self.context["session"]["break"] = self.__current_break.name
+        self.__save_session()
 
     def reset(self) -> None:
         if self.__short_queue:
-            for break_object in self.__short_queue:
+            for break_object in self.__short_queue.breaks.materialized():
                 break_object.time = self.__short_break_time
 
         if self.__long_queue:
-            for break_object in self.__long_queue:
+            for break_object in self.__long_queue.breaks.materialized():
                 break_object.time = self.__long_break_time
 
+        self.__save_session()
+        self.__build_timeline()
+
     def is_empty(self, break_type: BreakType) -> bool:
         """Check if the given break type is empty or not."""
         if break_type == BreakType.SHORT_BREAK:
@@ -295,46 +630,246 @@ class BreakQueue:
 
         return break_obj
 
+    def __save_session(self) -> None:
+        """Store the complete state of the queue, so it can be restored as is."""
+        shorts = self.__short_queue
+        longs = self.__long_queue
+        current = self.__current_break
+        long_time = None
+        if longs is not None:
+            long_time = longs[self.__current_long].time
+
+        session = self.context["session"]
+        session["break"] = current.name
+        session["break_queue"] = {
+            "current": "long" if current.is_long_break() else "short",
+            "short_order": shorts.get_state() if shorts else None,
+            "short_index": self.__current_short,
+            "long_order": longs.get_state() if longs else None,
+            "long_index": self.__current_long,
+            "long_time": long_time,
+        }
+
+    def __restore_session(self, state: typing.Optional[dict]) -> bool:
+        """Restore the state stored by __save_session.
+
+        Returns False if there is no state, or it does not match the breaks in the
+        config anymore.
+        """
+        if state is None:
+            return False
+
+        shorts = self.__short_queue
+        longs = self.__long_queue
+
+        try:
+            short_order = self.__parse_order(shorts, state["short_order"])
+            long_order = self.__parse_order(longs, state["long_order"])
+            short_index = int(state["short_index"])
+            long_index = int(state["long_index"])
+            long_time = 0
+
+            if shorts is not None:
+                if not 0 <= short_index < len(shorts):
+                    raise ValueError("invalid short_index")
+            if longs is not None:
+                if not 0 <= long_index < len(longs):
+                    raise ValueError("invalid long_index")
+                long_time = int(state["long_time"])
+
+            if state["current"] == "short" and shorts is not None:
+                break_type = "short"
+            elif state["current"] == "long" and longs is not None:
+                break_type = "long"
+            else:
+                raise ValueError("invalid current break")
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            logging.warning("Failed to restore the break queue from session: %s", e)
+            return False
+
+        if shorts is not None and short_order is not None:
+            shorts.set_state(short_order)
+        if longs is not None and long_order is not None:
+            longs.set_state(long_order)
+            longs[long_index].time = long_time
+        self.__current_short = short_index
+        self.__current_long = long_index
+        # The index is the next break, which is 0 after the last break of a round
+        if shorts is not None and break_type == "short":
+            self.__current_break = shorts[(short_index - 1) % len(shorts)]
+        elif longs is not None:
+            self.__current_break = longs[(long_index - 1) % len(longs)]
+        self.context["break_type"] = break_type
+        self.__save_session()
+
+        return True
+
+    @staticmethod
+    def __parse_order(
+        queue: typing.Optional[_BreakOrder], state: typing.Optional[dict]
+    ) -> typing.Optional[tuple[typing.Optional[int], tuple[int, ...]]]:
+        if queue is None or state is None:
+            if queue is not None or state is not None:
+                raise ValueError("the breaks have changed")
+            return None
+
+        return queue.parse_state(state)
+
+    def __build_timeline(self) -> None:
+        current = self.__current_break
+        long_time = 0
+        if self.__long_queue is not None:
+            long_time = self.__long_queue[self.__current_long].time
+
+        self.__timeline = collections.deque()
+        self.__timeline_by_type = {
+            BreakType.SHORT_BREAK: collections.deque(),
+            BreakType.LONG_BREAK: collections.deque(),
+        }
+        self.__timeline_cursor = _TimelineCursor(
+            self.__current_short,
+            self.__current_long,
+            long_time,
+            current.is_long_break(),
+        )
+        self.__append_timeline((0, current.type, current))
+        self.__extend_timeline()
+
+    def __advance_timeline(self) -> None:
+        entry = self.__timeline.popleft()
+        self.__timeline_by_type[entry[1]].popleft()
+        self.__extend_timeline()
+
+    def __append_timeline(self, entry: tuple[int, BreakType, Optional[Break]]) -> None:
+        self.__timeline.append(entry)
+        self.__timeline_by_type[entry[1]].append(entry)
+
+    def __extend_timeline(self) -> None:
+        types = [
+            break_type
+            for break_type in (BreakType.SHORT_BREAK, BreakType.LONG_BREAK)
+            if not self.is_empty(break_type)
+        ]
+        while len(self.__timeline) < self.LOOKAHEAD or (
+            len(self.__timeline) < self.MAX_LOOKAHEAD
+            and not all(self.__timeline_by_type[t] for t in types)
+        ):
+            self.__append_timeline(self.__predict_next())
+
+    def __predict_next(self) -> tuple[int, BreakType, Optional[Break]]:
+        """Predict the break after the last one in the timeline.
+
+        This mirrors next() and __set_next_break(), without modifying the queue.
+        """
+        shorts = self.__short_queue
+        longs = self.__long_queue
+        cursor = self.__timeline_cursor
+        (last_offset, _, _) = self.__timeline[-1]
+
+        if cursor.previous_is_long:
+            if cursor.long_index == 0 and self.__is_random_order:
+                cursor.longs_known = False
+        else:
+            if longs and shorts:
+                cursor.long_time -= self.__predict_short_time(cursor)
+            if cursor.short_index == 0 and self.__is_random_order:
+                cursor.shorts_known = False
+
+        if shorts is None or (
+            longs is not None and cursor.long_time <= self.__predict_short_time(cursor)
+        ):
+            if longs is None:
+                raise Exception("this should never happen")
+            break_obj = longs[cursor.long_index] if cursor.longs_known else None
+            wait = cursor.long_time
+            cursor.long_index = (cursor.long_index + 1) % len(longs)
+            if cursor.long_index == 0:
+                cursor.longs_wrapped = True
+            if cursor.longs_wrapped:
+                cursor.long_time = self.__long_break_time
+            else:
+                cursor.long_time = longs[cursor.long_index].time
+            cursor.previous_is_long = True
+            return (last_offset + wait, BreakType.LONG_BREAK, break_obj)
+
+        break_obj = shorts[cursor.short_index] if cursor.shorts_known else None
+        wait = self.__predict_short_time(cursor)
+        cursor.short_index = (cursor.short_index + 1) % len(shorts)
+        cursor.previous_is_long = False
+        return (last_offset + wait, BreakType.SHORT_BREAK, break_obj)
+
+    def __predict_short_time(self, cursor: _TimelineCursor) -> int:
+        if self.__short_queue is None or not cursor.shorts_known:
+            # The order is not known yet, assume the default interval
+            return self.__short_break_time
+        return self.__short_queue[cursor.short_index].time
+
     @staticmethod
     def __build_queue(
         break_type: BreakType,
         break_configs: list[dict],
         break_time: int,
         break_duration: int,
-        is_random_order: bool,
-    ) -> typing.Optional[list[Break]]:
-        """Build a queue of breaks."""
-        size = len(break_configs)
+    ) -> typing.Optional[_BreakList]:
+        """Build a queue of breaks, in the order of the config.
 
-        if 0 == size:
-            # No breaks
-            return None
-
-        if is_random_order:
-            breaks_order = random.sample(break_configs, size)
-        else:
-            breaks_order = break_configs
+        The breaks of the catalogs in breaks.d follow the breaks in the config.
+        """
+        # Breaks with the same plugins share the same set
+        plugin_sets: dict[frozenset[str], frozenset[str]] = {}
+        build = functools.partial(
+            BreakQueue.__build_break,
+            break_type,
+            break_time,
+            break_duration,
+            plugin_sets,
+        )
 
         queue: list[Break] = []
-        for break_config in breaks_order:
-            name = _(break_config["name"])
-            duration = break_config.get("duration", break_duration)
-            image = break_config.get("image")
-            plugins = break_config.get("plugins", None)
-            interval = break_config.get("interval", break_time)
-
-            # Validate time value
-            if not isinstance(duration, int) or duration <= 0:
+        for break_config in break_configs:
+            try:
+                queue.append(build(break_config))
+            except ValueError:
                 logging.error("Invalid break duration in: " + str(break_config))
-                continue
 
-            break_obj = Break(break_type, name, interval, duration, image, plugins)
-            queue.append(break_obj)
+        if break_type == BreakType.SHORT_BREAK:
+            catalogs = catalog.load_catalogs("short_breaks")
+        else:
+            catalogs = catalog.load_catalogs("long_breaks")
 
-        if len(queue) == 0:
+        breaks = _BreakList(queue, catalogs, build)
+        if len(breaks) == 0:
+            # No breaks
             return None
 
-        return queue
+        return breaks
+
+    @staticmethod
+    def __build_break(
+        break_type: BreakType,
+        break_time: int,
+        break_duration: int,
+        plugin_sets: dict[frozenset[str], frozenset[str]],
+        break_config: dict,
+    ) -> Break:
+        """Build a break from its config.
+
+        Raises ValueError if the duration is invalid.
+        """
+        name = _(break_config["name"])
+        duration = break_config.get("duration", break_duration)
+        image = break_config.get("image")
+        interval = break_config.get("interval", break_time)
+        plugins = None
+        if break_config.get("plugins"):
+            plugin_set = frozenset(break_config["plugins"])
+            plugins = plugin_sets.setdefault(plugin_set, plugin_set)
+
+        # Validate time value
+        if not isinstance(duration, int) or duration <= 0:
+            raise ValueError("invalid break duration")
+
+        return Break(break_type, name, interval, duration, image, plugins)
 
 
 class State(Enum):
@@ -370,18 +905,169 @@ class EventHook:
                 return False
         return True
 
+    def fire_async(self, *args) -> Union[bool, "PendingResult"]:
+        """Fire all listeners, which may return a PendingResult instead of a bool.
+
+        Returns False as soon as a listener returns False. If some listeners have
+        not finished yet, returns a PendingResult which resolves to False if any of
+        them does, and to True once all of them returned True.
+        """
+        pending = []
+        for handler in self.__handlers:
+            result = handler(*args)
+            if isinstance(result, PendingResult):
+                pending.append(result)
+            elif not result:
+                return False
+
+        if not pending:
+            return True
+        return PendingResult.all(pending)
+
+
+class PendingResult:
+    """A bool that is only known later, for example once a plugin thread finished.
+
+    All methods must be called from the main thread.
+    """
+
+    done: bool = False
+    result: bool = True
+
+    def __init__(self) -> None:
+        self.__callbacks: list[typing.Callable[["PendingResult"], None]] = []
+
+    @classmethod
+    def all(cls, results: list["PendingResult"]) -> "PendingResult":
+        """Combine the results, which are True only if all of them are True."""
+        combined = cls()
+        remaining = len(results)
+
+        def on_done(result: "PendingResult") -> None:
+            nonlocal remaining
+            remaining -= 1
+            if not result.result:
+                combined.set_result(False)
+            elif remaining == 0:
+                combined.set_result(True)
+
+        for result in results:
+            result.add_done_callback(on_done)
+
+        return combined
+
+    def set_result(self, result: bool) -> None:
+        """Resolve the result. Only the first call has an effect."""
+        if self.done:
+            return
+        self.done = True
+        self.result = result
+
+        callbacks = self.__callbacks
+        self.__callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(
+        self, callback: typing.Callable[["PendingResult"], None]
+    ) -> None:
+        """Call the callback once the result is known."""
+        if self.done:
+            callback(self)
+        else:
+            self.__callbacks.append(callback)
+
+
+@dataclass(frozen=True, slots=True)
+class ConfigSnapshot:
+    """The scalar settings of a Config, as typed attributes.
+
+    Settings that are missing or have the wrong type keep the value of the system
+    config.
+    """
+
+    short_break_interval: int
+    long_break_interval: int
+    short_break_duration: int
+    long_break_duration: int
+    pre_break_warning_time: int
+    postpone_duration: int
+    postpone_unit: str
+    allow_postpone: bool
+    random_order: bool
+    strict_break: bool
+    persist_state: bool
+    shortcut_disable_time: int
+    shortcut_postpone: int
+    shortcut_skip: int
+    session_write_delay: int
+
+    @staticmethod
+    def convert(value: typing.Any, field_type: type) -> typing.Any:
+        """Return the value as the type of the field, or None if it is invalid."""
+        if field_type is bool:
+            return value if isinstance(value, bool) else None
+        if field_type is int:
+            if isinstance(value, bool):
+                return None
+            if isinstance(value, float) and value.is_integer():
+                return int(value)
+            return value if isinstance(value, int) else None
+        return value if isinstance(value, field_type) else None
+
 
 class Config:
-    """The configuration of Safe Eyes."""
+    """The configuration of Safe Eyes.
+
+    The config is made of layers: the system config, the policy configs of the
+    administrator and the user config, in increasing order of precedence. A layer
+    can lock keys by listing them in "locked", so that the layers above can not
+    change them. The layers are resolved into a single dict when the config is
+    created, which get() looks up.
+
+    Clones share the values with the config they were cloned from, copy on write:
+    the dicts of all values are only copied by the first set(), and each list or
+    dict of the user config only once it is accessed using get(), as the caller may
+    modify it.
+    """
+
+    # the layers below the user config of the last config that was created, and the
+    # dict and locked keys they resolve to
+    __base_cache: typing.ClassVar[
+        tuple[tuple[dict, ...], dict[str, typing.Any], frozenset[str]]
+    ] = ((), {}, frozenset())
 
     __user_config: dict[str, typing.Any]
     __system_config: dict[str, typing.Any]
+    __policy_configs: tuple[dict[str, typing.Any], ...]
+    # the values of all layers, with the keys locked by the layers below the user
+    # config
+    __values: dict[str, typing.Any]
+    __base_values: dict[str, typing.Any]
+    __locked: frozenset[str]
+    # whether __user_config and __values are shared with another Config
+    __shared: bool
+    # keys of the user config whose lists and dicts are not shared with another
+    # Config, None if none of them are shared
+    __owned: typing.Optional[set[str]]
+    __snapshot: typing.Optional[ConfigSnapshot]
 
     @classmethod
     def load(cls) -> "Config":
+        # Use the config merged by the last start, if none of its files changed
+        cache = utility.load_startup_cache(utility.startup_cache_key())
+        if cache is not None:
+            utility.create_startup_entry(force=False)
+            return cls(
+                cache["user_config"], cache["system_config"], cls.__load_policies()
+            )
+
         # Read the config files
         user_config = utility.load_json(utility.CONFIG_FILE_PATH)
-        system_config = utility.load_json(utility.SYSTEM_CONFIG_FILE_PATH)
+        system_config = utility.load_config_layer(utility.SYSTEM_CONFIG_FILE_PATH)
+        if system_config is None:
+            raise Exception("failed to read " + utility.SYSTEM_CONFIG_FILE_PATH)
+        policy_configs = cls.__load_policies()
         # If there any breaking changes in long_breaks, short_breaks or any other keys,
         # use the force_upgrade_keys list
         force_upgrade_keys: list[str] = []
@@ -393,8 +1079,9 @@ class Config:
         if user_config is None:
             utility.initialize_safeeyes()
             user_config = copy.deepcopy(system_config)
-            cfg = cls(user_config, system_config)
+            cfg = cls(user_config, system_config, policy_configs)
             cfg.save()
+            cfg.__write_startup_cache()
             return cfg
         else:
             system_config_version = system_config["meta"]["config_version"]
@@ -414,17 +1101,133 @@ class Config:
 
         utility.merge_plugins(user_config)
 
-        cfg = cls(user_config, system_config)
+        cfg = cls(user_config, system_config, policy_configs)
         cfg.save()
+        cfg.__write_startup_cache()
         return cfg
 
+    @classmethod
+    def reload(cls) -> typing.Optional["Config"]:
+        """Read safeeyes.json again after it changed on disk.
+
+        Unlike load, this never writes any file. None is returned if safeeyes.json
+        is not a valid config of the current version, for example while it is
+        being written.
+        """
+        try:
+            with open(utility.CONFIG_FILE_PATH) as config_file:
+                user_config = json.load(config_file)
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring the changed %s: %s", utility.CONFIG_FILE_PATH, e)
+            return None
+        system_config = utility.load_config_layer(utility.SYSTEM_CONFIG_FILE_PATH)
+        if system_config is None:
+            raise Exception("failed to read " + utility.SYSTEM_CONFIG_FILE_PATH)
+
+        error = cls.__validate(user_config, system_config)
+        if error is not None:
+            logging.warning(
+                "Ignoring the changed %s: %s", utility.CONFIG_FILE_PATH, error
+            )
+            return None
+
+        utility.merge_plugins(user_config)
+        return cls(user_config, system_config, cls.__load_policies())
+
+    @staticmethod
+    def __validate(
+        user_config: typing.Any, system_config: dict[str, typing.Any]
+    ) -> typing.Optional[str]:
+        """Return why the user config cannot be used with the system config."""
+        if not isinstance(user_config, dict):
+            return "not a JSON object"
+        meta = user_config.get("meta")
+        if not isinstance(meta, dict):
+            return "missing meta"
+        try:
+            user_version = parse(str(meta.get("config_version", "0.0.0")))
+        except ValueError:
+            return "invalid config_version"
+        if user_version != parse(system_config["meta"]["config_version"]):
+            return "config_version does not match"
+        for key, value in user_config.items():
+            default = system_config.get(key)
+            if default is None:
+                continue
+            if isinstance(default, bool) or isinstance(value, bool):
+                same_type = isinstance(default, bool) and isinstance(value, bool)
+            elif isinstance(default, (int, float)):
+                same_type = isinstance(value, (int, float))
+            else:
+                same_type = isinstance(value, type(default))
+            if not same_type:
+                return "invalid value of " + key
+        return None
+
+    @staticmethod
+    def __load_policies() -> tuple[dict[str, typing.Any], ...]:
+        policy_configs = []
+        for path in utility.POLICY_CONFIG_FILE_PATHS:
+            policy_config = utility.load_config_layer(path)
+            if policy_config is not None:
+                logging.info("Applying the policy config %s", path)
+                policy_configs.append(policy_config)
+        return tuple(policy_configs)
+
+    def __write_startup_cache(self) -> None:
+        # The key is taken after saving, which may have changed safeeyes.json
+        utility.write_startup_cache(
+            utility.startup_cache_key(), self.__user_config, self.__system_config
+        )
+
     def __init__(
         self,
         user_config: dict[str, typing.Any],
         system_config: dict[str, typing.Any],
+        policy_configs: typing.Sequence[dict[str, typing.Any]] = (),
     ):
         self.__user_config = user_config
         self.__system_config = system_config
+        self.__policy_configs = tuple(policy_configs)
+        self.__shared = False
+        self.__owned = None
+        self.__snapshot = None
+
+        (self.__base_values, self.__locked) = self.__resolve_base(
+            (system_config, *self.__policy_configs)
+        )
+        self.__values = dict(self.__base_values)
+        for key, value in user_config.items():
+            if value is not None and key not in self.__locked:
+                self.__values[key] = value
+
+    @classmethod
+    def __resolve_base(
+        cls, layers: tuple[dict, ...]
+    ) -> tuple[dict[str, typing.Any], frozenset[str]]:
+        """Resolve the layers below the user config.
+
+        The layers are only resolved again if one of them was loaded again.
+        """
+        (cached_layers, values, locked) = cls.__base_cache
+        if len(cached_layers) == len(layers) and all(
+            cached is layer for (cached, layer) in zip(cached_layers, layers)
+        ):
+            return (values, locked)
+
+        values = {}
+        locked_keys: set[str] = set()
+        for layer in layers:
+            for key, value in layer.items():
+                if value is not None and key != "locked" and key not in locked_keys:
+                    values[key] = value
+            layer_locked = layer.get("locked", [])
+            if isinstance(layer_locked, list):
+                locked_keys.update(key for key in layer_locked if isinstance(key, str))
+        locked = frozenset(locked_keys)
+
+        Config.__base_cache = (layers, values, locked)
+        return (values, locked)
 
     @classmethod
     def __merge_dictionary(cls, old_dict, new_dict, force_upgrade_keys: list[str]):
@@ -443,32 +1246,130 @@ class Config:
                         new_dict[key] = old_value
 
     def clone(self) -> "Config":
-        config = Config(
-            user_config=copy.deepcopy(self.__user_config),
-            system_config=self.__system_config,
-        )
+        config = Config.__new__(Config)
+        config.__user_config = self.__user_config
+        config.__system_config = self.__system_config
+        config.__policy_configs = self.__policy_configs
+        config.__values = self.__values
+        config.__base_values = self.__base_values
+        config.__locked = self.__locked
+        config.__snapshot = self.__snapshot
+        # Both configs copy the values before changing them
+        config.__shared = True
+        config.__owned = set()
+        self.__shared = True
+        self.__owned = set()
         return config
 
+    def __copy_values(self) -> None:
+        """Stop sharing the dicts of the values with other configs."""
+        self.__user_config = dict(self.__user_config)
+        self.__values = dict(self.__values)
+        self.__shared = False
+
     def save(self) -> None:
-        """Save the configuration to file."""
+        """Save the configuration to file, if it changed."""
         utility.write_json(utility.CONFIG_FILE_PATH, self.__user_config)
 
     def get(self, key, default_value=None):
         """Get the value."""
-        value = self.__user_config.get(key, default_value)
-        if value is None:
-            value = self.__system_config.get(key, None)
+        value = self.__values.get(key, default_value)
+        if key in self.__locked:
+            if isinstance(value, (dict, list)):
+                # Changes to a locked value are discarded
+                value = copy.deepcopy(value)
+        elif (
+            self.__owned is not None
+            and key not in self.__owned
+            and isinstance(value, (dict, list))
+            and key in self.__user_config
+        ):
+            # Copy the value before the caller can modify it
+            value = copy.deepcopy(value)
+            if self.__shared:
+                self.__copy_values()
+            self.__user_config[key] = value
+            self.__values[key] = value
+            self.__owned.add(key)
         return value
 
     def set(self, key, value):
-        """Set the value."""
+        """Set the value. Locked keys keep the value of the policy config."""
+        if key in self.__locked:
+            return
+        if self.__shared:
+            self.__copy_values()
         self.__user_config[key] = value
+        if value is None:
+            self.__values.pop(key, None)
+            if key in self.__base_values:
+                self.__values[key] = self.__base_values[key]
+        else:
+            self.__values[key] = value
+        if self.__owned is not None:
+            self.__owned.add(key)
+        self.__snapshot = None
+
+    def is_locked(self, key) -> bool:
+        """Check whether the value is locked by a policy config."""
+        return key in self.__locked
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        """Return a copy of all values, like get() returns them."""
+        return copy.deepcopy(self.__values)
+
+    def snapshot(self) -> ConfigSnapshot:
+        """Return the scalar settings, which do not change until the next set()."""
+        if self.__snapshot is None:
+            values = {}
+            for name, field_type in typing.get_type_hints(ConfigSnapshot).items():
+                value = ConfigSnapshot.convert(self.__values.get(name), field_type)
+                if value is None:
+                    if name in self.__values:
+                        logging.warning("Invalid value of %s in the config", name)
+                    value = self.__system_default(name, field_type)
+                values[name] = value
+            self.__snapshot = ConfigSnapshot(**values)
+        return self.__snapshot
+
+    def __system_default(self, name: str, field_type: type) -> typing.Any:
+        """Return the value of the setting in the system config.
+
+        Configs made of partial layers fall back to the installed safeeyes.json.
+        """
+        for system_config in (
+            self.__system_config,
+            utility.load_config_layer(utility.SYSTEM_CONFIG_FILE_PATH) or {},
+        ):
+            value = ConfigSnapshot.convert(system_config.get(name), field_type)
+            if value is not None:
+                return value
+        raise Exception("invalid value of %s in the system config" % name)
+
+    def changed_keys(self, config: "Config") -> frozenset[str]:
+        """Return the keys whose values differ in the given config."""
+        keys = self.__values.keys() | config.__values.keys()
+        return frozenset(
+            key for key in keys if self.__values.get(key) != config.__values.get(key)
+        )
+
+    def changed_plugins(self, config: "Config") -> frozenset[str]:
+        """Return the ids of the plugins whose settings differ in the given config."""
+        plugins = {plugin["id"]: plugin for plugin in self.__values.get("plugins", [])}
+        other_plugins = {
+            plugin["id"]: plugin for plugin in config.__values.get("plugins", [])
+        }
+        return frozenset(
+            plugin_id
+            for plugin_id in plugins.keys() | other_plugins.keys()
+            if plugins.get(plugin_id) != other_plugins.get(plugin_id)
+        )
 
     def __eq__(self, config):
-        return self.__user_config == config.__user_config
+        return self.__values == config.__values
 
     def __ne__(self, config):
-        return self.__user_config != config.__user_config
+        return self.__values != config.__values
 
 
 class TrayAction:
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Run user plugins in a separate process, the plugin host.
+
+A user plugin is isolated if its entry in safeeyes.json sets "isolated": true,
+which takes effect once Safe Eyes is started again. Its methods are then called in
+the plugin host, so a plugin that blocks or crashes does not affect the main loop.
+PluginHost starts the host, and talks to it over a Unix socket:
+ - Every line is a JSON list of messages. The calls made in the same iteration of
+   the main loop are sent as one line.
+ - The calls are not waited for. The host answers them in order, with one reply
+   for every message.
+ - Every call has a deadline. If the host misses it, or exits, it is killed and
+   started again, and the isolated plugins are loaded and initialized again.
+
+The plugins in the host get a context without "api" and without the session of
+Safe Eyes, and can not add tray actions.
+"""
+
+import datetime
+import importlib
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import typing
+
+from safeeyes import utility
+from safeeyes.model import Break, BreakType, Config
+from safeeyes.timers import Timer
+
+# seconds an isolated plugin may take to answer, unless it sets hook_timeout
+CALL_TIMEOUT = 2
+# seconds to wait before starting the host again, doubled after every failed start
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+# the methods that can be called in the host, with their number of arguments
+METHODS = {
+    "enable": 0,
+    "disable": 0,
+    "on_start": 0,
+    "on_stop": 0,
+    "on_exit": 0,
+    "on_pre_break": 1,
+    "on_start_break": 1,
+    "on_stop_break": 0,
+    "on_countdown": 2,
+    "update_next_break": 2,
+    "get_widget_title": 1,
+    "get_widget_content": 1,
+}
+# the entries of the context that are passed to the plugins in the host
+CONTEXT_KEYS = ("version", "desktop", "is_wayland", "locale")
+
+
+def encode(value: typing.Any) -> typing.Any:
+    """Convert a value to JSON. Values that can not be converted become None."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Break):
+        return {
+            "__break__": {
+                "type": value.type.name,
+                "name": value.name,
+                "time": value.time,
+                "duration": value.duration,
+                "image": value.image,
+                "plugins": None if value.plugins is None else sorted(value.plugins),
+            }
+        }
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): encode(item) for key, item in value.items()}
+    return None
+
+
+def decode(value: typing.Any) -> typing.Any:
+    """Convert a value encoded by encode back."""
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if isinstance(value, dict):
+        if "__break__" in value:
+            fields = value["__break__"]
+            plugins = fields["plugins"]
+            return Break(
+                BreakType[fields["type"]],
+                fields["name"],
+                fields["time"],
+                fields["duration"],
+                fields["image"],
+                None if plugins is None else frozenset(plugins),
+            )
+        if "__datetime__" in value:
+            return datetime.datetime.fromisoformat(value["__datetime__"])
+        return {key: decode(item) for key, item in value.items()}
+    return value
+
+
+class PluginHost:
+    """Starts the plugin host process, and sends it the calls of isolated plugins.
+
+    All methods must be called from the main thread.
+    """
+
+    def __init__(self, set_timeout: typing.Callable[..., Timer]) -> None:
+        self.__set_timeout = set_timeout
+        self.__process: typing.Optional[subprocess.Popen] = None
+        self.__writes: typing.Optional[queue.Queue[typing.Optional[bytes]]] = None
+        # increased whenever the host is started, to ignore the previous one
+        self.__generation = 0
+        self.__next_id = 0
+        self.__outgoing: list[dict] = []
+        # message id -> (callback for the reply, deadline)
+        self.__pending: dict[
+            int, tuple[typing.Callable[[typing.Optional[dict]], None], Timer]
+        ] = {}
+        # plugin id -> load message, sent again when the host is started again
+        self.__loaded: dict[str, dict] = {}
+        self.__restart_delay: float = RESTART_DELAY
+        self.__restart_timer: typing.Optional[Timer] = None
+        self.__stopped = False
+
+    def load(
+        self,
+        plugin_id: str,
+        plugins_dir: str,
+        context: dict,
+        safeeyes_config: Config,
+        plugin_config: dict,
+    ) -> None:
+        """Import the plugin in the host if needed, and initialize it."""
+        message = {
+            "op": "load",
+            "plugin": plugin_id,
+            "dir": plugins_dir,
+            "context": {key: context[key] for key in CONTEXT_KEYS if key in context},
+            "config": safeeyes_config.as_dict(),
+            "settings": plugin_config,
+        }
+        self.__loaded[plugin_id] = message
+        if self.__writes is None and self.__restart_timer is None:
+            self.__start()
+        else:
+            self.__send(dict(message), None, CALL_TIMEOUT)
+
+    def unload(self, plugin_id: str) -> None:
+        """Forget the plugin, so that it is imported again the next time."""
+        if self.__loaded.pop(plugin_id, None) is not None:
+            self.__send({"op": "unload", "plugin": plugin_id}, None, CALL_TIMEOUT)
+
+    def call(
+        self,
+        plugin_id: str,
+        method_name: str,
+        args: typing.Sequence = (),
+        timeout: float = CALL_TIMEOUT,
+        on_reply: typing.Optional[
+            typing.Callable[[typing.Optional[dict]], None]
+        ] = None,
+        widget: bool = False,
+    ) -> None:
+        """Call the method of the plugin in the host.
+
+        The reply has the "result" of the method, and "widget" the title and content
+        of the plugin's widget, if widget is set. on_reply is called with None if the
+        method failed or did not return before the timeout.
+        """
+        message = {
+            "op": "call",
+            "plugin": plugin_id,
+            "method": method_name,
+            "args": encode(list(args)),
+            "widget": widget,
+        }
+        self.__send(message, on_reply, timeout)
+
+    def stop(self) -> None:
+        """Send the remaining calls, and stop the host once it answered them."""
+        self.__stopped = True
+        if self.__restart_timer is not None:
+            self.__restart_timer.cancel()
+            self.__restart_timer = None
+        self.flush()
+        for _, timer in self.__pending.values():
+            timer.cancel()
+        self.__pending.clear()
+
+        if self.__writes is not None:
+            # The writer closes the socket once it sent everything
+            self.__writes.put(None)
+            self.__writes = None
+        if self.__process is not None:
+            try:
+                self.__process.wait(CALL_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.__process.kill()
+                self.__process.wait()
+            self.__process = None
+
+    def flush(self) -> None:
+        """Send the calls made since the last flush, as one line."""
+        messages = self.__outgoing
+        self.__outgoing = []
+        if messages and self.__writes is not None:
+            self.__writes.put(json.dumps(messages).encode("utf-8") + b"\n")
+
+    def __send(
+        self,
+        message: dict,
+        on_reply: typing.Optional[typing.Callable[[typing.Optional[dict]], None]],
+        timeout: float,
+    ) -> None:
+        if self.__writes is None:
+            # The host is not running
+            if on_reply is not None:
+                on_reply(None)
+            return
+
+        self.__next_id += 1
+        message["id"] = self.__next_id
+        timer = self.__set_timeout(
+            timeout, self.__on_deadline, self.__next_id, self.__generation
+        )
+        self.__pending[self.__next_id] = (on_reply or _ignore_reply, timer)
+        if not self.__outgoing:
+            utility.execute_main_thread(self.flush)
+        self.__outgoing.append(message)
+
+    def __start(self) -> None:
+        self.__restart_timer = None
+        self.__generation += 1
+        package_dir = os.path.dirname(utility.BIN_DIRECTORY)
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, (package_dir, os.environ.get("PYTHONPATH")))
+        )
+        debug = logging.getLogger().getEffectiveLevel() == logging.DEBUG
+
+        (connection, child_connection) = socket.socketpair()
+        try:
+            with child_connection:
+                self.__process = subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "safeeyes.plugin_host",
+                        str(child_connection.fileno()),
+                        "debug" if debug else "info",
+                    ],
+                    pass_fds=(child_connection.fileno(),),
+                    env=env,
+                )
+        except OSError:
+            logging.exception("Failed to start the plugin host")
+            connection.close()
+            self.__schedule_restart()
+            return
+
+        logging.info("Started the plugin host, pid %d", self.__process.pid)
+        self.__writes = queue.Queue()
+        threading.Thread(
+            target=self.__write_messages,
+            args=(connection, self.__writes),
+            name="WorkThread PluginHost writer",
+            daemon=True,
+        ).start()
+        threading.Thread(
+            target=self.__read_replies,
+            args=(connection, self.__generation),
+            name="WorkThread PluginHost reader",
+            daemon=True,
+        ).start()
+        for message in self.__loaded.values():
+            self.__send(dict(message), None, CALL_TIMEOUT)
+
+    def __schedule_restart(self) -> None:
+        if self.__stopped:
+            return
+        logging.warning("Starting the plugin host in %d seconds", self.__restart_delay)
+        self.__restart_timer = self.__set_timeout(self.__restart_delay, self.__start)
+        self.__restart_delay = min(self.__restart_delay * 2, MAX_RESTART_DELAY)
+
+    @staticmethod
+    def __write_messages(
+        connection: socket.socket, writes: queue.Queue[typing.Optional[bytes]]
+    ) -> None:
+        try:
+            while True:
+                line = writes.get()
+                if line is None:
+                    break
+                connection.sendall(line)
+            connection.shutdown(socket.SHUT_WR)
+        except OSError:
+            # The host stopped, which the reader notices
+            pass
+
+    def __read_replies(self, connection: socket.socket, generation: int) -> None:
+        try:
+            with connection, connection.makefile("rb") as reader:
+                for line in reader:
+                    utility.execute_main_thread(
+                        self.__on_replies, generation, json.loads(line)
+                    )
+        except (OSError, ValueError):
+            logging.exception("Failed to read from the plugin host")
+        utility.execute_main_thread(self.__on_exit, generation)
+
+    def __on_replies(self, generation: int, replies: list[dict]) -> None:
+        if generation != self.__generation:
+            return
+        self.__restart_delay = RESTART_DELAY
+        for reply in replies:
+            entry = self.__pending.pop(reply["id"], None)
+            if entry is None:
+                # Already timed out
+                continue
+            (on_reply, timer) = entry
+            timer.cancel()
+            if "error" in reply:
+                on_reply(None)
+            else:
+                on_reply(reply)
+
+    def __on_deadline(self, message_id: int, generation: int) -> None:
+        entry = self.__pending.pop(message_id, None)
+        if entry is None or generation != self.__generation:
+            return
+        logging.warning("The plugin host did not answer in time, stopping it")
+        if self.__process is not None:
+            # The reader notices that the host stopped, and starts it again
+            self.__process.kill()
+        entry[0](None)
+
+    def __on_exit(self, generation: int) -> None:
+        if generation != self.__generation or self.__process is None:
+            return
+        self.__process.kill()
+        returncode = self.__process.wait()
+        self.__process = None
+        if self.__writes is not None:
+            self.__writes.put(None)
+            self.__writes = None
+        if not self.__stopped:
+            logging.warning("The plugin host stopped with exit code %d", returncode)
+
+        self.__outgoing = []
+        pending = list(self.__pending.values())
+        self.__pending.clear()
+        for on_reply, timer in pending:
+            timer.cancel()
+            on_reply(None)
+
+        self.__schedule_restart()
+
+
+def _ignore_reply(reply: typing.Optional[dict]) -> None:
+    pass
+
+
+class _Host:
+    """The plugin host process: calls the plugins for the messages on the socket."""
+
+    def __init__(self, connection: socket.socket) -> None:
+        self.__connection = connection
+        self.__modules: dict[str, typing.Any] = {}
+
+    def run(self) -> None:
+        with self.__connection, self.__connection.makefile("rb") as reader:
+            for line in reader:
+                replies = [self.__handle(message) for message in json.loads(line)]
+                self.__connection.sendall(json.dumps(replies).encode("utf-8") + b"\n")
+
+    def __handle(self, message: dict) -> dict:
+        reply: dict[str, typing.Any] = {"id": message["id"]}
+        try:
+            if message["op"] == "load":
+                self.__load(message)
+            elif message["op"] == "unload":
+                self.__unload(message["plugin"])
+            elif message["op"] == "call":
+                module = self.__modules[message["plugin"]]
+                args = decode(message["args"])
+                reply["result"] = encode(self.__call(module, message["method"], *args))
+                if message["widget"]:
+                    reply["widget"] = [
+                        encode(self.__call(module, "get_widget_title", *args)),
+                        encode(self.__call(module, "get_widget_content", *args)),
+                    ]
+            else:
+                raise Exception("Unknown operation: %s" % message["op"])
+        except BaseException as e:
+            logging.exception("Error in the plugin %s", message.get("plugin"))
+            reply["error"] = str(e)
+        return reply
+
+    def __load(self, message: dict) -> None:
+        plugin_id = message["plugin"]
+        if message["dir"] not in sys.path:
+            sys.path.append(message["dir"])
+        module = self.__modules.get(plugin_id)
+        if module is None:
+            module = importlib.import_module(plugin_id + ".plugin")
+            logging.info("Successfully loaded %s in the plugin host", str(module))
+            self.__modules[plugin_id] = module
+            self.__call(module, "enable")
+
+        context = dict(message["context"])
+        context["api"] = {}
+        context["session"] = {"plugin": {}}
+        safeeyes_config = Config(user_config=message["config"], system_config={})
+        if utility.has_method(module, "init", 3):
+            module.init(context, safeeyes_config, message["settings"])
+
+    def __unload(self, plugin_id: str) -> None:
+        self.__modules.pop(plugin_id, None)
+        for module_name in list(sys.modules):
+            if module_name == plugin_id or module_name.startswith(plugin_id + "."):
+                del sys.modules[module_name]
+        importlib.invalidate_caches()
+
+    @staticmethod
+    def __call(module: typing.Any, method_name: str, *args) -> typing.Any:
+        if utility.has_method(module, method_name, len(args)):
+            return getattr(module, method_name)(*args)
+        return None
+
+
+def main() -> None:
+    """Run the plugin host on the socket given by its file descriptor."""
+    logging.basicConfig(
+        format="%(asctime)s [%(levelname)s]:[plugin host] %(message)s",
+        level=logging.DEBUG if sys.argv[2] == "debug" else logging.INFO,
+    )
+    _Host(socket.socket(fileno=int(sys.argv[1]))).run()
+
+
+if __name__ == "__main__":
+    main()
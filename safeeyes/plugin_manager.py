@@ -62,15 +62,52 @@ The plugin.py can additionally have the following methods:
 This method is unused:
  - description()
     If a custom description has to be displayed, use this function
+
+If the config.json sets "hook_timeout" (in seconds), on_pre_break, on_start_break
+and update_next_break are called in a worker thread, so they must not use GTK. Slow
+plugins then do not block the main loop. If the plugin does not return in time, the
+break is started or skipped depending on the allow_break_on_plugin_timeout setting.
+
+Every call of a plugin method is timed, see PluginManager.format_stats().
+
+The methods are looked up once: for every method, PluginManager keeps the list of
+the plugins that implement it and are enabled. These lists are built again once
+plugins are loaded or reconfigured.
+
+If the config.json lists the methods of the plugin.py in "hooks", the plugin.py is
+not imported on startup, but once one of these methods is called for the first
+time. It is then enabled, and initialized with the latest config. The methods
+on_stop, on_exit and disable do not import the plugin, they have nothing to clean
+up before it is imported. Plugins without "hooks" are imported on startup, as are
+plugins that must do something in init, like the tray icon.
+
+A user plugin whose entry in safeeyes.json sets "isolated": true is not imported,
+but runs in the plugin host process, see safeeyes.plugin_host. Its methods are
+called without waiting for them. on_pre_break and on_start_break are limited to
+its hook_timeout, or plugin_host.CALL_TIMEOUT, like the methods called in a worker
+thread. The widget is requested together with on_start_break.
 """
 
+import bisect
+import concurrent.futures
+import functools
 import importlib
 import logging
 import os
 import sys
+import threading
+import time
+import typing
 
+from safeeyes import plugin_host
 from safeeyes import utility
-from safeeyes.model import Break, PluginDependency, RequiredPluginException, TrayAction
+from safeeyes.model import (
+    Break,
+    PendingResult,
+    PluginDependency,
+    RequiredPluginException,
+    TrayAction,
+)
 
 sys.path.append(os.path.abspath(utility.SYSTEM_PLUGINS_DIR))
 sys.path.append(os.path.abspath(utility.USER_PLUGINS_DIR))
@@ -78,12 +115,64 @@ sys.path.append(os.path.abspath(utility.USER_PLUGINS_DIR))
 HORIZONTAL_LINE_LENGTH = 64
 
 
+class LatencyHistogram:
+    """Counts durations in fixed buckets, to find slow plugin methods."""
+
+    # upper bounds of the buckets in seconds, the last bucket has no bound
+    BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+    count: int = 0
+    total: float = 0
+    max: float = 0
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Return the upper bound of the bucket containing the given percentile."""
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                if index < len(self.BUCKETS):
+                    return self.BUCKETS[index]
+                break
+        return self.max
+
+    def format(self) -> str:
+        if self.count == 0:
+            return "n=0"
+        return "n={} avg={:.1f}ms p50<={:g}ms p99<={:g}ms max={:.1f}ms".format(
+            self.count,
+            self.total / self.count * 1000,
+            self.percentile(0.5) * 1000,
+            self.percentile(0.99) * 1000,
+            self.max * 1000,
+        )
+
+
 class PluginManager:
     """Imports the Safe Eyes plugins and calls the methods defined in those plugins."""
 
     def __init__(self):
         logging.info("Load all the plugins")
         self.__plugins = {}
+        self.__executor: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.__set_timeout = None
+        self.__context = None
+        self.__timeout_allows_break = True
+        # (method name, number of arguments, plugins enabled by the break) ->
+        # [(plugin, method)] of the plugins that implement the method
+        self.__hooks: dict[tuple, list[tuple[LoadedPlugin, typing.Callable]]] = {}
+        # runs the isolated plugins, started once one is loaded
+        self.__host: typing.Optional[plugin_host.PluginHost] = None
         self.last_break = None
         self.horizontal_line = "─" * HORIZONTAL_LINE_LENGTH
 
@@ -91,28 +180,119 @@ class PluginManager:
         """Initialize all the plugins with init(context, safe_eyes_config,
         plugin_config) function.
         """
+        self.__set_timeout = context["api"]["set_timeout"]
+        self.__context = context
+        self.__timeout_allows_break = config.get("allow_break_on_plugin_timeout")
         # Load the plugins
-        for plugin in config.get("plugins"):
-            try:
-                loaded_plugin = LoadedPlugin(plugin)
-                self.__plugins[loaded_plugin.id] = loaded_plugin
-            except RequiredPluginException as e:
-                raise e
-            except BaseException as e:
-                traceback_wanted = (
-                    logging.getLogger().getEffectiveLevel() == logging.DEBUG
-                )
-                if traceback_wanted:
-                    import traceback
-
-                    traceback.print_exc()
-                logging.error("Error in loading the plugin %s: %s", plugin["id"], e)
-                continue
+        self.__hooks.clear()
+        try:
+            for plugin in config.get("plugins"):
+                self.__load_plugin(plugin)
+        finally:
+            # Write the results of the dependency checks once for all plugins
+            utility.save_dependency_cache()
         # Initialize the plugins
         for plugin in self.__plugins.values():
             plugin.init_plugin(context, config)
         return True
 
+    def reload(self, context, config, plugin_ids, reinitialize_all, running):
+        """Apply modified settings without loading all plugins again.
+
+        Only the plugins with the given ids are reloaded with their new settings,
+        which checks their dependencies again. They are initialized again, and so
+        are all other plugins if reinitialize_all is set. If running, the plugins
+        that are initialized again are stopped before and started after that.
+
+        Raises RequiredPluginException once all plugins are reloaded if a required
+        plugin failed its dependency check.
+        """
+        self.__timeout_allows_break = config.get("allow_break_on_plugin_timeout")
+        self.__hooks.clear()
+        required_error = None
+        for plugin in config.get("plugins"):
+            changed = plugin["id"] in plugin_ids
+            if not changed and not reinitialize_all:
+                continue
+
+            loaded_plugin = self.__plugins.get(plugin["id"])
+            if loaded_plugin is None:
+                loaded_plugin = self.__load_plugin(plugin)
+                if loaded_plugin is None:
+                    continue
+            else:
+                if running:
+                    loaded_plugin.call_plugin_method("on_stop")
+                if changed:
+                    try:
+                        loaded_plugin.reload_config(plugin)
+                    except RequiredPluginException as e:
+                        required_error = required_error or e
+
+            loaded_plugin.init_plugin(context, config)
+            if running:
+                loaded_plugin.call_plugin_method("on_start")
+
+        utility.save_dependency_cache()
+        if required_error is not None:
+            raise required_error
+
+    def reload_plugin(self, context, config, plugin_id, running):
+        """Import the given plugin again, after its files changed."""
+        loaded_plugin = self.__plugins.get(plugin_id)
+        if loaded_plugin is not None:
+            if running:
+                loaded_plugin.call_plugin_method("on_stop")
+            loaded_plugin.call_plugin_method("on_exit")
+            if loaded_plugin.host is not None:
+                loaded_plugin.host.unload(plugin_id)
+        for module_name in list(sys.modules):
+            if module_name == plugin_id or module_name.startswith(plugin_id + "."):
+                del sys.modules[module_name]
+        importlib.invalidate_caches()
+        utility.forget_plugin_config(plugin_id)
+        self.__hooks.clear()
+
+        # The plugin keeps its position, so that the plugins are still called in the
+        # order of the config
+        loaded_plugin = None
+        try:
+            for plugin in config.get("plugins"):
+                if plugin["id"] == plugin_id:
+                    loaded_plugin = self.__load_plugin(plugin)
+                    break
+        finally:
+            if loaded_plugin is None:
+                self.__plugins.pop(plugin_id, None)
+            utility.save_dependency_cache()
+
+        if loaded_plugin is not None:
+            loaded_plugin.init_plugin(context, config)
+            if running:
+                loaded_plugin.call_plugin_method("on_start")
+
+    def __load_plugin(self, plugin) -> typing.Optional["LoadedPlugin"]:
+        try:
+            host = self.__get_host() if plugin.get("isolated", False) else None
+            loaded_plugin = LoadedPlugin(plugin, host)
+            self.__plugins[loaded_plugin.id] = loaded_plugin
+            return loaded_plugin
+        except RequiredPluginException as e:
+            raise e
+        except BaseException as e:
+            traceback_wanted = logging.getLogger().getEffectiveLevel() == logging.DEBUG
+            if traceback_wanted:
+                import traceback
+
+                traceback.print_exc()
+            logging.error("Error in loading the plugin %s: %s", plugin["id"], e)
+            return None
+
+    def __get_host(self) -> plugin_host.PluginHost:
+        if self.__host is None:
+            self.__host = plugin_host.PluginHost(self.__set_timeout)
+        return self.__host
+
     def needs_retry(self):
         return self.get_retryable_error() is not None
 
@@ -130,6 +310,7 @@ class PluginManager:
         return None
 
     def retry_errored_plugins(self):
+        self.__hooks.clear()
         for plugin in self.__plugins.values():
             if plugin.required_plugin and plugin.errored and plugin.enabled:
                 if (
@@ -137,59 +318,204 @@ class PluginManager:
                     and plugin.last_error.retryable
                 ):
                     plugin.reload_errored()
+        utility.save_dependency_cache()
 
     def start(self):
         """Execute the on_start() function of plugins."""
-        for plugin in self.__plugins.values():
-            plugin.call_plugin_method("on_start")
+        for _, hook in self.__get_hooks("on_start"):
+            hook()
         return True
 
     def stop(self):
         """Execute the on_stop() function of plugins."""
-        for plugin in self.__plugins.values():
-            plugin.call_plugin_method("on_stop")
+        for _, hook in self.__get_hooks("on_stop"):
+            hook()
         return True
 
     def exit(self):
         """Execute the on_exit() function of plugins."""
-        for plugin in self.__plugins.values():
-            plugin.call_plugin_method("on_exit")
+        for _, hook in self.__get_hooks("on_exit"):
+            hook()
+        if self.__host is not None:
+            self.__host.stop()
+            self.__host = None
+        logging.info("Plugin statistics:\n%s", self.format_stats())
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
         return True
 
     def pre_break(self, break_obj):
         """Execute the on_pre_break(break_obj) function of plugins."""
-        for plugin in self.__plugins.values():
-            if plugin.call_plugin_method_break_obj("on_pre_break", 1, break_obj):
-                return False
-        return True
+        return self.__call_break_hook("on_pre_break", break_obj)
 
     def start_break(self, break_obj):
         """Execute the start_break(break_obj) function of plugins."""
         self.last_break = break_obj
-        for plugin in self.__plugins.values():
-            if plugin.call_plugin_method_break_obj("on_start_break", 1, break_obj):
-                return False
-
-        return True
+        return self.__call_break_hook("on_start_break", break_obj)
 
     def stop_break(self):
         """Execute the stop_break() function of plugins."""
-        for plugin in self.__plugins.values():
-            plugin.call_plugin_method("on_stop_break")
+        for _, hook in self.__get_hooks("on_stop_break"):
+            hook()
 
     def countdown(self, countdown, seconds):
         """Execute the on_countdown(countdown, seconds) function of plugins."""
-        for plugin in self.__plugins.values():
-            plugin.call_plugin_method("on_countdown", 2, countdown, seconds)
+        for _, hook in self.__get_hooks("on_countdown", 2):
+            hook(countdown, seconds)
 
     def update_next_break(self, break_obj, break_time):
         """Execute the update_next_break(break_time) function of plugins."""
-        for plugin in self.__plugins.values():
-            plugin.call_plugin_method_break_obj(
-                "update_next_break", 2, break_obj, break_time
-            )
+        for plugin, hook in self.__get_hooks("update_next_break", 2, break_obj):
+            if plugin.hook_timeout is not None and plugin.host is None:
+                self.__call_in_thread(
+                    plugin, "update_next_break", hook, break_obj, break_time
+                )
+            else:
+                hook(break_obj, break_time)
         return True
 
+    def __get_hooks(
+        self,
+        method_name: str,
+        num_args: int = 0,
+        break_obj: typing.Optional[Break] = None,
+    ) -> list[tuple["LoadedPlugin", typing.Callable]]:
+        """Return the plugins that implement the method, with the method.
+
+        If a break is given, plugins that allow overriding can be enabled or
+        disabled by the break.
+        """
+        break_plugins = break_obj.plugins if break_obj is not None else None
+        key = (method_name, num_args, break_plugins)
+        hooks = self.__hooks.get(key)
+        if hooks is None:
+            hooks = []
+            for plugin in self.__plugins.values():
+                if plugin.errored:
+                    continue
+                if break_obj is not None and plugin.break_override_allowed:
+                    enabled = break_obj.plugin_enabled(plugin.id, plugin.enabled)
+                else:
+                    enabled = plugin.enabled
+                if enabled:
+                    hook = plugin.get_hook(method_name, num_args)
+                    if hook is not None:
+                        hooks.append((plugin, hook))
+            self.__hooks[key] = hooks
+        return hooks
+
+    def __call_break_hook(self, method_name, break_obj):
+        """Call the method of all plugins. The break is skipped if any returns True.
+
+        Returns a PendingResult if some of the plugins run in a worker thread.
+        """
+        hooks = self.__get_hooks(method_name, 1, break_obj)
+        pending = []
+        for plugin, hook in hooks:
+            if plugin.host is not None:
+                pending.append(self.__call_in_host(plugin, method_name, break_obj))
+            elif plugin.hook_timeout is not None:
+                pending.append(
+                    self.__call_in_thread(plugin, method_name, hook, break_obj)
+                )
+
+        for plugin, hook in hooks:
+            if plugin.hook_timeout is None and plugin.host is None:
+                if hook(break_obj):
+                    self.__set_vetoed_by(plugin)
+                    return False
+
+        if not pending:
+            return True
+        return PendingResult.all(pending)
+
+    def __call_in_thread(
+        self, plugin: "LoadedPlugin", method_name: str, hook: typing.Callable, *args
+    ) -> PendingResult:
+        """Call the method in a worker thread, limited to the plugin's hook_timeout.
+
+        The result is False if the plugin wants to skip the break.
+        """
+        result = PendingResult()
+
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(
+                thread_name_prefix="safeeyes-plugin"
+            )
+
+        def on_timeout() -> None:
+            logging.warning(
+                "Plugin %s did not finish %s within %s seconds",
+                plugin.id,
+                method_name,
+                plugin.hook_timeout,
+            )
+            if not self.__timeout_allows_break:
+                self.__set_vetoed_by(plugin)
+            result.set_result(self.__timeout_allows_break)
+
+        timer = self.__set_timeout(plugin.hook_timeout, on_timeout)
+
+        def on_finished(future: concurrent.futures.Future) -> None:
+            timer.cancel()
+            try:
+                skip_break = future.result()
+            except BaseException:
+                logging.exception("Error in %s of plugin %s", method_name, plugin.id)
+                skip_break = False
+            if skip_break and not result.done:
+                self.__set_vetoed_by(plugin)
+            result.set_result(not skip_break)
+
+        # Import the plugin in the main thread, it may use GTK while importing
+        plugin.ensure_imported()
+        future = self.__executor.submit(hook, *args)
+        future.add_done_callback(
+            lambda future: utility.execute_main_thread(on_finished, future)
+        )
+
+        return result
+
+    def __call_in_host(
+        self, plugin: "LoadedPlugin", method_name: str, break_obj: Break
+    ) -> PendingResult:
+        """Call the method in the plugin host, limited to the plugin's deadline.
+
+        The result is False if the plugin wants to skip the break.
+        """
+        result = PendingResult()
+
+        def on_result(skip_break: typing.Any) -> None:
+            if skip_break:
+                self.__set_vetoed_by(plugin)
+            result.set_result(not skip_break)
+
+        def on_failure() -> None:
+            if not self.__timeout_allows_break:
+                self.__set_vetoed_by(plugin)
+            result.set_result(self.__timeout_allows_break)
+
+        plugin.call_in_host(method_name, (break_obj,), on_result, on_failure)
+        return result
+
+    def __set_vetoed_by(self, plugin: "LoadedPlugin") -> None:
+        """Remember the first plugin that skipped the break, for the break history."""
+        if self.__context is not None and self.__context.get("vetoed_by") is None:
+            self.__context["vetoed_by"] = plugin.id
+
+    def format_stats(self) -> str:
+        """Return the latency of the plugin methods and the CPU time of plugins."""
+        lines = []
+        for plugin in sorted(self.__plugins.values(), key=lambda p: p.id):
+            stats = plugin.get_stats()
+            if not stats:
+                continue
+            lines.append("{}: cpu={:.3f}s".format(plugin.id, plugin.cpu_time))
+            for method_name, histogram in sorted(stats.items()):
+                lines.append("  {}: {}".format(method_name, histogram.format()))
+        return "\n".join(lines)
+
     def get_break_screen_widgets(self, break_obj):
         """Return the HTML widget generated by the plugins.
 
@@ -197,16 +523,15 @@ class PluginManager:
         get_widget_content functions of plugins.
         """
         widget = ""
-        for plugin in self.__plugins.values():
+        for plugin, get_title in self.__get_hooks("get_widget_title", 1, break_obj):
+            get_content = plugin.get_hook("get_widget_content", 1)
+            if get_content is None:
+                continue
             try:
-                title = plugin.call_plugin_method_break_obj(
-                    "get_widget_title", 1, break_obj
-                )
+                title = get_title(break_obj)
                 if title is None or not isinstance(title, str) or title == "":
                     continue
-                content = plugin.call_plugin_method_break_obj(
-                    "get_widget_content", 1, break_obj
-                )
+                content = get_content(break_obj)
                 if content is None or not isinstance(content, str) or content == "":
                     continue
                 title = title.upper().strip()
@@ -222,10 +547,8 @@ class PluginManager:
     def get_break_screen_tray_actions(self, break_obj: Break) -> list[TrayAction]:
         """Return Tray Actions."""
         actions = []
-        for plugin in self.__plugins.values():
-            action = plugin.call_plugin_method_break_obj(
-                "get_tray_action", 1, break_obj
-            )
+        for _, hook in self.__get_hooks("get_tray_action", 1, break_obj):
+            action = hook(break_obj)
             if isinstance(action, TrayAction):
                 actions.append(action)
             elif isinstance(action, list):
@@ -236,12 +559,25 @@ class PluginManager:
         return actions
 
 
+# methods that do not import a plugin that is imported lazily
+CLEANUP_METHODS = frozenset(("on_stop", "on_exit", "disable"))
+
+
 class LoadedPlugin:
     # state of the plugin
     enabled: bool = False
     break_override_allowed: bool = False
     errored: bool = False
     required_plugin: bool = False
+    # seconds the break hooks may run in a worker thread, None to run them in the
+    # main thread
+    hook_timeout: typing.Optional[float] = None
+    # CPU time spent in the methods of this plugin, in seconds
+    cpu_time: float = 0
+    # methods listed in the config.json, None if the plugin is imported on startup
+    declared_hooks: typing.Optional[frozenset[str]] = None
+    # the plugin host the plugin runs in, None if it is imported
+    host: typing.Optional[plugin_host.PluginHost] = None
 
     # misc data
     # FIXME: rename to plugin_config to plugin_json? plugin_config and config are easy
@@ -249,11 +585,23 @@ class LoadedPlugin:
     config = None
     plugin_config = None
     plugin_dir = None
-    module = None
+    module: typing.Any = None
     last_error = None
-    id = None
-
-    def __init__(self, plugin):
+    id: typing.Any = None
+
+    def __init__(self, plugin, host: typing.Optional[plugin_host.PluginHost] = None):
+        # (method name, number of arguments) -> the method, if the module has it
+        self.__hooks: dict[tuple[str, int], typing.Optional[typing.Callable]] = {}
+        # the arguments of init, until a lazily imported plugin is imported
+        self.__init_args: typing.Optional[tuple] = None
+        # title and content of the widget of an isolated plugin
+        self.__widget: tuple[typing.Any, typing.Any] = (None, None)
+        self.__stats: dict[str, LatencyHistogram] = {}
+        # methods can be called from the main thread and worker threads
+        self.__stats_lock = threading.Lock()
+        self.__load(plugin, host)
+
+    def __load(self, plugin, host: typing.Optional[plugin_host.PluginHost]):
         (plugin_config, plugin_dir) = self._load_config_json(plugin["id"])
 
         self.id = plugin["id"]
@@ -262,6 +610,14 @@ class LoadedPlugin:
         self.enabled = plugin["enabled"]
         self.break_override_allowed = plugin_config.get("break_override_allowed", False)
         self.required_plugin = plugin_config.get("required_plugin", False)
+        self.hook_timeout = plugin_config.get("hook_timeout")
+        if "hooks" in plugin_config:
+            self.declared_hooks = frozenset(plugin_config["hooks"])
+        if host is not None:
+            if plugin_dir == utility.USER_PLUGINS_DIR:
+                self.host = host
+            else:
+                logging.warning("Only user plugins can be isolated: %s", self.id)
 
         self.config = dict(plugin.get("settings", {}))
         self.config["path"] = os.path.join(plugin_dir, plugin["id"])
@@ -275,24 +631,38 @@ class LoadedPlugin:
             if message:
                 self.errored = True
                 self.last_error = message
-                if self.required_plugin and not (
-                    isinstance(message, PluginDependency) and message.retryable
-                ):
-                    raise RequiredPluginException(
-                        plugin["id"], plugin_config["meta"]["name"], message
-                    )
+                self.__raise_if_required(message)
                 return
 
-            self._import_plugin()
+            self.__import_eagerly()
+
+    def __raise_if_required(self, message) -> None:
+        """Raise RequiredPluginException if this plugin is required, unless the
+        dependency check can be retried.
+        """
+        if self.required_plugin and not (
+            isinstance(message, PluginDependency) and message.retryable
+        ):
+            raise RequiredPluginException(self.id, self.get_name(), message)
 
     def reload_config(self, plugin):
         if self.enabled and not plugin["enabled"]:
             self.enabled = False
-            if not self.errored and utility.has_method(self.module, "disable"):
+            if self.errored:
+                pass
+            elif self.host is not None:
+                self.host.call(self.id, "disable")
+            elif utility.has_method(self.module, "disable"):
                 self.module.disable()
 
         if not self.enabled and plugin["enabled"]:
             self.enabled = True
+            if self.errored:
+                pass
+            elif self.host is not None:
+                self.host.call(self.id, "enable")
+            elif utility.has_method(self.module, "enable"):
+                self.module.enable()
 
         # Update the config
         self.config = dict(plugin.get("settings", {}))
@@ -307,13 +677,14 @@ class LoadedPlugin:
             if message:
                 self.errored = True
                 self.last_error = message
+                self.__raise_if_required(message)
             elif self.errored:
                 self.errored = False
                 self.last_error = None
 
             if not self.errored and self.module is None:
                 # No longer errored, import the module now
-                self._import_plugin()
+                self.__import_eagerly()
 
     def reload_errored(self):
         if not self.errored:
@@ -334,23 +705,67 @@ class LoadedPlugin:
 
             if not self.errored and self.module is None:
                 # No longer errored, import the module now
-                self._import_plugin()
+                self.__import_eagerly()
 
     def get_name(self):
         return self.plugin_config["meta"]["name"]
 
+    def get_stats(self) -> dict[str, LatencyHistogram]:
+        """Return the latency of every method of this plugin that was called."""
+        with self.__stats_lock:
+            return dict(self.__stats)
+
+    def __import_eagerly(self) -> None:
+        # Lazily imported and isolated plugins are imported once they are called
+        if self.declared_hooks is None and self.host is None:
+            self._import_plugin()
+
     def _import_plugin(self):
         if self.errored:
             # do not try to import errored plugin
             return
 
         self.module = importlib.import_module((self.id + ".plugin"))
+        self.__hooks.clear()
         logging.info("Successfully loaded %s", str(self.module))
 
         if utility.has_method(self.module, "enable"):
             self.module.enable()
 
+        if self.declared_hooks is not None:
+            missing = [
+                name
+                for name in sorted(self.declared_hooks)
+                if not utility.has_method(self.module, name)
+            ]
+            if missing:
+                logging.warning(
+                    "Plugin %s does not have the hooks listed in its config.json: %s",
+                    self.id,
+                    ", ".join(missing),
+                )
+
+        if self.__init_args is not None:
+            (context, safeeyes_config) = self.__init_args
+            self.__init_args = None
+            self.init_plugin(context, safeeyes_config)
+
+    def ensure_imported(self) -> None:
+        """Import the plugin now, if it is imported lazily and was not yet."""
+        if self.module is None and not self.errored:
+            try:
+                self._import_plugin()
+            except BaseException as e:
+                logging.exception("Error in importing the plugin %s", self.id)
+                self.errored = True
+                self.last_error = str(e)
+
     def _load_config_json(self, plugin_id):
+        cached = utility.get_plugin_config(plugin_id)
+        if cached is not None:
+            # Already read when merging the config
+            return cached
+
         # Look for plugin.py
         if os.path.isfile(
             os.path.join(utility.SYSTEM_PLUGINS_DIR, plugin_id, "plugin.py")
@@ -377,7 +792,14 @@ class LoadedPlugin:
         if self.errored:
             return
         if self.break_override_allowed or self.enabled:
-            if utility.has_method(self.module, "init", 3):
+            if self.host is not None:
+                self.host.load(
+                    self.id, self.plugin_dir, context, safeeyes_config, self.config
+                )
+            elif self.module is None and self.declared_hooks is not None:
+                # Initialized once it is imported
+                self.__init_args = (context, safeeyes_config)
+            elif utility.has_method(self.module, "init", 3):
                 self.module.init(context, safeeyes_config, self.config)
 
     def call_plugin_method_break_obj(
@@ -410,10 +832,129 @@ class LoadedPlugin:
 
         return None
 
+    def get_hook(
+        self, method_name: str, num_args=0
+    ) -> typing.Optional[typing.Callable]:
+        """Return the method of the plugin, if it takes the number of arguments.
+
+        Calls of the returned method are timed. The enabled and errored states are
+        not checked.
+        """
+        key = (method_name, num_args)
+        if key not in self.__hooks:
+            hook = None
+            if self.host is not None:
+                hook = self.__get_host_hook(method_name, num_args)
+            elif self.module is None and self.declared_hooks is not None:
+                if method_name in self.declared_hooks:
+                    hook = functools.partial(
+                        self.__call_lazy,
+                        method_name,
+                        num_args,
+                        method_name not in CLEANUP_METHODS,
+                    )
+            elif utility.has_method(self.module, method_name, num_args):
+                hook = functools.partial(
+                    self.__call, method_name, getattr(self.module, method_name)
+                )
+            self.__hooks[key] = hook
+        return self.__hooks[key]
+
+    def __get_host_hook(
+        self, method_name: str, num_args: int
+    ) -> typing.Optional[typing.Callable]:
+        if plugin_host.METHODS.get(method_name) != num_args:
+            return None
+        if self.declared_hooks is not None and method_name not in self.declared_hooks:
+            # The widget is requested with on_start_break
+            if not (
+                method_name == "on_start_break"
+                and "get_widget_title" in self.declared_hooks
+            ):
+                return None
+        if method_name == "get_widget_title":
+            return lambda break_obj: self.__widget[0]
+        if method_name == "get_widget_content":
+            return lambda break_obj: self.__widget[1]
+        return functools.partial(self.__call_in_host_later, method_name)
+
+    def call_in_host(
+        self,
+        method_name: str,
+        args: typing.Sequence,
+        on_result: typing.Optional[typing.Callable[[typing.Any], None]] = None,
+        on_failure: typing.Optional[typing.Callable[[], None]] = None,
+    ) -> None:
+        """Call the method of an isolated plugin, without waiting for it.
+
+        on_result is called with the return value, and on_failure if the method
+        failed or did not return before the deadline.
+        """
+        if self.host is None:
+            raise Exception("Plugin %s is not isolated" % self.id)
+        start = time.monotonic()
+        widget = method_name == "on_start_break"
+        if widget:
+            self.__widget = (None, None)
+
+        def on_reply(reply: typing.Optional[dict]) -> None:
+            self.__record(method_name, time.monotonic() - start, 0)
+            if reply is None:
+                if on_failure is not None:
+                    on_failure()
+                return
+            if widget:
+                (title, content) = reply["widget"]
+                self.__widget = (title, content)
+            if on_result is not None:
+                on_result(reply["result"])
+
+        self.host.call(
+            self.id,
+            method_name,
+            args,
+            self.hook_timeout or plugin_host.CALL_TIMEOUT,
+            on_reply,
+            widget,
+        )
+
+    def __call_in_host_later(self, method_name: str, *args) -> None:
+        self.call_in_host(method_name, args)
+
     def _call_plugin_method_internal(
         self, method_name: str, num_args=0, *args, **kwargs
     ):
-        # FIXME: cache if method exists
-        if utility.has_method(self.module, method_name, num_args):
-            return getattr(self.module, method_name)(*args, **kwargs)
+        hook = self.get_hook(method_name, num_args)
+        if hook is not None:
+            return hook(*args, **kwargs)
         return None
+
+    def __call_lazy(
+        self, method_name: str, num_args: int, import_module: bool, *args, **kwargs
+    ):
+        # Importing clears the hooks, so get_hook returns the method of the module
+        if import_module:
+            self.ensure_imported()
+        if self.module is None or self.errored:
+            return None
+        return self._call_plugin_method_internal(method_name, num_args, *args, **kwargs)
+
+    def __call(self, method_name: str, method: typing.Callable, *args, **kwargs):
+        start = time.monotonic()
+        cpu_start = time.thread_time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self.__record(
+                method_name,
+                time.monotonic() - start,
+                time.thread_time() - cpu_start,
+            )
+
+    def __record(self, method_name: str, seconds: float, cpu_seconds: float) -> None:
+        with self.__stats_lock:
+            histogram = self.__stats.get(method_name)
+            if histogram is None:
+                histogram = self.__stats[method_name] = LatencyHistogram()
+            histogram.add(seconds)
+            self.cpu_time += cpu_seconds
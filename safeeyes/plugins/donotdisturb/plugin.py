@@ -58,8 +58,8 @@ def is_active_window_skipped_wayland(pre_break):
 def is_active_window_skipped_xorg(pre_break):
     """Check for full-screen applications.
 
-    This method must be executed by the main thread. If not, it will
-    cause random failure.
+    This opens its own connection to the X server, so it can run in the plugin
+    worker thread.
     """
     logging.info("Searching for full-screen application")
 
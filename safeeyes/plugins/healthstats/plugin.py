@@ -20,6 +20,7 @@
 
 import croniter
 import datetime
+import functools
 import logging
 from safeeyes.translations import translate as _
 
@@ -29,6 +30,10 @@ statistics_reset_cron = None
 default_statistics_reset_cron = "0 0 * * *"  # Every midnight
 next_reset_time = None
 start_time = None
+# the break on the screen, which is only recorded in the history once it is over
+current_break = None
+# breaks and skipped breaks since the last reset, as last answered by the history
+break_counts = (0, 0)
 
 
 def init(ctx, safeeyes_config, plugin_config):
@@ -45,40 +50,39 @@ def init(ctx, safeeyes_config, plugin_config):
 
     if session is None:
         # Read the session
-        defaults = {
-            "breaks": 0,
-            "skipped_breaks": 0,
+        session = {
             "screen_time": 0,
             "total_breaks": 0,
             "total_skipped_breaks": 0,
             "total_screen_time": 0,
             "total_resets": 0,
+            "last_reset_time": datetime.datetime.now().timestamp(),
         }
-
-        session = context["session"]["plugin"].get("healthstats", {}).copy()
-        session.update(defaults)
-        if "no_of_breaks" in session:
+        stored_session = context["session"]["plugin"].get("healthstats", {})
+        if "no_of_breaks" not in stored_session:
             # Ignore old format session.
-            session = defaults
+            session.update(stored_session)
+        # The breaks are counted by the break history now
+        session.pop("breaks", None)
+        session.pop("skipped_breaks", None)
         context["session"]["plugin"]["healthstats"] = session
 
     _get_next_reset_time()
+    _request_break_stats()
 
 
 def on_stop_break():
-    # Check if break was skipped.
-    global session
-    if context["skipped"]:
-        session["skipped_breaks"] += 1
-
+    global current_break
+    current_break = None
+    # The break was recorded before
+    _request_break_stats()
     # Screen time is starting again.
     on_start()
 
 
 def on_start_break(break_obj):
-    global session
-    session["breaks"] += 1
-
+    global current_break
+    current_break = break_obj
     # Screen time has stopped.
     on_stop()
 
@@ -97,34 +101,54 @@ def get_widget_title(break_obj):
     return _("Health Statistics")
 
 
+def _request_break_stats():
+    """Update break_counts from the history, without waiting for it."""
+    last_reset_time = session["last_reset_time"]
+    context["api"]["request_break_stats"](
+        functools.partial(_on_break_stats, last_reset_time),
+        since=datetime.datetime.fromtimestamp(last_reset_time),
+    )
+
+
+def _on_break_stats(last_reset_time, stats):
+    global break_counts
+    if last_reset_time == session["last_reset_time"]:
+        break_counts = (stats.breaks, stats.skipped)
+
+
 def _reset_stats():
     global session
+    global break_counts
 
     # Check if the reset time has passed
     if next_reset_time and datetime.datetime.now() >= next_reset_time:
         logging.info("Resetting the health statistics")
+        now = datetime.datetime.now()
 
         # Update the next_reset_time
         _get_next_reset_time()
 
         # Reset statistics
-        session["total_breaks"] += session["breaks"]
-        session["total_skipped_breaks"] += session["skipped_breaks"]
+        (breaks, skipped) = break_counts
+        session["total_breaks"] += breaks
+        session["total_skipped_breaks"] += skipped
         session["total_screen_time"] += session["screen_time"]
         session["total_resets"] += 1
-        session["breaks"] = 0
-        session["skipped_breaks"] = 0
         session["screen_time"] = 0
+        session["last_reset_time"] = now.timestamp()
+        break_counts = (0, 0)
+        _request_break_stats()
 
 
 def get_widget_content(break_obj):
     """Return the statistics."""
     global next_reset_time
     resets = session["total_resets"]
-    if (
-        session["screen_time"] > 21600
-        or (session["breaks"] and session["skipped_breaks"] / session["breaks"]) >= 0.2
-    ):
+    # The history is not queried here, the break screen must not wait for it
+    (breaks, skipped) = break_counts
+    if current_break is not None:
+        breaks += 1
+    if session["screen_time"] > 21600 or (breaks and skipped / breaks) >= 0.2:
         # Unhealthy behavior -> Red broken heart
         heart = "💔️"
     else:
@@ -133,11 +157,10 @@ def get_widget_content(break_obj):
 
     content = [
         heart,
-        f"BREAKS: {session['breaks']}",
-        f"SKIPPED: {session['skipped_breaks']}",
+        f"BREAKS: {breaks}",
+        f"SKIPPED: {skipped}",
         f"SCREEN TIME: {_format_interval(session['screen_time'])}",
     ]
-
     if resets:
         content[1] += f" [{round(session['total_breaks'] / resets, 1)}]"
         content[2] += f" [{round(session['total_skipped_breaks'] / resets, 1)}]"
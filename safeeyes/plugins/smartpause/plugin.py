@@ -165,7 +165,9 @@ def on_start() -> None:
 
             idle_monitor = IdleMonitorExtIdleNotify()
         else:
-            idle_monitor = IdleMonitorX11()
+            idle_monitor = IdleMonitorX11(
+                context["api"]["set_interval"]  # type: ignore[index]
+            )
 
         try:
             idle_monitor.init()
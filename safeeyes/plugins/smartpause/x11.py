@@ -16,11 +16,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import subprocess
-import threading
+import functools
+import logging
 import typing
 
-from safeeyes import utility
+import gi
+
+gi.require_version("Gio", "2.0")
+from gi.repository import Gio, GLib
+
+from safeeyes.timers import Timer
 
 from .interface import IdleMonitorInterface
 
@@ -30,23 +35,27 @@ class IdleMonitorX11(IdleMonitorInterface):
 
     Note that this is quite inefficient. It polls every 2 seconds whether the user is
     idle or not, keeping the CPU active a lot.
+    The polling runs on the shared timers of Safe Eyes, and the output of xprintidle
+    is read asynchronously by the main loop, so no extra thread is needed.
     """
 
-    active: bool = False
-    lock = threading.Lock()
-    idle_condition = threading.Condition()
+    # ticks to skip after xprintidle failed this often in a row
+    MAX_BACKOFF = 32
+    # ticks after which xprintidle is killed if it did not finish
+    MAX_PENDING_TICKS = 5
 
-    def _is_active(self) -> bool:
-        """Thread safe function to see if this plugin is active or not."""
-        is_active = False
-        with self.lock:
-            is_active = self.active
-        return is_active
+    _timer: typing.Optional[Timer] = None
+    _was_idle: bool = False
+    # the running xprintidle, and the ticks it has been running for
+    _process: typing.Optional[Gio.Subprocess] = None
+    _pending_ticks: int = 0
+    # incremented when the monitor is stopped, to drop results of a previous start
+    _generation: int = 0
+    _failures: int = 0
+    _skip_ticks: int = 0
 
-    def _set_active(self, is_active: bool) -> None:
-        """Thread safe function to change the state of the plugin."""
-        with self.lock:
-            self.active = is_active
+    def __init__(self, set_interval: typing.Callable[..., Timer]) -> None:
+        self._set_interval = set_interval
 
     def init(self) -> None:
         pass
@@ -57,58 +66,113 @@ class IdleMonitorX11(IdleMonitorInterface):
         on_resumed: typing.Callable[[], None],
         idle_time: float,
     ) -> None:
-        """Start a thread to continuously call xprintidle."""
-        if not self._is_active():
+        """Start a timer to continuously call xprintidle."""
+        if self._timer is None:
             # If SmartPause is already started, do not start it again
-            self._set_active(True)
-            utility.start_thread(self._start_idle_monitor)
-            utility.start_thread(
-                self._start_idle_monitor,
-                on_idle=on_idle,
-                on_resumed=on_resumed,
-                idle_time=idle_time,
+            self._was_idle = False
+            self._failures = 0
+            self._skip_ticks = 0
+            self._timer = self._set_interval(
+                min(idle_time, 2), self._check_idle, on_idle, on_resumed, idle_time
             )
 
     def is_monitor_running(self) -> bool:
-        return self._is_active()
+        return self._timer is not None
 
-    def _start_idle_monitor(
+    def _check_idle(
+        self,
+        on_idle: typing.Callable[[], None],
+        on_resumed: typing.Callable[[], None],
+        idle_time: float,
+    ) -> None:
+        """Query the system idle time, unless the previous query is still running."""
+        if self._process is not None:
+            self._pending_ticks += 1
+            if self._pending_ticks == self.MAX_PENDING_TICKS:
+                # The result is passed to _on_finished as a failure
+                self._process.force_exit()
+            return
+        if self._skip_ticks > 0:
+            self._skip_ticks -= 1
+            return
+
+        try:
+            process = Gio.Subprocess.new(
+                ["xprintidle"],
+                Gio.SubprocessFlags.STDOUT_PIPE | Gio.SubprocessFlags.STDERR_SILENCE,
+            )
+        except GLib.Error as e:
+            logging.debug("xprintidle failed: %s", e.message)
+            self._on_idle_time(None, on_idle, on_resumed, idle_time)
+            return
+        self._process = process
+        self._pending_ticks = 0
+        process.communicate_utf8_async(
+            None,
+            None,
+            functools.partial(
+                self._on_finished, self._generation, on_idle, on_resumed, idle_time
+            ),
+        )
+
+    def _on_finished(
+        self,
+        generation: int,
+        on_idle: typing.Callable[[], None],
+        on_resumed: typing.Callable[[], None],
+        idle_time: float,
+        process: Gio.Subprocess,
+        result: Gio.AsyncResult,
+    ) -> None:
+        """Read the output of xprintidle."""
+        if generation != self._generation:
+            return
+        self._process = None
+
+        system_idle_time: typing.Optional[float] = None
+        try:
+            (_, output, _) = process.communicate_utf8_finish(result)
+            if process.get_successful():
+                # Convert to seconds
+                system_idle_time = int(output) / 1000
+        except (GLib.Error, TypeError, ValueError) as e:
+            logging.debug("xprintidle failed: %s", e)
+        self._on_idle_time(system_idle_time, on_idle, on_resumed, idle_time)
+
+    def _on_idle_time(
         self,
+        system_idle_time: typing.Optional[float],
         on_idle: typing.Callable[[], None],
         on_resumed: typing.Callable[[], None],
         idle_time: float,
     ) -> None:
-        """Continuously check the system idle time and pause/resume Safe Eyes based
-        on it.
-        """
-        waiting_time = min(idle_time, 2)
-        was_idle = False
-
-        while self._is_active():
-            # Wait for waiting_time seconds
-            self.idle_condition.acquire()
-            self.idle_condition.wait(waiting_time)
-            self.idle_condition.release()
-
-            if self._is_active():
-                # Get the system idle time
-                system_idle_time = (
-                    # Convert to seconds
-                    int(subprocess.check_output(["xprintidle"]).decode("utf-8")) / 1000
-                )
-                if system_idle_time >= idle_time and not was_idle:
-                    was_idle = True
-                    utility.execute_main_thread(on_idle)
-                elif system_idle_time < idle_time and was_idle:
-                    was_idle = False
-                    utility.execute_main_thread(on_resumed)
+        """Pause/resume Safe Eyes based on the system idle time."""
+        if system_idle_time is None:
+            if self._failures == 0:
+                logging.error("Failed to get the system idle time from xprintidle")
+            self._failures += 1
+            self._skip_ticks = min(2 ** (self._failures - 1), self.MAX_BACKOFF)
+            return
+        if self._failures > 0:
+            logging.info("Got the system idle time from xprintidle again")
+            self._failures = 0
+
+        if system_idle_time >= idle_time and not self._was_idle:
+            self._was_idle = True
+            on_idle()
+        elif system_idle_time < idle_time and self._was_idle:
+            self._was_idle = False
+            on_resumed()
 
     def stop_monitor(self) -> None:
-        """Stop the thread from continuously calling xprintidle."""
-        self._set_active(False)
-        self.idle_condition.acquire()
-        self.idle_condition.notify_all()
-        self.idle_condition.release()
+        """Stop the timer from continuously calling xprintidle."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._generation += 1
+            if self._process is not None:
+                self._process.force_exit()
+                self._process = None
 
     def stop(self) -> None:
         pass
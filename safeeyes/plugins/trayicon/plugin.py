@@ -18,6 +18,7 @@
 
 import datetime
 from safeeyes.model import BreakType
+from safeeyes.timers import Timer
 import gi
 
 gi.require_version("Gtk", "4.0")
@@ -25,7 +26,6 @@ from gi.repository import Gio, GLib
 import logging
 from safeeyes import utility
 from safeeyes.translations import translate as _
-import threading
 import typing
 
 """
@@ -428,8 +428,9 @@ class StatusNotifierItemService(DBusService):
 class TrayIcon:
     """Create and show the tray icon along with the tray menu."""
 
-    _animation_timeout_id: typing.Optional[int] = None
+    _animation_timer: typing.Optional[Timer] = None
     _animation_icon_enabled: bool = False
+    _resume_timer: typing.Optional[Timer] = None
 
     def __init__(self, context, plugin_config):
         self.context = context
@@ -441,12 +442,12 @@ class TrayIcon:
         self.take_break = context["api"]["take_break"]
         self.has_breaks = context["api"]["has_breaks"]
         self.get_break_time = context["api"]["get_break_time"]
+        self.set_timeout = context["api"]["set_timeout"]
+        self.set_interval = context["api"]["set_interval"]
         self.plugin_config = plugin_config
         self.date_time = None
         self.active = True
         self.wakeup_time = None
-        self.idle_condition = threading.Condition()
-        self.lock = threading.Lock()
         self.allow_disabling = plugin_config["allow_disabling"]
         self.menu_locked = False
 
@@ -654,12 +655,8 @@ class TrayIcon:
 
         This action terminates the application.
         """
-        with self.lock:
-            self.active = True
-            # Notify all schedulers
-            self.idle_condition.acquire()
-            self.idle_condition.notify_all()
-            self.idle_condition.release()
+        self.active = True
+        self.__cancel_resume()
         self.quit()
 
     def show_settings(self):
@@ -711,13 +708,9 @@ class TrayIcon:
         This action enables the application if it is currently disabled.
         """
         if not self.active:
-            with self.lock:
-                self.enable_ui()
-                self.enable_safeeyes()
-                # Notify all schedulers
-                self.idle_condition.acquire()
-                self.idle_condition.notify_all()
-                self.idle_condition.release()
+            self.enable_ui()
+            self.enable_safeeyes()
+            self.__cancel_resume()
 
     def on_disable_clicked(self, time_to_wait):
         """Handle the menu actions of all the sub menus of 'Disable Safe Eyes'.
@@ -737,7 +730,7 @@ class TrayIcon:
                 )
                 info = _("Disabled until %s") % utility.format_time(self.wakeup_time)
                 self.disable_safeeyes(info)
-                utility.start_thread(self.__schedule_resume, time_minutes=time_to_wait)
+                self.__schedule_resume(time_to_wait)
             self.update_menu()
 
     def lock_menu(self):
@@ -775,29 +768,37 @@ class TrayIcon:
             self.update_menu()
 
     def __schedule_resume(self, time_minutes):
-        """Schedule a local timer to enable Safe Eyes after the given
-        timeout.
-        """
-        self.idle_condition.acquire()
-        self.idle_condition.wait(time_minutes * 60)  # Convert to seconds
-        self.idle_condition.release()
+        """Schedule a timer to enable Safe Eyes after the given timeout."""
+        self.__cancel_resume()
+        self._resume_timer = self.set_timeout(
+            time_minutes * 60,  # Convert to seconds
+            self.__on_resume,
+        )
 
-        with self.lock:
-            if not self.active:
-                utility.execute_main_thread(self.on_enable_clicked)
+    def __on_resume(self):
+        self._resume_timer = None
+        if not self.active:
+            self.on_enable_clicked()
+
+    def __cancel_resume(self):
+        if self._resume_timer is not None:
+            self._resume_timer.cancel()
+            self._resume_timer = None
 
     def start_animation(self) -> None:
-        if self._animation_timeout_id is not None:
+        if self._animation_timer is not None:
             self.stop_animation()
 
         self._animation_icon_enabled = False
 
-        self._animation_timeout_id = GLib.timeout_add(500, self._do_animate)
+        self._animation_timer = self.set_interval(0.5, self._do_animate)
 
-    def _do_animate(self) -> bool:
+    def _do_animate(self) -> None:
         if not self.active:
-            self._animation_timeout_id = None
-            return GLib.SOURCE_REMOVE
+            if self._animation_timer is not None:
+                self._animation_timer.cancel()
+                self._animation_timer = None
+            return
 
         if self._animation_icon_enabled:
             self.sni_service.set_icon("io.github.slgobinath.SafeEyes-enabled")
@@ -806,12 +807,10 @@ class TrayIcon:
 
         self._animation_icon_enabled = not self._animation_icon_enabled
 
-        return GLib.SOURCE_CONTINUE
-
     def stop_animation(self) -> None:
-        if self._animation_timeout_id is not None:
-            GLib.source_remove(self._animation_timeout_id)
-            self._animation_timeout_id = None
+        if self._animation_timer is not None:
+            self._animation_timer.cancel()
+            self._animation_timer = None
 
         if self.active:
             self.sni_service.set_icon("io.github.slgobinath.SafeEyes-enabled")
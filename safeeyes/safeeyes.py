@@ -30,10 +30,13 @@ from safeeyes import utility
 from safeeyes.ui.about_dialog import AboutDialog
 from safeeyes.ui.break_screen import BreakScreen
 from safeeyes.ui.required_plugin_dialog import RequiredPluginDialog
-from safeeyes.model import State, RequiredPluginException
+from safeeyes.file_monitor import FileMonitor
+from safeeyes.model import BreakQueue, Config, State, RequiredPluginException
 from safeeyes.translations import translate as _
 from safeeyes.plugin_manager import PluginManager
 from safeeyes.core import SafeEyesCore
+from safeeyes.history import BreakHistory
+from safeeyes.session import SessionStore
 from safeeyes.ui.settings_dialog import SettingsDialog
 
 gi.require_version("Gtk", "4.0")
@@ -41,6 +44,9 @@ from gi.repository import Gtk, Gio, GLib
 
 SAFE_EYES_VERSION = metadata.version("safeeyes")
 
+# seconds between checks for a system suspend, if logind is not available
+SUSPEND_CHECK_INTERVAL = 60
+
 
 class SafeEyes(Gtk.Application):
     """This class represents a runnable Safe Eyes instance."""
@@ -60,6 +66,10 @@ class SafeEyes(Gtk.Application):
         self.config = config
         self.context: typing.Any = {}
         self.plugins_manager = None
+        self.file_monitor = None
+        self.custom_style_provider = None
+        self.session: typing.Optional[SessionStore] = None
+        self.history: typing.Optional[BreakHistory] = None
         self.settings_dialog_active = False
         self._status = ""
         self.system_locale = system_locale
@@ -83,6 +93,8 @@ class SafeEyes(Gtk.Application):
                 None,
                 _("print the status of running safeeyes instance and exit"),
             ),
+            # TODO: translate
+            ("verbose", None, "print plugin statistics with --status"),
             # toggle
             ("debug", None, _("start safeeyes in debug mode")),
             # TODO: translate
@@ -203,7 +215,10 @@ class SafeEyes(Gtk.Application):
             # this is only invoked remotely
             # this code runs in the primary instance, but will print to the output
             # of the remote instance
-            command_line.print_literal(self.status())
+            status = self.status()
+            if cli.get("verbose") and self.plugins_manager is not None:
+                status += "\n" + self.plugins_manager.format_stats()
+            command_line.print_literal(status)
             return 0
 
         logging.info("Handle primary command line")
@@ -262,6 +277,14 @@ class SafeEyes(Gtk.Application):
         self.break_screen.initialize(self.config)
         self.plugins_manager = PluginManager()
         self.safe_eyes_core = SafeEyesCore(self.context)
+        self.history = BreakHistory(utility.HISTORY_FILE_PATH)
+        self.safe_eyes_core.history = self.history
+        self.session = SessionStore(
+            utility.SESSION_FILE_PATH,
+            self.context["session"],
+            self.safe_eyes_core.timer_service,
+            self.config.snapshot().session_write_delay,
+        )
         self.safe_eyes_core.on_pre_break += self.plugins_manager.pre_break
         self.safe_eyes_core.on_start_break += self.on_start_break
         self.safe_eyes_core.start_break += self.start_break
@@ -273,6 +296,15 @@ class SafeEyes(Gtk.Application):
         self.context["api"]["has_breaks"] = self.safe_eyes_core.has_breaks
         self.context["api"]["postpone"] = self.safe_eyes_core.postpone
         self.context["api"]["get_break_time"] = self.safe_eyes_core.get_break_time
+        self.context["api"]["get_break_stats"] = self.history.stats
+        self.context["api"]["request_break_stats"] = self.history.request_stats
+        self.context["api"]["get_daily_break_stats"] = self.history.daily_stats
+        self.context["api"]["set_timeout"] = (
+            self.safe_eyes_core.timer_service.set_timeout
+        )
+        self.context["api"]["set_interval"] = (
+            self.safe_eyes_core.timer_service.set_interval
+        )
 
         try:
             self.plugins_manager.init(self.context, self.config)
@@ -294,22 +326,65 @@ class SafeEyes(Gtk.Application):
             self.safe_eyes_core.start()
             self.handle_system_suspend()
 
+        self.file_monitor = FileMonitor(
+            self.safe_eyes_core.timer_service,
+            self.reload_config,
+            self.reload_style,
+            self.reload_plugin,
+        )
+        self.file_monitor.start()
+
     def do_activate(self):
         logging.info("Application activated")
 
         if self.plugins_manager.needs_retry():
-            GLib.timeout_add_seconds(1, self._retry_errored_plugins)
+            self.safe_eyes_core.timer_service.set_timeout(
+                1, self._retry_errored_plugins
+            )
 
     def _initialize_styles(self):
         utility.load_css_file(
             utility.SYSTEM_STYLE_SHEET_PATH, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
         )
-        utility.load_css_file(
+        self.custom_style_provider = utility.load_css_file(
             utility.CUSTOM_STYLE_SHEET_PATH,
             Gtk.STYLE_PROVIDER_PRIORITY_USER,
             required=False,
         )
 
+    def reload_style(self):
+        """Replace the custom stylesheet after it changed on disk."""
+        if self.custom_style_provider is not None:
+            utility.unload_css_provider(self.custom_style_provider)
+        self.custom_style_provider = utility.load_css_file(
+            utility.CUSTOM_STYLE_SHEET_PATH,
+            Gtk.STYLE_PROVIDER_PRIORITY_USER,
+            required=False,
+        )
+
+    def reload_config(self):
+        """Apply safeeyes.json after it changed on disk.
+
+        If it is not valid, for example while it is being written, the current
+        config is kept.
+        """
+        config = Config.reload()
+        if config is not None:
+            self.apply_settings(config, save=False)
+
+    def reload_plugin(self, plugin_id):
+        """Import a user plugin again after its files changed on disk."""
+        # New plugins need to be merged into the config first
+        self.reload_config()
+        try:
+            self.plugins_manager.reload_plugin(
+                self.context, self.config, plugin_id, self.active
+            )
+        except RequiredPluginException as e:
+            self.show_required_plugin_dialog(e)
+            return
+        self.safe_eyes_core.refresh_next_break()
+
     def _retry_errored_plugins(self):
         if not self.plugins_manager.needs_retry():
             return
@@ -332,7 +407,9 @@ class SafeEyes(Gtk.Application):
         timeout = pow(2, self.retry_errored_plugins_count)
         self.retry_errored_plugins_count += 1
 
-        GLib.timeout_add_seconds(timeout, self._retry_errored_plugins)
+        self.safe_eyes_core.timer_service.set_timeout(
+            timeout, self._retry_errored_plugins
+        )
 
     def show_settings(self):
         """Listen to tray icon Settings action and send the signal to Settings
@@ -386,18 +463,22 @@ class SafeEyes(Gtk.Application):
         and the app itself.
         """
         logging.info("Quit Safe Eyes")
+        if self.file_monitor is not None:
+            self.file_monitor.stop()
         self.break_screen.close()
         self.context["state"] = State.QUIT
         self.plugins_manager.stop()
         self.safe_eyes_core.stop()
         self.plugins_manager.exit()
         self.persist_session()
+        if self.history is not None:
+            self.history.close()
 
         self.release()
 
         super().quit()
 
-    def handle_suspend_callback(self, sleeping):
+    def handle_suspend_callback(self, sleeping, paused_since=None):
         """If the system goes to sleep, Safe Eyes stop the core if it is
         already active.
 
@@ -408,7 +489,8 @@ class SafeEyes(Gtk.Application):
             if self.active:
                 logging.info("Stop Safe Eyes due to system suspend")
                 self.plugins_manager.stop()
-                self.safe_eyes_core.stop(True)
+                self.safe_eyes_core.stop(True, paused_since)
+            self.persist_session()
         else:
             # Resume from sleep
             if self.active and self.safe_eyes_core.has_breaks():
@@ -424,18 +506,44 @@ class SafeEyes(Gtk.Application):
 
         self.handle_suspend_callback(sleeping)
 
+    def handle_detected_suspend(self, seconds):
+        """The timers noticed a suspend which logind did not report."""
+        timer_service = self.safe_eyes_core.timer_service
+        self.handle_suspend_callback(True, timer_service.boot_time() - seconds)
+        self.handle_suspend_callback(False)
+
     def handle_system_suspend(self):
-        """Setup system suspend listener."""
-        self.suspend_proxy = Gio.DBusProxy.new_for_bus_sync(
-            bus_type=Gio.BusType.SYSTEM,
-            flags=Gio.DBusProxyFlags.DO_NOT_LOAD_PROPERTIES,
-            info=None,
-            name="org.freedesktop.login1",
-            object_path="/org/freedesktop/login1",
-            interface_name="org.freedesktop.login1.Manager",
-            cancellable=None,
+        """Setup system suspend listener.
+
+        Without logind, suspends are detected by comparing the clocks on timer
+        wakeups instead.
+        """
+        try:
+            self.suspend_proxy = Gio.DBusProxy.new_for_bus_sync(
+                bus_type=Gio.BusType.SYSTEM,
+                flags=Gio.DBusProxyFlags.DO_NOT_LOAD_PROPERTIES
+                | Gio.DBusProxyFlags.DO_NOT_AUTO_START,
+                info=None,
+                name="org.freedesktop.login1",
+                object_path="/org/freedesktop/login1",
+                interface_name="org.freedesktop.login1.Manager",
+                cancellable=None,
+            )
+        except GLib.Error as e:
+            logging.info("Failed to connect to the system bus: %s", e.message)
+            self.suspend_proxy = None
+
+        if self.suspend_proxy is not None and self.suspend_proxy.get_name_owner():
+            self.suspend_proxy.connect("g-signal", self.handle_suspend_signal)
+            return
+
+        logging.info("logind is not available, detect suspend using the clocks")
+        timer_service = self.safe_eyes_core.timer_service
+        timer_service.suspend_callback = self.handle_detected_suspend
+        # The core only wakes up for breaks, make sure a resume is noticed soon
+        self.suspend_check_timer = timer_service.set_interval(
+            SUSPEND_CHECK_INTERVAL, lambda: None
         )
-        self.suspend_proxy.connect("g-signal", self.handle_suspend_signal)
 
     def on_skipped(self):
         """Listen to break screen Skip action and send the signal to core."""
@@ -456,23 +564,63 @@ class SafeEyes(Gtk.Application):
         file.
         """
         self.settings_dialog_active = False
+        self.apply_settings(config, save=True)
 
-        if self.config == config:
+    def apply_settings(self, config, save):
+        """Switch to the given config, and save it to safeeyes.json if save is set."""
+        changed_keys = self.config.changed_keys(config)
+        if not changed_keys:
             # Config is not modified
             return
 
-        logging.info("Saving settings to safeeyes.json")
+        if save:
+            logging.info("Saving settings to safeeyes.json")
+        if not changed_keys & BreakQueue.SETTINGS:
+            # The breaks are not affected, keep the schedule
+            if save:
+                config.save()
+            self.persist_session()
+            self.reconfigure(config, changed_keys)
+            return
+
         # Stop the Safe Eyes core
         if self.active:
             self.plugins_manager.stop()
             self.safe_eyes_core.stop()
 
         # Write the configuration to file
-        config.save()
+        if save:
+            config.save()
         self.persist_session()
 
         self.restart(config)
 
+    def reconfigure(self, config, changed_keys):
+        """Apply settings that do not affect the breaks, without a restart."""
+        logging.info("Apply modified settings without restarting")
+        previous_config = self.config
+        self.config = config
+        self.safe_eyes_core.update_settings(config)
+        self.break_screen.initialize(config)
+        if self.session is not None:
+            self.session.delay = config.snapshot().session_write_delay
+
+        try:
+            self.plugins_manager.reload(
+                self.context,
+                config,
+                previous_config.changed_plugins(config),
+                # plugins may read any of the other settings in init
+                reinitialize_all=bool(changed_keys - {"plugins"}),
+                running=self.active,
+            )
+        except RequiredPluginException as e:
+            self.show_required_plugin_dialog(e)
+            return
+
+        # Plugins that were initialized again need to know the next break
+        self.safe_eyes_core.refresh_next_break()
+
     def restart(self, config, set_active=False):
         logging.info("Initialize SafeEyesCore with modified settings")
 
@@ -480,6 +628,8 @@ class SafeEyes(Gtk.Application):
         self.config = config
         self.safe_eyes_core.initialize(config)
         self.break_screen.initialize(config)
+        if self.session is not None:
+            self.session.delay = config.snapshot().session_write_delay
 
         try:
             self.plugins_manager.init(self.context, self.config)
@@ -517,9 +667,7 @@ class SafeEyes(Gtk.Application):
 
     def on_start_break(self, break_obj):
         """Pass the break information to plugins."""
-        if not self.plugins_manager.start_break(break_obj):
-            return False
-        return True
+        return self.plugins_manager.start_break(break_obj)
 
     def start_break(self, break_obj):
         """Pass the break information to break screen."""
@@ -538,8 +686,8 @@ class SafeEyes(Gtk.Application):
         """Update the next break to plugins and save the session."""
         self.plugins_manager.update_next_break(break_obj, break_time)
         self._status = _("Next break at %s") % (utility.format_time(break_time))
-        if self.config.get("persist_state"):
-            utility.write_json(utility.SESSION_FILE_PATH, self.context["session"])
+        if self.config.get("persist_state") and self.session is not None:
+            self.session.mark_dirty()
 
     def stop_break(self):
         """Stop the current break."""
@@ -556,8 +704,10 @@ class SafeEyes(Gtk.Application):
         return self._status
 
     def persist_session(self):
-        """Save the session object to the session file."""
+        """Save the session object to the session file, and wait for the write."""
+        if self.session is None:
+            return
         if self.config.get("persist_state"):
-            utility.write_json(utility.SESSION_FILE_PATH, self.context["session"])
+            self.session.flush(wait=True)
         else:
-            utility.delete(utility.SESSION_FILE_PATH)
+            self.session.discard()
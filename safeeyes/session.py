@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""The session file, which keeps the state of Safe Eyes across restarts.
+
+The session is a dict that Safe Eyes and the plugins modify in place. Instead of
+writing it after every change, the writes are delayed, and the file is written by
+a background thread.
+"""
+
+import json
+import logging
+import threading
+import typing
+
+from safeeyes import utility
+from safeeyes.timers import Timer, TimerService
+
+
+class SessionStore:
+    """Writes the session dict to the session file, once it changed.
+
+    The session is split into namespaces: one for every top-level key, and one for
+    the session of every plugin. Only the namespaces that differ from the last
+    written file are dirty.
+    """
+
+    data: dict[str, typing.Any]
+    # seconds to wait for more changes before writing the session, the
+    # session_write_delay setting
+    delay: float
+
+    def __init__(
+        self,
+        path: str,
+        data: dict[str, typing.Any],
+        timer_service: TimerService,
+        delay: float,
+    ) -> None:
+        self.data = data
+        self.delay = delay
+        self.__path = path
+        self.__timer_service = timer_service
+        self.__timer: typing.Optional[Timer] = None
+        # namespace -> serialized value, as last written
+        self.__written = self.__serialize()
+
+        # the content the writer thread still has to write, and its namespaces
+        self.__lock = threading.Lock()
+        self.__pending: typing.Optional[tuple[bytes, dict[str, str]]] = None
+        self.__writer: typing.Optional[threading.Thread] = None
+
+    def mark_dirty(self) -> None:
+        """Write the session once it did not change for the delay."""
+        if self.__timer is not None:
+            self.__timer.cancel()
+        self.__timer = self.__timer_service.set_timeout(self.delay, self.flush)
+
+    def dirty_namespaces(self) -> frozenset[str]:
+        """Return the namespaces that changed since the session was last written."""
+        return self.__dirty(self.__serialize())
+
+    def flush(self, wait: bool = False) -> None:
+        """Write the session now, if it changed.
+
+        If wait is set, return only once the file is written.
+        """
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+        try:
+            namespaces = self.__serialize()
+        except (TypeError, ValueError):
+            logging.exception("Failed to serialize the session")
+            return
+
+        dirty = self.__dirty(namespaces)
+        if dirty:
+            logging.debug("Saving the session, changed: %s", ", ".join(sorted(dirty)))
+            content = json.dumps(self.data, indent=4, sort_keys=True).encode("utf-8")
+            with self.__lock:
+                self.__pending = (content, namespaces)
+                if self.__writer is None:
+                    self.__writer = threading.Thread(
+                        target=self.__write_pending,
+                        name="WorkThread SessionStore",
+                        daemon=False,
+                    )
+                    self.__writer.start()
+
+        if wait:
+            with self.__lock:
+                writer = self.__writer
+            if writer is not None:
+                writer.join()
+
+    def discard(self) -> None:
+        """Drop the pending write, and delete the session file."""
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        with self.__lock:
+            self.__pending = None
+            writer = self.__writer
+        if writer is not None:
+            writer.join()
+        utility.delete(self.__path)
+        # Write the whole session if it is saved again
+        self.__written = {}
+
+    def __write_pending(self) -> None:
+        while True:
+            with self.__lock:
+                pending = self.__pending
+                self.__pending = None
+                if pending is None:
+                    self.__writer = None
+                    return
+            (content, namespaces) = pending
+            # If the write failed, the namespaces stay dirty and are written again
+            # by the next flush
+            if utility.write_file(self.__path, content):
+                with self.__lock:
+                    self.__written = namespaces
+
+    def __dirty(self, namespaces: dict[str, str]) -> frozenset[str]:
+        return frozenset(
+            namespace
+            for namespace in namespaces.keys() | self.__written.keys()
+            if namespaces.get(namespace) != self.__written.get(namespace)
+        )
+
+    def __serialize(self) -> dict[str, str]:
+        namespaces = {}
+        for key, value in self.data.items():
+            if key == "plugin" and isinstance(value, dict):
+                for plugin_id, plugin_session in value.items():
+                    namespaces["plugin/" + plugin_id] = json.dumps(
+                        plugin_session, sort_keys=True
+                    )
+            else:
+                namespaces[key] = json.dumps(value, sort_keys=True)
+        return namespaces
@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Run the scheduler of Safe Eyes on a virtual clock.
+
+This simulates days or weeks of breaks in a few seconds, without a GTK main loop or
+any plugins, to check how a configuration behaves. No window is opened, but the
+model and utility modules import GTK 4, so it must be installed, along with the
+libraries it links against. It is started using:
+
+    safeeyes --simulate scenario.json
+
+The scenario is a JSON file, all keys are optional:
+{
+    "start": "2024-08-26T09:00:00",
+    "duration": 604800,
+    "config": {"short_break_interval": 20},
+    "idle_time": 5,
+    "events": [
+        {"at": 3600, "type": "idle", "duration": 600, "every": 86400},
+        {"at": 30600, "type": "suspend", "duration": 55800, "every": 86400},
+        {"at": 5000, "type": "take_break"}
+    ],
+    "breaks": [
+        {"break": 2, "action": "postpone"},
+        {"break": 5, "action": "skip", "after": 5}
+    ]
+}
+
+All times are in seconds since the start of the simulation. The config keys
+override the system configuration of Safe Eyes. Idle events model the Smart Pause
+plugin: the user stops using the computer at the given time, for the given
+duration. Suspend events model a system suspend, during which the monotonic clock
+stops. Breaks are counted starting from 1, and can be skipped or postponed a number
+of seconds after the break screen is shown.
+"""
+
+import argparse
+import copy
+import datetime
+import heapq
+import itertools
+import sys
+import time
+import typing
+
+from safeeyes import utility
+from safeeyes.core import SafeEyesCore
+from safeeyes.model import Break, Config, State
+from safeeyes.timers import TimerService
+
+DEFAULT_DURATION = 24 * 60 * 60
+DEFAULT_IDLE_TIME = 5
+
+
+class VirtualTimerService(TimerService):
+    """A TimerService that runs on a virtual clock instead of the GLib main loop.
+
+    The monotonic clock stops while the virtual system is suspended, like the real
+    one does, but the boot and wall clocks keep running.
+    """
+
+    def __init__(self, start_time: float) -> None:
+        super().__init__()
+        self.__start_time = start_time
+        self.__monotonic = 0.0
+        self.__suspended = 0.0
+        self.__source_ids = itertools.count(1)
+        self.suspended = False
+
+    def monotonic_time(self) -> float:
+        return self.__monotonic
+
+    def boot_time(self) -> float:
+        return self.__monotonic + self.__suspended
+
+    def time(self) -> float:
+        return self.__start_time + self.boot_time()
+
+    def advance(self, seconds: float) -> None:
+        """Let the given number of seconds pass, without firing any timers."""
+        if self.suspended:
+            self.__suspended += seconds
+        else:
+            self.__monotonic += seconds
+
+    def next_wakeup(self) -> typing.Optional[float]:
+        """Return the boot_time() of the next timer, if the system is awake."""
+        deadline = self.next_deadline()
+        if deadline is None or self.suspended:
+            return None
+        return max(deadline, self.__monotonic) + self.__suspended
+
+    def wake_up(self) -> None:
+        """Fire the timers which are due now, as the GLib source would."""
+        self._on_wakeup()
+
+    def _add_source(self, remaining: float, precise: bool) -> int:
+        return next(self.__source_ids)
+
+    def _remove_source(self, source_id: int) -> None:
+        pass
+
+
+class Simulation:
+    """Drives a SafeEyesCore through a scenario and records the break events."""
+
+    def __init__(self, scenario: dict, config: Config) -> None:
+        start = scenario.get("start")
+        if start is not None:
+            start_time = datetime.datetime.fromisoformat(start).timestamp()
+        else:
+            start_time = time.time()
+
+        self.config = config
+        self.duration = float(scenario.get("duration", DEFAULT_DURATION))
+        self.idle_time = float(scenario.get("idle_time", DEFAULT_IDLE_TIME))
+        self.timer_service = VirtualTimerService(start_time)
+        self.context: dict[str, typing.Any] = {"session": {"plugin": {}}}
+        self.core = SafeEyesCore(self.context, self.timer_service)
+        self.timeline: list[tuple[datetime.datetime, str, str]] = []
+
+        # (boot time, order, action) of the scenario events
+        self.__events: list[tuple[float, int, typing.Callable[[], None]]] = []
+        self.__order = itertools.count()
+        self.__break_actions: dict[int, dict] = {}
+        self.__break_count = 0
+        self.__break_starts: dict[str, list[float]] = {"short": [], "long": []}
+        self.__counts: dict[str, int] = {}
+        self.__next_break_time: typing.Optional[datetime.datetime] = None
+        self.__idle_start: typing.Optional[float] = None
+        self.__stopped_by_suspend = False
+
+        for event in scenario.get("events", []):
+            self.__add_event(event)
+        for action in scenario.get("breaks", []):
+            self.__break_actions[int(action["break"])] = action
+
+        self.core.on_update_next_break += self.__on_update_next_break
+        self.core.on_pre_break += self.__on_pre_break
+        self.core.on_start_break += self.__on_start_break
+        self.core.start_break += self.__start_break
+        self.core.on_count_down += self.__on_count_down
+        self.core.on_stop_break += self.__on_stop_break
+
+    def run(self) -> None:
+        """Run the scenario until its duration is over."""
+        self.core.initialize(self.config)
+        if not self.core.has_breaks():
+            self.__record("error", "no breaks defined")
+            return
+        self.context["state"] = State.START
+        self.core.start()
+
+        while True:
+            now = self.timer_service.boot_time()
+            next_timer = self.timer_service.next_wakeup()
+            next_event = self.__events[0][0] if self.__events else None
+
+            candidates = [t for t in (next_timer, next_event) if t is not None]
+            if not candidates or min(candidates) > self.duration:
+                self.timer_service.advance(self.duration - now)
+                break
+
+            target = min(candidates)
+            self.timer_service.advance(target - now)
+
+            if next_timer is not None and next_timer <= target:
+                self.timer_service.wake_up()
+            else:
+                (_, _, action) = heapq.heappop(self.__events)
+                action()
+
+        self.core.stop()
+
+    def print_report(self, out: typing.TextIO = sys.stdout) -> None:
+        """Print the timeline of break events followed by statistics."""
+        for when, event, details in self.timeline:
+            print(f"{when:%Y-%m-%d %H:%M:%S}  {event:<12} {details}", file=out)
+
+        print("", file=out)
+        print(f"Simulated:           {_format_duration(self.duration)}", file=out)
+        for key in sorted(self.__counts):
+            print(f"{key + ':':<20} {self.__counts[key]}", file=out)
+        for break_type, starts in self.__break_starts.items():
+            intervals = [b - a for a, b in zip(starts, starts[1:])]
+            if intervals:
+                print(
+                    f"{break_type} break interval: "
+                    f"min {_format_duration(min(intervals))}, "
+                    f"avg {_format_duration(sum(intervals) / len(intervals))}, "
+                    f"max {_format_duration(max(intervals))}",
+                    file=out,
+                )
+        print(f"Timer wakeups:       {self.timer_service.wakeups}", file=out)
+        print(f"Coalesced timers:    {self.timer_service.coalesced}", file=out)
+
+    def __add_event(self, event: dict) -> None:
+        event_type = event["type"]
+        at = float(event["at"])
+        every = event.get("every")
+        duration = float(event.get("duration", 0))
+
+        while at <= self.duration:
+            if event_type == "idle":
+                if duration > self.idle_time:
+                    self.__schedule(at + self.idle_time, self.__on_idle)
+                    self.__schedule(at + duration, self.__on_resumed)
+            elif event_type == "suspend":
+                self.__schedule(at, self.__on_suspend)
+                self.__schedule(at + duration, self.__on_wakeup)
+            elif event_type == "take_break":
+                self.__schedule(at, self.__on_take_break)
+            else:
+                raise ValueError(f"Unknown event type: {event_type}")
+
+            if not every:
+                break
+            at += float(every)
+
+    def __schedule(self, at: float, action: typing.Callable[[], None]) -> None:
+        heapq.heappush(self.__events, (at, next(self.__order), action))
+
+    def __record(self, event: str, details: str = "") -> None:
+        self.__counts[event] = self.__counts.get(event, 0) + 1
+        now = datetime.datetime.fromtimestamp(self.timer_service.time())
+        self.timeline.append((now, event, details))
+
+    def __on_idle(self) -> None:
+        # Mirrors the Smart Pause plugin
+        if self.context["state"] == State.WAITING:
+            self.__idle_start = self.timer_service.boot_time() - self.idle_time
+            self.__record("idle")
+            self.core.stop(is_resting=True)
+
+    def __on_resumed(self) -> None:
+        if self.context["state"] != State.RESTING or self.__idle_start is None:
+            return
+        idle_seconds = self.timer_service.boot_time() - self.__idle_start
+        self.__idle_start = None
+        self.__record("resumed", f"idle for {_format_duration(idle_seconds)}")
+        short_break_interval = self.config.snapshot().short_break_interval * 60
+        if idle_seconds < short_break_interval and self.__next_break_time is not None:
+            # Credit back the idle time
+            next_break = self.__next_break_time + datetime.timedelta(
+                seconds=idle_seconds
+            )
+            self.core.start(next_break.timestamp())
+        else:
+            self.core.start()
+
+    def __on_suspend(self) -> None:
+        # Mirrors SafeEyes.handle_suspend_callback
+        self.__record("suspend")
+        self.__stopped_by_suspend = self.core.running
+        if self.core.running:
+            self.core.stop(True)
+        self.timer_service.suspended = True
+
+    def __on_wakeup(self) -> None:
+        self.timer_service.suspended = False
+        self.__record("wakeup")
+        if self.__stopped_by_suspend:
+            self.__stopped_by_suspend = False
+            self.core.start()
+
+    def __on_take_break(self) -> None:
+        if self.context["state"] == State.WAITING:
+            self.__record("take_break")
+            self.core.take_break()
+
+    def __on_update_next_break(self, break_obj: Break, next_break_time) -> bool:
+        self.__next_break_time = next_break_time
+        self.__record(
+            "next_break",
+            f"{_describe(break_obj)} at {next_break_time:%Y-%m-%d %H:%M:%S}",
+        )
+        return True
+
+    def __on_pre_break(self, break_obj: Break) -> bool:
+        self.__record("pre_break", _describe(break_obj))
+        return True
+
+    def __on_start_break(self, break_obj: Break) -> bool:
+        return True
+
+    def __start_break(self, break_obj: Break) -> bool:
+        self.__break_count += 1
+        self.__record("break", f"#{self.__break_count} {_describe(break_obj)}")
+        break_type = "long" if break_obj.is_long_break() else "short"
+        self.__break_starts[break_type].append(self.timer_service.boot_time())
+
+        action = self.__break_actions.get(self.__break_count)
+        if action is not None:
+            self.timer_service.set_timeout(
+                float(action.get("after", 0)), self.__break_action, action["action"]
+            )
+        return True
+
+    def __break_action(self, action: str) -> None:
+        if self.context["state"] != State.BREAK:
+            return
+        if action == "skip":
+            self.__record("skipped")
+            self.core.skip()
+        elif action == "postpone":
+            self.__record("postponed")
+            self.core.postpone()
+        else:
+            raise ValueError(f"Unknown break action: {action}")
+
+    def __on_count_down(self, countdown: int, seconds: int) -> bool:
+        self.__counts["countdown_ticks"] = self.__counts.get("countdown_ticks", 0) + 1
+        return True
+
+    def __on_stop_break(self) -> bool:
+        self.__record("break_done")
+        return True
+
+
+def _describe(break_obj: Break) -> str:
+    break_type = "long" if break_obj.is_long_break() else "short"
+    return f"{break_obj.name} ({break_type})"
+
+
+def _format_duration(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def load_config(overrides: dict) -> Config:
+    """Create the configuration from the system config and the given overrides."""
+    system_config = utility.load_json(utility.SYSTEM_CONFIG_FILE_PATH)
+    user_config = copy.deepcopy(system_config)
+    user_config.update(overrides)
+    return Config(user_config, system_config)
+
+
+def main(args: list[str]) -> int:
+    """Run the simulation given on the command line."""
+    parser = argparse.ArgumentParser(
+        prog="safeeyes --simulate",
+        description="Simulate the breaks of Safe Eyes on a virtual clock",
+        epilog="No window is opened, but GTK 4 must still be installed.",
+    )
+    parser.add_argument("--simulate", metavar="SCENARIO", required=True)
+    parser.add_argument("--debug", action="store_true")
+    options = parser.parse_args(args)
+
+    utility.initialize_logging(options.debug)
+
+    scenario = utility.load_json(options.simulate)
+    if scenario is None:
+        print(f"Failed to load the scenario {options.simulate}", file=sys.stderr)
+        return 1
+
+    simulation = Simulation(scenario, load_config(scenario.get("config", {})))
+    simulation.run()
+    simulation.print_report()
+    return 0
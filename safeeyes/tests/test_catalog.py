@@ -0,0 +1,199 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import pathlib
+import pytest
+import typing
+from safeeyes import catalog
+from safeeyes import model
+from safeeyes import utility
+from unittest import mock
+
+
+class TestCatalog:
+    @pytest.fixture(autouse=True)
+    def breaks_directory(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> pathlib.Path:
+        monkeypatch.setattr(utility, "BREAKS_DIRECTORY", str(tmp_path))
+        monkeypatch.setattr(model, "_", lambda message: message, raising=False)
+        return tmp_path
+
+    def write_catalog(
+        self, path: pathlib.Path, breaks: list[typing.Any], comment: bool = False
+    ) -> None:
+        lines = [json.dumps(break_config) for break_config in breaks]
+        if comment:
+            lines = ["# a comment", ""] + lines
+        path.write_text("\n".join(lines) + "\n")
+
+    def get_config(
+        self, short_breaks: typing.Optional[list[dict]] = None
+    ) -> model.Config:
+        if short_breaks is None:
+            short_breaks = [{"name": "break 0"}]
+        return model.Config(
+            user_config={
+                "short_breaks": short_breaks,
+                "long_breaks": [],
+                "short_break_interval": 15,
+                "long_break_interval": 75,
+                "long_break_duration": 60,
+                "short_break_duration": 15,
+                "random_order": False,
+            },
+            system_config={},
+        )
+
+    def test_index(self, breaks_directory: pathlib.Path) -> None:
+        self.write_catalog(
+            breaks_directory / "short_breaks.jsonl",
+            [{"name": "break 1"}, {"name": "break 2", "duration": 30}],
+            comment=True,
+        )
+        self.write_catalog(breaks_directory / "other.jsonl", [{"name": "other"}])
+
+        (break_catalog,) = catalog.load_catalogs("short_breaks")
+
+        assert len(break_catalog) == 2
+        assert break_catalog.get(1) == {"name": "break 2", "duration": 30}
+        assert catalog.load_catalogs("long_breaks") == []
+
+    def test_index_is_reused(self, breaks_directory: pathlib.Path) -> None:
+        path = breaks_directory / "long_breaks.jsonl"
+        self.write_catalog(path, [{"name": "long break 1"}])
+
+        (first,) = catalog.load_catalogs("long_breaks")
+        (second,) = catalog.load_catalogs("long_breaks")
+        assert first is second
+
+        self.write_catalog(path, [{"name": "long break 1"}, {"name": "long break 2"}])
+        (changed,) = catalog.load_catalogs("long_breaks")
+        assert len(changed) == 2
+
+    def test_image_is_resolved(self, breaks_directory: pathlib.Path) -> None:
+        (breaks_directory / "image.png").write_bytes(b"")
+        self.write_catalog(
+            breaks_directory / "short_breaks.jsonl",
+            [{"name": "break 1", "image": "image.png"}],
+        )
+
+        (break_catalog,) = catalog.load_catalogs("short_breaks")
+
+        assert break_catalog.get(0)["image"] == str(breaks_directory / "image.png")
+
+    def test_queue_decodes_lazily(self, breaks_directory: pathlib.Path) -> None:
+        self.write_catalog(
+            breaks_directory / "short_breaks.jsonl",
+            [{"name": f"break {i}"} for i in range(1, 100)],
+        )
+
+        with mock.patch.object(
+            catalog.BreakCatalog,
+            "get",
+            autospec=True,
+            side_effect=catalog.BreakCatalog.get,
+        ) as get:
+            bq = model.BreakQueue.create(self.get_config(), {"session": {}})
+            assert bq is not None
+            assert get.call_count <= bq.LOOKAHEAD
+
+            names = [bq.get_break().name] + [bq.next().name for _ in range(120)]
+
+        assert names[:100] == [f"break {i}" for i in range(100)]
+        assert names[100] == "break 0"
+        assert get.call_count == 99
+
+    def test_invalid_breaks(self, breaks_directory: pathlib.Path) -> None:
+        path = breaks_directory / "short_breaks.jsonl"
+        path.write_text('{"name": "break 1", "duration": -1}\nnot json\n')
+
+        bq = model.BreakQueue.create(self.get_config(), {"session": {}})
+        assert bq is not None
+
+        assert bq.next().duration == 15
+        assert bq.next().name == str(path) + "@36"
+
+    def test_restore_catalog_break(self, breaks_directory: pathlib.Path) -> None:
+        self.write_catalog(
+            breaks_directory / "short_breaks_x.jsonl",
+            [{"name": "c1"}, {"name": "c2"}],
+        )
+        session: dict[str, typing.Any] = {}
+        bq = model.BreakQueue.create(self.get_config(), {"session": session})
+        assert bq is not None
+        assert [bq.next().name for _ in range(2)] == ["c1", "c2"]
+
+        saved = json.loads(json.dumps(session))
+        restored = model.BreakQueue.create(self.get_config(), {"session": saved})
+        assert restored is not None
+
+        assert restored.get_break().name == "c2"
+        assert restored.next().name == "break 0"
+
+    def test_restore_catalog_only(self, breaks_directory: pathlib.Path) -> None:
+        self.write_catalog(
+            breaks_directory / "short_breaks.jsonl",
+            [{"name": "c1"}, {"name": "c2"}, {"name": "c3"}],
+        )
+        config = self.get_config(short_breaks=[])
+        session: dict[str, typing.Any] = {}
+        bq = model.BreakQueue.create(config, {"session": session})
+        assert bq is not None
+        assert bq.get_break().name == "c1"
+        assert bq.next().name == "c2"
+
+        # The last session is saved on the last break of the round
+        for _ in range(3):
+            saved = json.loads(json.dumps(session))
+            restored = model.BreakQueue.create(config, {"session": saved})
+            assert restored is not None
+            assert restored.get_break().name == bq.get_break().name
+            bq.next()
+
+    def test_negative_index(self, breaks_directory: pathlib.Path) -> None:
+        path = breaks_directory / "short_breaks.jsonl"
+        self.write_catalog(path, [{"name": "c1"}])
+        (break_catalog,) = catalog.load_catalogs("short_breaks")
+        inline = model.Break(model.BreakType.SHORT_BREAK, "s1", 15, 15, None, None)
+        breaks = model._BreakList([inline], [break_catalog], lambda config: inline)
+
+        with pytest.raises(IndexError):
+            breaks[-1]
+
+    def test_legacy_session_is_not_searched(
+        self, breaks_directory: pathlib.Path
+    ) -> None:
+        self.write_catalog(
+            breaks_directory / "short_breaks.jsonl",
+            [{"name": f"break {i}"} for i in range(1, 100)],
+        )
+
+        with mock.patch.object(
+            catalog.BreakCatalog,
+            "get",
+            autospec=True,
+            side_effect=catalog.BreakCatalog.get,
+        ) as get:
+            session = {"break": "break 90"}
+            bq = model.BreakQueue.create(self.get_config(), {"session": session})
+            assert bq is not None
+
+            assert get.call_count <= bq.LOOKAHEAD
+        assert bq.get_break().name == "break 0"
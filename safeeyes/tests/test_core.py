@@ -22,6 +22,8 @@ import typing
 
 from safeeyes import core
 from safeeyes import model
+from safeeyes import timers
+from safeeyes.history import BreakEvent
 
 from time_machine import TimeMachineFixture
 
@@ -32,6 +34,8 @@ class SafeEyesCoreHandle:
     callback: typing.Optional[typing.Tuple[typing.Callable, int]] = None
     safe_eyes_core: core.SafeEyesCore
     time_machine: TimeMachineFixture
+    # time_machine does not affect the monotonic clock, so it is faked here
+    monotonic_time: float = 0
 
     def __init__(
         self,
@@ -48,12 +52,20 @@ class SafeEyesCoreHandle:
         print(f"callback registered for {callback} and {duration}")
         return 1
 
-    def next(self) -> None:
+    def next(self, duration: typing.Optional[int] = None) -> None:
+        """Run the pending callback.
+
+        If duration is given, the callback is woken up after that many seconds
+        instead of the registered duration.
+        """
         assert self.callback
 
-        (callback, duration) = self.callback
+        (callback, registered_duration) = self.callback
+        if duration is None:
+            duration = registered_duration
         self.callback = None
         self.time_machine.shift(delta=datetime.timedelta(seconds=duration))
+        self.monotonic_time += duration
         print(f"shift to {datetime.datetime.now()}")
         callback()
 
@@ -107,10 +119,18 @@ class TestSafeEyesCore:
             return handle.timeout_add_seconds(duration, callback)
 
         def source_remove(source_id: int) -> None:
-            pass
+            if handle:
+                handle.callback = None
+
+        def monotonic_time() -> float:
+            if not handle:
+                return 0
+            return handle.monotonic_time
 
-        monkeypatch.setattr(core.GLib, "timeout_add_seconds", timeout_add_seconds)
-        monkeypatch.setattr(core.GLib, "source_remove", source_remove)
+        monkeypatch.setattr(timers.GLib, "timeout_add_seconds", timeout_add_seconds)
+        monkeypatch.setattr(timers.GLib, "source_remove", source_remove)
+        monkeypatch.setattr(timers, "monotonic_time", monotonic_time)
+        monkeypatch.setattr(timers, "boot_time", monotonic_time)
 
         def create_handle(safe_eyes_core: core.SafeEyesCore) -> SafeEyesCoreHandle:
             nonlocal time_machine
@@ -542,3 +562,368 @@ class TestSafeEyesCore:
         safe_eyes_core.stop()
 
         assert context["state"] == model.State.STOPPED
+
+    def get_config(self) -> model.Config:
+        return model.Config(
+            user_config={
+                "short_breaks": [
+                    {"name": "break 1"},
+                    {"name": "break 2"},
+                ],
+                "long_breaks": [
+                    {"name": "long break 1"},
+                ],
+                "short_break_interval": 15,
+                "long_break_interval": 75,
+                "long_break_duration": 60,
+                "short_break_duration": 15,
+                "pre_break_warning_time": 10,
+                "random_order": False,
+                "postpone_duration": 5,
+            },
+            system_config={},
+        )
+
+    def test_wall_clock_change_does_not_move_break(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+        time_machine: TimeMachineFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        on_pre_break = mock.Mock(return_value=True)
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.on_pre_break += on_pre_break
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+        assert (
+            safe_eyes_core.scheduled_next_break_time
+            == datetime.datetime.now() + datetime.timedelta(minutes=15)
+        )
+
+        # the user sets the clock back by one hour
+        time_machine.shift(delta=datetime.timedelta(hours=-1))
+
+        sequential_threading_handle.next()
+
+        assert context["state"] == model.State.PRE_BREAK
+        on_pre_break.assert_called_once()
+        assert sequential_threading_handle.monotonic_time == 15 * 60
+
+        safe_eyes_core.stop()
+
+    def test_early_wakeup_rearms_until_deadline(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        on_pre_break = mock.Mock(return_value=True)
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.on_pre_break += on_pre_break
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+
+        # GLib fires the source 5 minutes early
+        sequential_threading_handle.next(duration=10 * 60)
+
+        assert context["state"] == model.State.WAITING
+        on_pre_break.assert_not_called()
+        assert sequential_threading_handle.callback is not None
+        assert sequential_threading_handle.callback[1] == 5 * 60
+
+        sequential_threading_handle.next()
+
+        assert context["state"] == model.State.PRE_BREAK
+        on_pre_break.assert_called_once()
+
+        safe_eyes_core.stop()
+
+    def test_start_with_next_break_time(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        next_break = datetime.datetime.now() + datetime.timedelta(minutes=3)
+        safe_eyes_core.start(next_break.timestamp())
+
+        assert sequential_threading_handle.callback is not None
+        assert sequential_threading_handle.callback[1] == 3 * 60
+
+        sequential_threading_handle.next()
+
+        assert context["state"] == model.State.PRE_BREAK
+
+        safe_eyes_core.stop()
+
+    def test_get_break_time(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+        time_machine: TimeMachineFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+
+        now = datetime.datetime.now()
+        assert safe_eyes_core.get_break_time() == now + datetime.timedelta(minutes=15)
+        assert safe_eyes_core.get_break_time(
+            model.BreakType.SHORT_BREAK
+        ) == now + datetime.timedelta(minutes=15)
+        # three more short breaks before the long break
+        assert safe_eyes_core.get_break_time(
+            model.BreakType.LONG_BREAK
+        ) == now + datetime.timedelta(minutes=75)
+
+        safe_eyes_core.stop()
+
+    def test_update_settings_keeps_schedule(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+        time_machine: TimeMachineFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        safe_eyes_core = core.SafeEyesCore(context)
+        config = self.get_config()
+        safe_eyes_core.initialize(config)
+        on_update_next_break = mock.Mock()
+        safe_eyes_core.on_update_next_break += on_update_next_break
+
+        sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+        break_time = safe_eyes_core.get_break_time()
+        on_update_next_break.reset_mock()
+
+        config = config.clone()
+        config.set("postpone_duration", 10)
+        safe_eyes_core.update_settings(config)
+        safe_eyes_core.refresh_next_break()
+
+        assert safe_eyes_core.get_break_time() == break_time
+        assert safe_eyes_core.default_postpone_duration == 600
+        on_update_next_break.assert_called_once()
+
+        safe_eyes_core.stop()
+
+    def test_pre_break_waits_for_pending_result(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        pending = model.PendingResult()
+        on_start_break = mock.Mock(return_value=True)
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.on_pre_break += mock.Mock(return_value=pending)
+        safe_eyes_core.on_start_break += on_start_break
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+        sequential_threading_handle.next()
+
+        # Waiting for the plugin, without a timer
+        assert context["state"] == model.State.PRE_BREAK
+        assert not pending.done
+
+        pending.set_result(True)
+
+        assert sequential_threading_handle.callback is not None
+        assert sequential_threading_handle.callback[1] == 10
+
+        sequential_threading_handle.next()
+
+        on_start_break.assert_called_once()
+
+        safe_eyes_core.stop()
+
+    def test_pending_result_skips_break(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        pending = model.PendingResult()
+        on_update_next_break = mock.Mock(return_value=True)
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.on_pre_break += mock.Mock(return_value=pending)
+        safe_eyes_core.on_update_next_break += on_update_next_break
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+        sequential_threading_handle.next()
+
+        pending.set_result(False)
+        sequential_threading_handle.next()
+
+        assert context["state"] == model.State.WAITING
+        assert context["session"]["break"] == "translated!: break 2"
+        assert on_update_next_break.call_count == 2
+
+        safe_eyes_core.stop()
+
+    def test_breaks_are_recorded(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+
+        def on_pre_break(break_obj: model.Break) -> bool:
+            # Only the first break is skipped
+            if break_obj.name.endswith("break 1"):
+                context["vetoed_by"] = "donotdisturb"
+                return False
+            return True
+
+        history = mock.Mock()
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.history = history
+        safe_eyes_core.on_pre_break += on_pre_break
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+        scheduled = datetime.datetime.now() + datetime.timedelta(minutes=15)
+        sequential_threading_handle.next()
+
+        history.record.assert_called_once_with(
+            BreakEvent(
+                type=model.BreakType.SHORT_BREAK,
+                name="translated!: break 1",
+                scheduled=scheduled.timestamp(),
+                vetoed_by="donotdisturb",
+            )
+        )
+        history.reset_mock()
+
+        # The next break is shown, and skipped after 5 seconds
+        for i in range(3):
+            sequential_threading_handle.next()
+        assert context["state"] == model.State.BREAK
+        started = datetime.datetime.now().timestamp()
+        for i in range(5):
+            sequential_threading_handle.next()
+        safe_eyes_core.skip()
+        sequential_threading_handle.next()
+
+        (event,) = history.record.call_args[0]
+        assert event.name == "translated!: break 2"
+        assert event.started == started
+        # The skip is noticed at the next tick of the countdown
+        assert event.duration == 6
+        assert event.skipped
+        assert event.vetoed_by is None
+
+        safe_eyes_core.stop()
+
+    def test_stop_while_waiting_for_pending_result(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        pending = model.PendingResult()
+        on_start_break = mock.Mock(return_value=True)
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.on_pre_break += mock.Mock(return_value=pending)
+        safe_eyes_core.on_start_break += on_start_break
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+        sequential_threading_handle.next()
+
+        safe_eyes_core.stop()
+        assert context["state"] == model.State.STOPPED
+
+        # The late result is ignored
+        pending.set_result(True)
+        on_start_break.assert_not_called()
+
+        # and the core can be started again
+        safe_eyes_core.start()
+        assert context["state"] == model.State.WAITING
+        assert sequential_threading_handle.callback is not None
+
+        safe_eyes_core.stop()
+
+    def test_countdown_skips_ticks_when_main_loop_lags(
+        self,
+        sequential_threading: SequentialThreadingFixture,
+    ):
+        context: dict[str, typing.Any] = {
+            "session": {},
+        }
+        on_count_down = mock.Mock()
+        on_stop_break = mock.Mock()
+        safe_eyes_core = core.SafeEyesCore(context)
+        safe_eyes_core.on_pre_break += mock.Mock(return_value=True)
+        safe_eyes_core.on_start_break += mock.Mock(return_value=True)
+        safe_eyes_core.on_count_down += on_count_down
+        safe_eyes_core.on_stop_break += on_stop_break
+        safe_eyes_core.initialize(self.get_config())
+
+        sequential_threading_handle = sequential_threading(safe_eyes_core)
+
+        safe_eyes_core.start()
+        # pre break
+        sequential_threading_handle.next()
+        # start break
+        sequential_threading_handle.next()
+
+        assert context["state"] == model.State.BREAK
+        on_count_down.assert_called_once_with(15, 0)
+        on_count_down.reset_mock()
+
+        # the main loop stalls for 4 seconds instead of 1
+        sequential_threading_handle.next(duration=4)
+
+        on_count_down.assert_called_once_with(11, 4)
+        on_count_down.reset_mock()
+
+        # the next tick is still aligned with the end of the break
+        assert sequential_threading_handle.callback is not None
+        assert sequential_threading_handle.callback[1] == 1
+
+        while on_stop_break.call_count == 0:
+            sequential_threading_handle.next()
+
+        assert on_count_down.call_count == 10
+        # the break did not get longer than its duration
+        assert sequential_threading_handle.monotonic_time == 15 * 60 + 10 + 15
+
+        safe_eyes_core.stop()
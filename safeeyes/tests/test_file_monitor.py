@@ -0,0 +1,104 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pathlib
+import pytest
+from safeeyes import file_monitor
+from safeeyes import utility
+from safeeyes.timers import TimerService
+from unittest import mock
+
+
+class ManualTimerService(TimerService):
+    now = 0.0
+
+    def monotonic_time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+        self.run_due()
+
+
+class TestFileMonitor:
+    @pytest.fixture(autouse=True)
+    def config_directory(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> pathlib.Path:
+        monkeypatch.setattr(
+            utility, "CONFIG_FILE_PATH", str(tmp_path / "safeeyes.json")
+        )
+        monkeypatch.setattr(
+            utility, "CUSTOM_STYLE_SHEET_PATH", str(tmp_path / "style" / "custom.css")
+        )
+        monkeypatch.setattr(utility, "USER_PLUGINS_DIR", str(tmp_path / "plugins"))
+        monkeypatch.setattr(
+            utility, "POLICY_CONFIG_FILE_PATHS", [str(tmp_path / "policy.json")]
+        )
+        return tmp_path
+
+    def get_monitor(self) -> tuple[file_monitor.FileMonitor, ManualTimerService]:
+        self.on_config_changed = mock.Mock()
+        self.on_style_changed = mock.Mock()
+        self.on_plugin_changed = mock.Mock()
+        timer_service = ManualTimerService()
+        monitor = file_monitor.FileMonitor(
+            timer_service,
+            self.on_config_changed,
+            self.on_style_changed,
+            self.on_plugin_changed,
+        )
+        return (monitor, timer_service)
+
+    def test_changes_are_debounced(self) -> None:
+        (monitor, timer_service) = self.get_monitor()
+
+        monitor.on_path_changed(utility.CONFIG_FILE_PATH)
+        timer_service.advance(0.4)
+        monitor.on_path_changed(utility.POLICY_CONFIG_FILE_PATHS[0])
+        timer_service.advance(0.4)
+        self.on_config_changed.assert_not_called()
+
+        timer_service.advance(file_monitor.DEBOUNCE_SECONDS)
+        self.on_config_changed.assert_called_once_with()
+        self.on_style_changed.assert_not_called()
+
+    def test_targeted_reload(self) -> None:
+        (monitor, timer_service) = self.get_monitor()
+
+        monitor.on_path_changed(utility.CUSTOM_STYLE_SHEET_PATH)
+        plugin_dir = os.path.join(utility.USER_PLUGINS_DIR, "example")
+        monitor.on_path_changed(os.path.join(plugin_dir, "plugin.py"))
+        monitor.on_path_changed(os.path.join(plugin_dir, "config.json"))
+        monitor.on_path_changed(os.path.join(plugin_dir, "__pycache__", "plugin.pyc"))
+        monitor.on_path_changed(os.path.join(utility.USER_PLUGINS_DIR, "__pycache__"))
+        timer_service.advance(file_monitor.DEBOUNCE_SECONDS)
+
+        self.on_config_changed.assert_not_called()
+        self.on_style_changed.assert_called_once_with()
+        self.on_plugin_changed.assert_called_once_with("example")
+
+    def test_stop_drops_pending_reloads(self) -> None:
+        (monitor, timer_service) = self.get_monitor()
+
+        monitor.on_path_changed(utility.CONFIG_FILE_PATH)
+        monitor.stop()
+        timer_service.advance(file_monitor.DEBOUNCE_SECONDS)
+
+        self.on_config_changed.assert_not_called()
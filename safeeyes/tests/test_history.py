@@ -0,0 +1,157 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import pathlib
+import queue
+import sqlite3
+import threading
+import typing
+import pytest
+from safeeyes import history
+from safeeyes import utility
+from safeeyes.model import BreakType
+
+
+class TestBreakHistory:
+    @pytest.fixture
+    def break_history(
+        self, tmp_path: pathlib.Path
+    ) -> typing.Generator[history.BreakHistory]:
+        break_history = history.BreakHistory(str(tmp_path / "history.sqlite"))
+        yield break_history
+        break_history.close()
+
+    def record(
+        self,
+        break_history: history.BreakHistory,
+        scheduled: datetime.datetime,
+        break_type: BreakType = BreakType.SHORT_BREAK,
+        **kwargs,
+    ) -> None:
+        break_history.record(
+            history.BreakEvent(
+                type=break_type,
+                name="break",
+                scheduled=scheduled.timestamp(),
+                **kwargs,
+            )
+        )
+
+    def test_stats(self, break_history: history.BreakHistory) -> None:
+        day = datetime.datetime(2025, 3, 1, 12)
+        started = day.timestamp()
+        self.record(break_history, day, started=started, duration=15)
+        self.record(break_history, day, started=started, duration=3, skipped=True)
+        self.record(break_history, day, started=started, duration=5, postponed=True)
+        self.record(break_history, day, vetoed_by="donotdisturb")
+        self.record(
+            break_history,
+            day,
+            BreakType.LONG_BREAK,
+            started=started,
+            duration=60,
+        )
+
+        assert break_history.stats() == history.BreakStats(
+            breaks=4, completed=2, skipped=1, postponed=1, vetoed=1, duration=83
+        )
+        assert break_history.stats(
+            break_type=BreakType.LONG_BREAK
+        ) == history.BreakStats(breaks=1, completed=1, duration=60)
+
+    def test_periods(self, break_history: history.BreakHistory) -> None:
+        first = datetime.datetime(2025, 3, 1, 23, 30)
+        second = datetime.datetime(2025, 3, 2, 0, 30)
+        self.record(break_history, first, started=first.timestamp(), duration=15)
+        self.record(break_history, second, started=second.timestamp(), duration=15)
+        self.record(break_history, second, skipped=True, started=second.timestamp())
+
+        midnight = datetime.datetime(2025, 3, 2)
+        assert break_history.stats(until=midnight).breaks == 1
+        assert break_history.stats(since=midnight).breaks == 2
+        assert break_history.stats(since=second).skipped == 1
+
+        daily = break_history.daily_stats(datetime.date(2025, 3, 1))
+        assert daily == {
+            datetime.date(2025, 3, 1): history.BreakStats(
+                breaks=1, completed=1, duration=15
+            ),
+            datetime.date(2025, 3, 2): history.BreakStats(
+                breaks=2, completed=1, skipped=1, duration=15
+            ),
+        }
+        assert list(break_history.daily_stats(datetime.date(2025, 3, 2))) == [
+            datetime.date(2025, 3, 2)
+        ]
+
+    def test_history_is_kept(self, tmp_path: pathlib.Path) -> None:
+        path = str(tmp_path / "history.sqlite")
+        break_history = history.BreakHistory(path)
+        self.record(break_history, datetime.datetime(2025, 3, 1), vetoed_by="x")
+        break_history.close()
+
+        break_history = history.BreakHistory(path)
+        assert break_history.stats().vetoed == 1
+        break_history.close()
+
+    def test_queries_share_the_connection(
+        self, monkeypatch: pytest.MonkeyPatch, break_history: history.BreakHistory
+    ) -> None:
+        connections = []
+        connect = sqlite3.connect
+
+        def counting_connect(*args) -> sqlite3.Connection:
+            connections.append(args)
+            return connect(*args)
+
+        monkeypatch.setattr(sqlite3, "connect", counting_connect)
+        day = datetime.datetime(2025, 3, 1, 12)
+
+        results = []
+        for _ in range(3):
+            self.record(break_history, day, started=day.timestamp(), duration=15)
+            # Plugins may query from their own threads
+            thread = threading.Thread(
+                target=lambda: results.append(break_history.stats().breaks)
+            )
+            thread.start()
+            thread.join()
+
+        assert results == [1, 2, 3]
+        assert len(connections) == 1
+
+    def test_request_stats(
+        self, monkeypatch: pytest.MonkeyPatch, break_history: history.BreakHistory
+    ) -> None:
+        main_thread: queue.Queue[tuple] = queue.Queue()
+        monkeypatch.setattr(
+            utility,
+            "execute_main_thread",
+            lambda function, *args: main_thread.put((function, args)),
+        )
+        day = datetime.datetime(2025, 3, 1, 12)
+        self.record(break_history, day, started=day.timestamp(), skipped=True)
+
+        answers: list[history.BreakStats] = []
+        break_history.request_stats(answers.append, since=day)
+        assert answers == []
+
+        (function, args) = main_thread.get(timeout=10)
+        function(*args)
+        assert answers == [history.BreakStats(breaks=1, skipped=1)]
@@ -16,10 +16,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import pathlib
 import pytest
 import random
 import typing
 from safeeyes import model
+from safeeyes import utility
+from unittest import mock
 
 
 class TestBreak:
@@ -30,7 +34,7 @@ class TestBreak:
             time=15,
             duration=15,
             image=None,
-            plugins={},
+            plugins=None,
         )
 
         assert b.is_short_break()
@@ -43,7 +47,7 @@ class TestBreak:
             time=75,
             duration=60,
             image=None,
-            plugins={},
+            plugins=None,
         )
 
         assert not b.is_short_break()
@@ -224,7 +228,7 @@ class TestBreakQueue:
     def test_only_short_next_break_random(
         self, monkeypatch: pytest.MonkeyPatch
     ) -> None:
-        random_seed = 5
+        random_seed = 6
         bq = self.get_bq_only_short(monkeypatch, random_seed)
 
         breaks = []
@@ -290,7 +294,7 @@ class TestBreakQueue:
         assert bq.next().name == "translated!: long break 3"
 
     def test_only_long_next_break_random(self, monkeypatch: pytest.MonkeyPatch) -> None:
-        random_seed = 5
+        random_seed = 6
         bq = self.get_bq_only_long(monkeypatch, random_seed)
 
         breaks = []
@@ -385,7 +389,7 @@ class TestBreakQueue:
         assert bq.next().name == "translated!: long break 1"
 
     def test_full_next_break_random(self, monkeypatch: pytest.MonkeyPatch) -> None:
-        random_seed = 5
+        random_seed = 6
         bq = self.get_bq_full(monkeypatch, random_seed)
 
         first = True
@@ -440,3 +444,543 @@ class TestBreakQueue:
                 return True
 
         return False
+
+    def assert_timeline_matches_queue(self, bq: model.BreakQueue) -> None:
+        timeline = bq.get_timeline()
+        assert len(timeline) >= bq.LOOKAHEAD
+
+        offset = 0
+        brk = bq.get_break()
+        for index, upcoming in enumerate(timeline):
+            if index > 0:
+                brk = bq.next()
+                offset += brk.time
+
+            assert upcoming.type == brk.type
+            assert upcoming.offset == offset
+            if upcoming.break_obj is not None:
+                assert upcoming.break_obj is brk
+
+    def test_only_short_timeline(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        bq = self.get_bq_only_short(monkeypatch)
+
+        assert bq.get_upcoming(model.BreakType.LONG_BREAK) is None
+        self.assert_timeline_matches_queue(bq)
+
+    def test_only_long_timeline(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        bq = self.get_bq_only_long(monkeypatch)
+
+        assert bq.get_upcoming(model.BreakType.SHORT_BREAK) is None
+        self.assert_timeline_matches_queue(bq)
+
+    def test_full_timeline(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        bq = self.get_bq_full(monkeypatch)
+
+        assert [(b.type, b.offset) for b in bq.get_timeline()[:6]] == [
+            (model.BreakType.SHORT_BREAK, 0),
+            (model.BreakType.SHORT_BREAK, 15),
+            (model.BreakType.SHORT_BREAK, 30),
+            (model.BreakType.SHORT_BREAK, 45),
+            (model.BreakType.LONG_BREAK, 60),
+            (model.BreakType.SHORT_BREAK, 75),
+        ]
+
+        for _ in range(20):
+            self.assert_timeline_matches_queue(bq)
+
+    def test_full_timeline_random(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        bq = self.get_bq_full(monkeypatch, random_seed=5)
+
+        for _ in range(20):
+            self.assert_timeline_matches_queue(bq)
+
+    def test_full_get_upcoming(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        bq = self.get_bq_full(monkeypatch)
+
+        upcoming = bq.get_upcoming(model.BreakType.LONG_BREAK)
+        assert upcoming is not None
+        assert upcoming.offset == 60
+        assert upcoming.break_obj is not None
+        assert upcoming.break_obj.name == "translated!: long break 1"
+
+        bq.next()
+        upcoming = bq.get_upcoming(model.BreakType.LONG_BREAK)
+        assert upcoming is not None
+        assert upcoming.offset == 45
+
+        bq.next(model.BreakType.LONG_BREAK)
+        upcoming = bq.get_upcoming(model.BreakType.LONG_BREAK)
+        assert upcoming is not None
+        assert upcoming.offset == 0
+        assert upcoming.break_obj is bq.get_break()
+
+        upcoming = bq.get_upcoming(model.BreakType.SHORT_BREAK)
+        assert upcoming is not None
+        assert upcoming.offset == 15
+
+    def test_timeline_custom_interval(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(model, "_", lambda message: message, raising=False)
+
+        config = model.Config(
+            user_config={
+                "short_breaks": [
+                    {"name": "break 1"},
+                    {"name": "break 2", "interval": 10},
+                ],
+                "long_breaks": [
+                    {"name": "long break 1", "interval": 40},
+                    {"name": "long break 2"},
+                ],
+                "short_break_interval": 15,
+                "long_break_interval": 75,
+                "long_break_duration": 60,
+                "short_break_duration": 15,
+                "random_order": False,
+            },
+            system_config={},
+        )
+        bq = model.BreakQueue.create(config, {"session": {}})
+        assert bq is not None
+
+        for _ in range(20):
+            self.assert_timeline_matches_queue(bq)
+
+
+class TestBreakOrder:
+    def get_order(self, size: int) -> model._BreakOrder:
+        breaks = [
+            model.Break(model.BreakType.SHORT_BREAK, f"break {i}", 15, 15, None, None)
+            for i in range(size)
+        ]
+        return model._BreakOrder(model._BreakList(breaks), True)
+
+    def get_round(self, order: model._BreakOrder) -> list[str]:
+        return [order[position].name for position in range(len(order))]
+
+    @pytest.mark.parametrize("size", [1, 2, 3, 7])
+    def test_rounds_avoid_last_breaks(self, size: int) -> None:
+        random.seed(3)
+        order = self.get_order(size)
+        window = min(order.AVOID_LAST, size // 2)
+
+        previous = self.get_round(order)
+        for _ in range(50):
+            order.shuffle()
+            current = self.get_round(order)
+
+            assert sorted(current) == sorted(previous)
+            assert not set(current[:window]) & set(previous[size - window :])
+            previous = current
+
+    def test_state_replays_round(self) -> None:
+        random.seed(3)
+        order = self.get_order(10)
+        self.get_round(order)
+        order.shuffle()
+        # Only the breaks up to here were drawn when the state is stored
+        order[3]
+        state = json.loads(json.dumps(order.get_state()))
+        expected = self.get_round(order)
+
+        restored = self.get_order(10)
+        restored.set_state(restored.parse_state(state))
+
+        assert self.get_round(restored) == expected
+
+    def test_state_of_other_breaks(self) -> None:
+        state = self.get_order(10).get_state()
+
+        with pytest.raises(ValueError):
+            self.get_order(9).parse_state(state)
+
+
+class TestEventHook:
+    def test_fire_async_sync_handlers(self) -> None:
+        hook = model.EventHook()
+        hook += lambda value: True
+        hook += lambda value: value
+
+        assert hook.fire_async(True) is True
+        assert hook.fire_async(False) is False
+
+    def test_fire_async_pending(self) -> None:
+        first = model.PendingResult()
+        second = model.PendingResult()
+        hook = model.EventHook()
+        hook += lambda: first
+        hook += lambda: True
+        hook += lambda: second
+
+        result = hook.fire_async()
+        assert isinstance(result, model.PendingResult)
+
+        callback = mock.Mock()
+        result.add_done_callback(callback)
+
+        first.set_result(True)
+        callback.assert_not_called()
+
+        second.set_result(True)
+        callback.assert_called_once_with(result)
+        assert result.result
+
+    def test_fire_async_pending_veto(self) -> None:
+        first = model.PendingResult()
+        second = model.PendingResult()
+        hook = model.EventHook()
+        hook += lambda: first
+        hook += lambda: second
+
+        result = hook.fire_async()
+        assert isinstance(result, model.PendingResult)
+        callback = mock.Mock()
+        result.add_done_callback(callback)
+
+        second.set_result(False)
+        assert result.done
+        assert not result.result
+        callback.assert_called_once_with(result)
+
+        # Only the first result counts
+        first.set_result(True)
+        assert not result.result
+        callback.assert_called_once()
+
+
+class TestBreakQueueSession:
+    def get_config(self, random_order: bool) -> model.Config:
+        return model.Config(
+            user_config={
+                "short_breaks": [{"name": f"break {i}"} for i in range(5)],
+                "long_breaks": [{"name": f"long break {i}"} for i in range(3)],
+                "short_break_interval": 15,
+                "long_break_interval": 75,
+                "long_break_duration": 60,
+                "short_break_duration": 15,
+                "random_order": random_order,
+            },
+            system_config={},
+        )
+
+    def get_names(self, bq: model.BreakQueue, count: int) -> list[str]:
+        return [bq.get_break().name] + [bq.next().name for _ in range(count)]
+
+    @pytest.fixture(autouse=True)
+    def monkeypatch_translations(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(model, "_", lambda message: message, raising=False)
+
+    @pytest.mark.parametrize("random_order", [False, True])
+    def test_restore(self, random_order: bool) -> None:
+        random.seed(1)
+        session: dict[str, typing.Any] = {}
+        bq = model.BreakQueue.create(
+            self.get_config(random_order), {"session": session}
+        )
+        assert bq is not None
+        for _ in range(13):
+            bq.next()
+
+        saved = json.loads(json.dumps(session))
+        random_state = random.getstate()
+        expected = self.get_names(bq, 20)
+
+        # The restored queue does not depend on the random state at startup
+        random.seed(2)
+        restored = model.BreakQueue.create(
+            self.get_config(random_order), {"session": saved}
+        )
+        assert restored is not None
+        random.setstate(random_state)
+
+        assert self.get_names(restored, 20) == expected
+
+    def test_restore_at_round_boundary(self) -> None:
+        session: dict[str, typing.Any] = {}
+        config = self.get_config(True)
+        bq = model.BreakQueue.create(config, {"session": session})
+        assert bq is not None
+        # The last short break of the round is current, the next index is 0
+        while session["break_queue"]["short_index"] != 0 or bq.is_long_break():
+            bq.next()
+        current = bq.get_break().name
+
+        saved = json.loads(json.dumps(session))
+        restored = model.BreakQueue.create(config, {"session": saved})
+        assert restored is not None
+
+        assert restored.get_break().name == current
+
+    def test_restore_keeps_long_break_time(self) -> None:
+        session: dict[str, typing.Any] = {}
+        bq = model.BreakQueue.create(self.get_config(False), {"session": session})
+        assert bq is not None
+        bq.next()
+        bq.next()
+
+        restored = model.BreakQueue.create(self.get_config(False), {"session": session})
+        assert restored is not None
+
+        assert restored.get_break().name == "break 2"
+        upcoming = restored.get_upcoming(model.BreakType.LONG_BREAK)
+        assert upcoming is not None
+        assert upcoming.offset == 30
+
+    def test_restore_changed_config(self) -> None:
+        session: dict[str, typing.Any] = {}
+        bq = model.BreakQueue.create(self.get_config(False), {"session": session})
+        assert bq is not None
+        bq.next()
+
+        config = self.get_config(False)
+        config.set("short_breaks", [{"name": "break 1"}, {"name": "break 4"}])
+        restored = model.BreakQueue.create(config, {"session": session})
+        assert restored is not None
+
+        # Falls back to restoring the break by name
+        assert restored.get_break().name == "break 1"
+
+    def test_restore_legacy_session(self) -> None:
+        session: dict[str, typing.Any] = {"break": "break 3"}
+        bq = model.BreakQueue.create(self.get_config(False), {"session": session})
+        assert bq is not None
+
+        assert bq.get_break().name == "break 3"
+        assert session["break_queue"]["short_index"] == 4
+
+
+class TestConfig:
+    def get_config(self) -> model.Config:
+        return model.Config(
+            user_config={
+                "short_breaks": [{"name": "break 1"}],
+                "plugins": [{"id": "smartpause", "enabled": True}],
+                "short_break_interval": 20,
+            },
+            system_config={"long_break_interval": 60},
+        )
+
+    def test_clone_copies_on_access(self) -> None:
+        config = self.get_config()
+        clone = config.clone()
+
+        clone.get("plugins")[0]["enabled"] = False
+        config.get("short_breaks").append({"name": "break 2"})
+
+        assert config.get("plugins")[0]["enabled"]
+        assert clone.get("short_breaks") == [{"name": "break 1"}]
+        assert config != clone
+
+    def test_unchanged_clone_is_equal(self) -> None:
+        config = self.get_config()
+        clone = config.clone()
+        clone.get("plugins")
+
+        assert config == clone
+
+    def test_snapshot(self) -> None:
+        config = self.get_config()
+        settings = config.snapshot()
+
+        assert settings.short_break_interval == 20
+        assert settings.long_break_interval == 60
+        assert settings.postpone_unit == "minutes"
+        assert config.snapshot() is settings
+
+        config.set("short_break_interval", 25)
+        assert config.snapshot().short_break_interval == 25
+        assert settings.short_break_interval == 20
+
+    def test_snapshot_checks_types(self) -> None:
+        config = model.Config(
+            user_config={
+                "short_break_interval": "20",
+                "long_break_interval": 90.0,
+                "strict_break": 1,
+                "random_order": None,
+            },
+            system_config={
+                "short_break_interval": 15,
+                "strict_break": False,
+                "random_order": False,
+            },
+        )
+        settings = config.snapshot()
+
+        assert settings.short_break_interval == 15
+        assert settings.long_break_interval == 90
+        assert type(settings.long_break_interval) is int
+        assert settings.strict_break is False
+        assert settings.random_order is False
+
+    def test_clone_copies_on_write(self) -> None:
+        config = self.get_config()
+        clone = config.clone()
+        other = clone.clone()
+
+        clone.set("short_break_interval", 25)
+        config.set("long_break_interval", 90)
+
+        assert config.get("short_break_interval") == 20
+        assert clone.get("long_break_interval") == 60
+        assert other.get("short_break_interval") == 20
+        assert other.get("long_break_interval") == 60
+        assert config.changed_keys(other) == {"long_break_interval"}
+
+    def test_changed_keys(self) -> None:
+        config = self.get_config()
+        clone = config.clone()
+        assert config.changed_keys(clone) == set()
+
+        clone.set("short_break_interval", 25)
+        clone.get("plugins")[0]["enabled"] = False
+
+        assert config.changed_keys(clone) == {"short_break_interval", "plugins"}
+        assert config.changed_plugins(clone) == {"smartpause"}
+
+    def test_policy_layers(self) -> None:
+        config = model.Config(
+            user_config={
+                "short_break_interval": 20,
+                "long_break_interval": 90,
+                "strict_break": False,
+            },
+            system_config={"long_break_interval": 60, "postpone_duration": 5},
+            policy_configs=[
+                {
+                    "strict_break": True,
+                    "postpone_duration": 10,
+                    "locked": ["strict_break"],
+                },
+                {"strict_break": False, "long_break_interval": 120},
+            ],
+        )
+
+        assert config.get("short_break_interval") == 20
+        assert config.get("long_break_interval") == 90
+        assert config.get("postpone_duration") == 10
+        assert config.get("strict_break")
+        assert config.is_locked("strict_break")
+        assert not config.is_locked("long_break_interval")
+        assert config.get("locked") is None
+
+        config.set("strict_break", False)
+        assert config.get("strict_break")
+
+        config.set("long_break_interval", None)
+        assert config.get("long_break_interval") == 120
+
+    def test_changed_policy(self) -> None:
+        system_config = {"short_break_interval": 15}
+        config = model.Config({}, system_config, [{"short_break_interval": 20}])
+        changed = model.Config({}, system_config, [{"short_break_interval": 25}])
+
+        assert config.changed_keys(changed) == {"short_break_interval"}
+        assert config != changed
+
+
+class TestConfigLoad:
+    @pytest.fixture(autouse=True)
+    def config_files(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> pathlib.Path:
+        plugin_dir = tmp_path / "plugins" / "example"
+        plugin_dir.mkdir(parents=True)
+        (plugin_dir / "plugin.py").write_text("")
+        (plugin_dir / "config.json").write_text(
+            json.dumps({"meta": {"version": "0.0.1"}, "settings": []})
+        )
+        system_config = {
+            "meta": {"config_version": "1.0.0"},
+            "short_break_interval": 15,
+            "plugins": [],
+        }
+        (tmp_path / "system.json").write_text(json.dumps(system_config))
+        (tmp_path / "user.json").write_text(json.dumps(system_config))
+
+        monkeypatch.setattr(utility, "CONFIG_FILE_PATH", str(tmp_path / "user.json"))
+        monkeypatch.setattr(
+            utility, "SYSTEM_CONFIG_FILE_PATH", str(tmp_path / "system.json")
+        )
+        monkeypatch.setattr(utility, "SYSTEM_PLUGINS_DIR", str(tmp_path / "plugins"))
+        monkeypatch.setattr(utility, "USER_PLUGINS_DIR", str(tmp_path / "none"))
+        monkeypatch.setattr(
+            utility, "POLICY_CONFIG_FILE_PATHS", [str(tmp_path / "policy.json")]
+        )
+        monkeypatch.setattr(utility, "CACHE_DIRECTORY", str(tmp_path / "cache"))
+        monkeypatch.setattr(
+            utility, "STARTUP_CACHE_PATH", str(tmp_path / "cache" / "startup.json")
+        )
+        monkeypatch.setattr(utility, "create_startup_entry", lambda force: None)
+        monkeypatch.setattr(utility, "initialize_safeeyes", lambda: None)
+        return tmp_path
+
+    def test_load_uses_cache(
+        self, monkeypatch: pytest.MonkeyPatch, config_files: pathlib.Path
+    ) -> None:
+        config = model.Config.load()
+        assert config.get("plugins")[0]["id"] == "example"
+
+        def fail(config: dict) -> None:
+            raise AssertionError("the config was merged again")
+
+        monkeypatch.setattr(utility, "merge_plugins", fail)
+
+        assert model.Config.load() == config
+        assert utility.get_plugin_config("example") == (
+            {"meta": {"version": "0.0.1"}, "settings": []},
+            str(config_files / "plugins"),
+        )
+
+    def test_changed_file_is_merged_again(self, config_files: pathlib.Path) -> None:
+        model.Config.load()
+
+        user_config = json.loads((config_files / "user.json").read_text())
+        user_config["short_break_interval"] = 20
+        (config_files / "user.json").write_text(json.dumps(user_config))
+
+        assert model.Config.load().get("short_break_interval") == 20
+
+    @pytest.mark.parametrize(
+        "content",
+        [
+            '{"meta": {"config_version": "1.0.0"}, "short_break',
+            '{"meta": {"config_version": "1.0.0"}, "short_break_interval": "20"}',
+            '{"meta": {"config_version": "0.9.0"}, "short_break_interval": 20}',
+            "[]",
+        ],
+    )
+    def test_reload_keeps_invalid_file(
+        self, monkeypatch: pytest.MonkeyPatch, config_files: pathlib.Path, content: str
+    ) -> None:
+        def fail() -> None:
+            raise AssertionError("the user config was replaced")
+
+        monkeypatch.setattr(utility, "initialize_safeeyes", fail)
+        (config_files / "user.json").write_text(content)
+
+        assert model.Config.reload() is None
+        assert (config_files / "user.json").read_text() == content
+
+    def test_reload(self, config_files: pathlib.Path) -> None:
+        user_config = json.loads((config_files / "user.json").read_text())
+        user_config["short_break_interval"] = 20
+        (config_files / "user.json").write_text(json.dumps(user_config))
+
+        config = model.Config.reload()
+        assert config is not None
+        assert config.get("short_break_interval") == 20
+        assert config.get("plugins")[0]["id"] == "example"
+
+    def test_policy_config(self, config_files: pathlib.Path) -> None:
+        (config_files / "policy.json").write_text(
+            json.dumps({"short_break_interval": 30, "locked": ["short_break_interval"]})
+        )
+
+        config = model.Config.load()
+        assert config.get("short_break_interval") == 30
+        # The policy is not written to the user config
+        user_config = json.loads((config_files / "user.json").read_text())
+        assert user_config["short_break_interval"] == 15
+
+        # Cached configs still apply the policy
+        assert model.Config.load() == config
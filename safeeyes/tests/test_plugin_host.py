@@ -0,0 +1,229 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import pathlib
+import queue
+import pytest
+import typing
+from safeeyes import model
+from safeeyes import plugin_host
+from safeeyes import plugin_manager
+from safeeyes import utility
+from safeeyes.timers import TimerService
+
+
+class ManualTimerService(TimerService):
+    now = 0.0
+
+    def monotonic_time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+        self.run_due()
+
+
+PLUGIN = """
+import os
+import time
+
+def init(ctx, safeeyes_config, plugin_config):
+    global text
+    text = plugin_config["text"]
+
+def on_pre_break(break_obj):
+    if break_obj.name == "crash":
+        os._exit(1)
+    if break_obj.name == "hang":
+        time.sleep(60)
+    return break_obj.name == "skip"
+
+def get_widget_title(break_obj):
+    return "Title"
+
+def get_widget_content(break_obj):
+    return text + break_obj.name
+"""
+
+
+def get_break(name: str) -> model.Break:
+    return model.Break(
+        model.BreakType.SHORT_BREAK, name, 15, 15, None, frozenset({"example"})
+    )
+
+
+class TestEncoding:
+    def test_round_trip(self) -> None:
+        break_time = datetime.datetime(2025, 1, 2, 3, 4)
+        (break_obj, decoded_time, value) = plugin_host.decode(
+            plugin_host.encode([get_break("stretch"), break_time, {"a": (1, None)}])
+        )
+
+        assert break_obj.name == "stretch"
+        assert break_obj.type == model.BreakType.SHORT_BREAK
+        assert break_obj.plugins == frozenset({"example"})
+        assert decoded_time == break_time
+        assert value == {"a": [1, None]}
+
+
+class TestPluginHost:
+    @pytest.fixture(autouse=True)
+    def plugins_dir(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> pathlib.Path:
+        plugin_dir = tmp_path / "host_example"
+        plugin_dir.mkdir()
+        (plugin_dir / "plugin.py").write_text(PLUGIN)
+        (plugin_dir / "config.json").write_text(
+            json.dumps(
+                {
+                    "meta": {"name": "Example", "version": "0.0.1"},
+                    "dependencies": {
+                        "python_modules": [],
+                        "shell_commands": [],
+                        "operating_systems": [],
+                        "desktop_environments": [],
+                        "resources": [],
+                    },
+                }
+            )
+        )
+        monkeypatch.setattr(utility, "USER_PLUGINS_DIR", str(tmp_path))
+        monkeypatch.setattr(utility, "SYSTEM_PLUGINS_DIR", str(tmp_path / "none"))
+        monkeypatch.setattr(utility, "CACHE_DIRECTORY", str(tmp_path / "cache"))
+        monkeypatch.setattr(
+            utility,
+            "DEPENDENCY_CACHE_PATH",
+            str(tmp_path / "cache" / "dependencies.json"),
+        )
+        monkeypatch.setattr(utility, "__dependency_cache", None)
+
+        # Calls to the main thread are run by run_until
+        self.main_thread: queue.Queue[tuple] = queue.Queue()
+        monkeypatch.setattr(
+            utility,
+            "execute_main_thread",
+            lambda function, *args: self.main_thread.put((function, args)),
+        )
+        self.timer_service = ManualTimerService()
+        return tmp_path
+
+    @pytest.fixture
+    def host(
+        self, plugins_dir: pathlib.Path
+    ) -> typing.Generator[plugin_host.PluginHost]:
+        host = plugin_host.PluginHost(self.timer_service.set_timeout)
+        host.load(
+            "host_example",
+            str(plugins_dir),
+            {"version": "1.0", "api": {"quit": lambda: None}},
+            model.Config(user_config={}, system_config={}),
+            {"text": "Stretch for "},
+        )
+        yield host
+        host.stop()
+
+    def run_until(self, condition: typing.Callable[[], bool]) -> None:
+        while not condition():
+            (function, args) = self.main_thread.get(timeout=10)
+            function(*args)
+
+    def call(
+        self, host: plugin_host.PluginHost, break_name: str, **kwargs
+    ) -> list[typing.Optional[dict]]:
+        replies: list[typing.Optional[dict]] = []
+        host.call(
+            "host_example",
+            "on_pre_break",
+            [get_break(break_name)],
+            on_reply=replies.append,
+            **kwargs,
+        )
+        return replies
+
+    def test_calls_are_answered(self, host: plugin_host.PluginHost) -> None:
+        skip = self.call(host, "skip")
+        proceed = self.call(host, "walk", widget=True)
+        self.run_until(lambda: bool(skip and proceed))
+
+        assert skip[0] is not None and skip[0]["result"] is True
+        assert proceed[0] is not None and proceed[0]["result"] is False
+        assert proceed[0]["widget"] == ["Title", "Stretch for walk"]
+
+    def test_restart_after_crash(self, host: plugin_host.PluginHost) -> None:
+        replies = self.call(host, "crash")
+        self.run_until(lambda: bool(replies))
+        assert replies == [None]
+
+        # The plugin is loaded again once the host is started again
+        self.timer_service.advance(plugin_host.RESTART_DELAY)
+        replies = self.call(host, "skip")
+        self.run_until(lambda: bool(replies))
+        assert replies[0] is not None and replies[0]["result"] is True
+
+    def test_deadline(self, host: plugin_host.PluginHost) -> None:
+        hang = self.call(host, "hang", timeout=1)
+        skip = self.call(host, "skip")
+        self.run_until(lambda: self.main_thread.empty())
+
+        self.timer_service.advance(1)
+        assert hang == [None]
+        # The calls after it fail once the host is stopped
+        self.run_until(lambda: bool(skip))
+        assert skip == [None]
+
+        self.timer_service.advance(plugin_host.RESTART_DELAY)
+        replies = self.call(host, "walk")
+        self.run_until(lambda: bool(replies))
+        assert replies[0] is not None and replies[0]["result"] is False
+
+    def test_isolated_plugin(self) -> None:
+        config = model.Config(
+            user_config={
+                "plugins": [
+                    {
+                        "id": "host_example",
+                        "enabled": True,
+                        "isolated": True,
+                        "settings": {"text": "Stretch for "},
+                    }
+                ],
+                "allow_break_on_plugin_timeout": True,
+            },
+            system_config={},
+        )
+        context: dict[str, typing.Any] = {
+            "api": {"set_timeout": self.timer_service.set_timeout}
+        }
+        manager = plugin_manager.PluginManager()
+        manager.init(context, config)
+        try:
+            result = manager.pre_break(get_break("skip"))
+            self.run_until(lambda: result.done)
+            assert not result.result
+            assert context["vetoed_by"] == "host_example"
+
+            walk = get_break("walk")
+            result = manager.start_break(walk)
+            self.run_until(lambda: result.done)
+            assert result.result
+            assert "Stretch for walk" in manager.get_break_screen_widgets(walk)
+        finally:
+            manager.exit()
@@ -0,0 +1,297 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import pathlib
+import pytest
+import sys
+import typing
+from safeeyes import model
+from safeeyes import plugin_manager
+from safeeyes import utility
+from unittest import mock
+
+
+class TestLatencyHistogram:
+    def test_empty(self) -> None:
+        histogram = plugin_manager.LatencyHistogram()
+
+        assert histogram.format() == "n=0"
+
+    def test_buckets(self) -> None:
+        histogram = plugin_manager.LatencyHistogram()
+        for _ in range(98):
+            histogram.add(0.0015)
+        histogram.add(0.03)
+        histogram.add(0.2)
+
+        assert histogram.count == 100
+        assert histogram.counts[1] == 98
+        assert histogram.max == 0.2
+        assert histogram.percentile(0.5) == 0.002
+        assert histogram.percentile(0.99) == 0.05
+        assert histogram.percentile(1) == 0.2
+        assert histogram.format() == "n=100 avg=3.8ms p50<=2ms p99<=50ms max=200.0ms"
+
+    def test_overflow_bucket(self) -> None:
+        histogram = plugin_manager.LatencyHistogram()
+        histogram.add(7)
+
+        assert histogram.counts[-1] == 1
+        assert histogram.percentile(0.5) == 7
+
+
+class TestReload:
+    def get_config(self, settings: dict) -> model.Config:
+        return model.Config(
+            user_config={
+                "plugins": [
+                    {"id": "first", "enabled": True, "settings": settings},
+                    {"id": "second", "enabled": True, "settings": {}},
+                ]
+            },
+            system_config={},
+        )
+
+    @pytest.fixture
+    def loaded_plugins(self, monkeypatch: pytest.MonkeyPatch) -> dict[str, mock.Mock]:
+        loaded: dict[str, mock.Mock] = {}
+
+        def load(plugin: dict, host: object = None) -> mock.Mock:
+            loaded[plugin["id"]] = mock.Mock(id=plugin["id"])
+            return loaded[plugin["id"]]
+
+        monkeypatch.setattr(plugin_manager, "LoadedPlugin", load)
+        return loaded
+
+    def test_reload_changed_plugin(self, loaded_plugins: dict[str, mock.Mock]) -> None:
+        context = {"api": {"set_timeout": mock.Mock()}}
+        config = self.get_config({"volume": 1})
+        manager = plugin_manager.PluginManager()
+        manager.init(context, config)
+        first = loaded_plugins["first"]
+        second = loaded_plugins["second"]
+
+        new_config = self.get_config({"volume": 2})
+        changed = config.changed_plugins(new_config)
+        assert changed == {"first"}
+        manager.reload(context, new_config, changed, False, running=True)
+
+        first.reload_config.assert_called_once_with(new_config.get("plugins")[0])
+        first.init_plugin.assert_called_with(context, new_config)
+        assert first.call_plugin_method.call_args_list == [
+            mock.call("on_stop"),
+            mock.call("on_start"),
+        ]
+        second.reload_config.assert_not_called()
+        second.init_plugin.assert_called_once_with(context, config)
+        second.call_plugin_method.assert_not_called()
+        # The plugins are not loaded again
+        assert loaded_plugins == {"first": first, "second": second}
+
+    def test_reinitialize_all(self, loaded_plugins: dict[str, mock.Mock]) -> None:
+        context = {"api": {"set_timeout": mock.Mock()}}
+        config = self.get_config({})
+        manager = plugin_manager.PluginManager()
+        manager.init(context, config)
+
+        manager.reload(context, config, frozenset(), True, running=False)
+
+        for loaded_plugin in loaded_plugins.values():
+            loaded_plugin.reload_config.assert_not_called()
+            assert loaded_plugin.init_plugin.call_count == 2
+
+    def test_required_plugin_fails(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> None:
+        for plugin_id in ("first", "second"):
+            plugin_dir = tmp_path / plugin_id
+            plugin_dir.mkdir()
+            (plugin_dir / "plugin.py").write_text(
+                "calls = []\n"
+                "def init(ctx, safeeyes_config, plugin_config):\n"
+                "    calls.append(plugin_config)\n"
+            )
+            (plugin_dir / "config.json").write_text(
+                json.dumps(
+                    {
+                        "meta": {"name": plugin_id.title()},
+                        "required_plugin": plugin_id == "first",
+                    }
+                )
+            )
+        monkeypatch.setattr(utility, "SYSTEM_PLUGINS_DIR", str(tmp_path))
+        monkeypatch.setattr(
+            utility,
+            "check_plugin_dependencies",
+            lambda plugin_id, plugin_config, settings, plugin_path: (
+                "Missing" if settings.get("broken") else None
+            ),
+        )
+        monkeypatch.syspath_prepend(str(tmp_path))
+
+        try:
+            context = {"api": {"set_timeout": mock.Mock()}}
+            manager = plugin_manager.PluginManager()
+            manager.init(context, self.get_config({}))
+
+            with pytest.raises(model.RequiredPluginException) as e:
+                manager.reload(
+                    context, self.get_config({"broken": True}), {"first"}, True, False
+                )
+
+            assert e.value.get_plugin_id() == "first"
+            assert e.value.get_plugin_name() == "First"
+            # The other plugins are still initialized again
+            assert len(sys.modules["second.plugin"].calls) == 2
+        finally:
+            for module_name in ("first", "first.plugin", "second", "second.plugin"):
+                sys.modules.pop(module_name, None)
+
+
+class TestDispatch:
+    PLUGINS = {
+        "dispatch_counter": (
+            "calls = []\n"
+            "def on_countdown(countdown, seconds):\n"
+            "    calls.append(countdown)\n"
+            "def on_start(unexpected):\n"
+            "    calls.append('on_start')\n"
+        ),
+        "dispatch_override": (
+            "calls = []\n"
+            "def on_pre_break(break_obj):\n"
+            "    calls.append(break_obj.name)\n"
+            "    return False\n"
+        ),
+        "dispatch_lazy": (
+            "calls = []\n"
+            "def init(ctx, safeeyes_config, plugin_config):\n"
+            "    calls.append('init')\n"
+            "def on_stop():\n"
+            "    calls.append('on_stop')\n"
+            "def on_stop_break():\n"
+            "    calls.append('on_stop_break')\n"
+        ),
+    }
+
+    @pytest.fixture
+    def plugins_dir(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> typing.Generator[pathlib.Path]:
+        for plugin_id, source in self.PLUGINS.items():
+            plugin_dir = tmp_path / plugin_id
+            plugin_dir.mkdir()
+            (plugin_dir / "plugin.py").write_text(source)
+            plugin_config = {
+                "meta": {"name": plugin_id, "version": "0.0.1"},
+                "dependencies": {
+                    "python_modules": [],
+                    "shell_commands": [],
+                    "operating_systems": [],
+                    "desktop_environments": [],
+                    "resources": [],
+                },
+                "break_override_allowed": plugin_id == "dispatch_override",
+            }
+            if plugin_id == "dispatch_lazy":
+                plugin_config["hooks"] = ["on_stop", "on_stop_break"]
+            (plugin_dir / "config.json").write_text(json.dumps(plugin_config))
+        monkeypatch.setattr(utility, "SYSTEM_PLUGINS_DIR", str(tmp_path))
+        monkeypatch.setattr(utility, "CACHE_DIRECTORY", str(tmp_path / "cache"))
+        monkeypatch.setattr(
+            utility,
+            "DEPENDENCY_CACHE_PATH",
+            str(tmp_path / "cache" / "dependencies.json"),
+        )
+        monkeypatch.setattr(utility, "__dependency_cache", None)
+        monkeypatch.syspath_prepend(str(tmp_path))
+        yield tmp_path
+        for plugin_id in self.PLUGINS:
+            sys.modules.pop(plugin_id, None)
+            sys.modules.pop(plugin_id + ".plugin", None)
+
+    def get_manager(self) -> plugin_manager.PluginManager:
+        config = model.Config(
+            user_config={
+                "plugins": [
+                    {"id": "dispatch_counter", "enabled": True},
+                    {"id": "dispatch_override", "enabled": False},
+                    {"id": "dispatch_lazy", "enabled": True},
+                ],
+                "allow_break_on_plugin_timeout": True,
+            },
+            system_config={},
+        )
+        manager = plugin_manager.PluginManager()
+        manager.init({"api": {"set_timeout": mock.Mock()}}, config)
+        return manager
+
+    def test_methods_are_looked_up_once(
+        self, monkeypatch: pytest.MonkeyPatch, plugins_dir: pathlib.Path
+    ) -> None:
+        manager = self.get_manager()
+        has_method = mock.Mock(side_effect=utility.has_method)
+        monkeypatch.setattr(utility, "has_method", has_method)
+
+        for countdown in range(3, 0, -1):
+            manager.countdown(countdown, 3 - countdown)
+        manager.start()
+
+        # The method with the wrong number of arguments is not called
+        assert sys.modules["dispatch_counter.plugin"].calls == [3, 2, 1]
+        assert has_method.call_count == 2
+
+    def test_break_overrides(self, plugins_dir: pathlib.Path) -> None:
+        manager = self.get_manager()
+        default_break = model.Break(
+            model.BreakType.SHORT_BREAK, "default", 15, 15, None, None
+        )
+        override_break = model.Break(
+            model.BreakType.SHORT_BREAK,
+            "override",
+            15,
+            15,
+            None,
+            frozenset({"dispatch_override"}),
+        )
+
+        assert manager.pre_break(default_break)
+        assert manager.pre_break(override_break)
+        assert manager.pre_break(default_break)
+
+        assert sys.modules["dispatch_override.plugin"].calls == ["override"]
+
+    def test_lazy_import(self, plugins_dir: pathlib.Path) -> None:
+        manager = self.get_manager()
+        assert "dispatch_lazy.plugin" not in sys.modules
+
+        # Cleanup methods do not import the plugin
+        manager.stop()
+        assert "dispatch_lazy.plugin" not in sys.modules
+
+        manager.stop_break()
+        manager.stop_break()
+        assert sys.modules["dispatch_lazy.plugin"].calls == [
+            "init",
+            "on_stop_break",
+            "on_stop_break",
+        ]
+
+        manager.stop()
+        assert sys.modules["dispatch_lazy.plugin"].calls[-1] == "on_stop"
@@ -0,0 +1,129 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import pathlib
+import pytest
+from safeeyes import session
+from safeeyes import utility
+from safeeyes.timers import TimerService
+from unittest import mock
+
+
+class ManualTimerService(TimerService):
+    now = 0.0
+
+    def monotonic_time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+        self.run_due()
+
+
+class TestSessionStore:
+    @pytest.fixture
+    def write_file(self, monkeypatch: pytest.MonkeyPatch) -> mock.Mock:
+        write_file = mock.Mock(side_effect=utility.write_file)
+        monkeypatch.setattr(utility, "write_file", write_file)
+        return write_file
+
+    def get_store(
+        self, path: pathlib.Path
+    ) -> tuple[session.SessionStore, ManualTimerService]:
+        timer_service = ManualTimerService()
+        data = {"break": "break 1", "plugin": {"healthstats": {"breaks": 0}}}
+        store = session.SessionStore(str(path), data, timer_service, delay=5)
+        return (store, timer_service)
+
+    def test_writes_are_debounced(
+        self, tmp_path: pathlib.Path, write_file: mock.Mock
+    ) -> None:
+        path = tmp_path / "session.json"
+        (store, timer_service) = self.get_store(path)
+
+        store.data["break"] = "break 2"
+        store.mark_dirty()
+        timer_service.advance(3)
+        store.data["plugin"]["healthstats"]["breaks"] += 1
+        store.mark_dirty()
+        timer_service.advance(3)
+        assert write_file.call_count == 0
+
+        timer_service.advance(3)
+        store.flush(wait=True)
+
+        assert write_file.call_count == 1
+        assert json.loads(path.read_text()) == {
+            "break": "break 2",
+            "plugin": {"healthstats": {"breaks": 1}},
+        }
+
+    def test_dirty_namespaces(
+        self, tmp_path: pathlib.Path, write_file: mock.Mock
+    ) -> None:
+        (store, _) = self.get_store(tmp_path / "session.json")
+        assert store.dirty_namespaces() == set()
+
+        store.flush(wait=True)
+        assert write_file.call_count == 0
+
+        store.data["plugin"]["healthstats"]["breaks"] = 3
+        store.data["plugin"]["limitconsecutiveskipping"] = {}
+        assert store.dirty_namespaces() == {
+            "plugin/healthstats",
+            "plugin/limitconsecutiveskipping",
+        }
+
+        store.flush(wait=True)
+        assert write_file.call_count == 1
+        assert store.dirty_namespaces() == set()
+
+    def test_discard(self, tmp_path: pathlib.Path, write_file: mock.Mock) -> None:
+        path = tmp_path / "session.json"
+        (store, timer_service) = self.get_store(path)
+        path.write_text("{}")
+
+        store.data["break"] = "break 2"
+        store.mark_dirty()
+        store.discard()
+        timer_service.advance(10)
+
+        assert not path.exists()
+        assert write_file.call_count == 0
+
+        # The whole session is written again once it is saved
+        store.flush(wait=True)
+        assert json.loads(path.read_text())["break"] == "break 2"
+
+    def test_failed_write_is_retried(
+        self, tmp_path: pathlib.Path, write_file: mock.Mock
+    ) -> None:
+        path = tmp_path / "session.json"
+        (store, _) = self.get_store(path)
+        store.data["break"] = "break 2"
+
+        original = write_file.side_effect
+        write_file.side_effect = lambda path, content: False
+        store.flush(wait=True)
+        assert store.dirty_namespaces() == {"break"}
+
+        write_file.side_effect = original
+        store.flush(wait=True)
+        assert store.dirty_namespaces() == set()
+        assert json.loads(path.read_text())["break"] == "break 2"
@@ -0,0 +1,115 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import typing
+
+from safeeyes import model
+from safeeyes import simulation
+
+
+class TestSimulation:
+    def get_config(self) -> model.Config:
+        return model.Config(
+            user_config={
+                "short_breaks": [
+                    {"name": "break 1"},
+                    {"name": "break 2"},
+                ],
+                "long_breaks": [
+                    {"name": "long break 1"},
+                ],
+                "short_break_interval": 15,
+                "long_break_interval": 75,
+                "long_break_duration": 60,
+                "short_break_duration": 15,
+                "pre_break_warning_time": 10,
+                "random_order": False,
+                "postpone_duration": 5,
+            },
+            system_config={},
+        )
+
+    def get_events(self, sim: simulation.Simulation, event: str) -> list[str]:
+        return [
+            f"{when:%H:%M:%S} {details}".strip()
+            for (when, name, details) in sim.timeline
+            if name == event
+        ]
+
+    def run(self, scenario: dict[str, typing.Any]) -> simulation.Simulation:
+        scenario = {"start": "2024-08-26T09:00:00", **scenario}
+        sim = simulation.Simulation(scenario, self.get_config())
+        sim.run()
+        return sim
+
+    def test_breaks(self) -> None:
+        sim = self.run({"duration": 2 * 60 * 60})
+
+        assert self.get_events(sim, "break") == [
+            "09:15:10 #1 break 1 (short)",
+            "09:30:35 #2 break 2 (short)",
+            "09:46:00 #3 break 1 (short)",
+            "10:01:25 #4 break 2 (short)",
+            "10:16:50 #5 long break 1 (long)",
+            "10:33:00 #6 break 1 (short)",
+            "10:48:25 #7 break 2 (short)",
+        ]
+
+    def test_break_actions(self) -> None:
+        sim = self.run(
+            {
+                "duration": 60 * 60,
+                "breaks": [
+                    {"break": 1, "action": "skip", "after": 5},
+                    {"break": 2, "action": "postpone"},
+                ],
+            }
+        )
+
+        assert self.get_events(sim, "skipped") == ["09:15:15"]
+        assert self.get_events(sim, "postponed") == ["09:30:25"]
+        assert self.get_events(sim, "break") == [
+            "09:15:10 #1 break 1 (short)",
+            "09:30:25 #2 break 2 (short)",
+            "09:35:36 #3 break 2 (short)",
+            "09:51:01 #4 break 1 (short)",
+        ]
+
+    def test_suspend_stops_monotonic_clock(self) -> None:
+        sim = self.run(
+            {
+                "duration": 3 * 60 * 60,
+                "events": [{"at": 600, "type": "suspend", "duration": 2 * 60 * 60}],
+            }
+        )
+
+        assert self.get_events(sim, "suspend") == ["09:10:00"]
+        assert self.get_events(sim, "wakeup") == ["11:10:00"]
+        assert self.get_events(sim, "break")[0] == "11:25:10 #1 break 1 (short)"
+
+    def test_idle_credits_back_idle_time(self) -> None:
+        sim = self.run(
+            {
+                "duration": 60 * 60,
+                "events": [{"at": 300, "type": "idle", "duration": 300}],
+            }
+        )
+
+        assert self.get_events(sim, "idle") == ["09:05:05"]
+        assert self.get_events(sim, "resumed") == ["09:10:00 idle for 0:05:00"]
+        assert self.get_events(sim, "break")[0] == "09:20:10 #1 break 1 (short)"
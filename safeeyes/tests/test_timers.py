@@ -0,0 +1,205 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+import typing
+
+from safeeyes import timers
+
+from unittest import mock
+
+
+class FakeMainLoop:
+    """Replaces the GLib sources and the monotonic clock used by the timers."""
+
+    now: float = 0
+    next_source_id: int = 1
+
+    def __init__(self) -> None:
+        self.sources: dict[int, tuple[float, typing.Callable]] = {}
+
+    def timeout_add(self, interval_ms: int, callback: typing.Callable) -> int:
+        return self.__add(interval_ms / 1000, callback)
+
+    def timeout_add_seconds(self, interval: int, callback: typing.Callable) -> int:
+        return self.__add(interval, callback)
+
+    def source_remove(self, source_id: int) -> None:
+        del self.sources[source_id]
+
+    def __add(self, seconds: float, callback: typing.Callable) -> int:
+        source_id = self.next_source_id
+        self.next_source_id += 1
+        self.sources[source_id] = (self.now + seconds, callback)
+        return source_id
+
+    def run_until(self, time: float) -> None:
+        while self.sources:
+            (source_id, (deadline, callback)) = min(
+                self.sources.items(), key=lambda item: item[1][0]
+            )
+            if deadline > time:
+                break
+            del self.sources[source_id]
+            self.now = deadline
+            callback()
+        self.now = time
+
+
+class TestTimerService:
+    @pytest.fixture
+    def loop(self, monkeypatch: pytest.MonkeyPatch) -> FakeMainLoop:
+        loop = FakeMainLoop()
+        monkeypatch.setattr(timers.GLib, "timeout_add", loop.timeout_add)
+        monkeypatch.setattr(
+            timers.GLib, "timeout_add_seconds", loop.timeout_add_seconds
+        )
+        monkeypatch.setattr(timers.GLib, "source_remove", loop.source_remove)
+        monkeypatch.setattr(timers, "monotonic_time", lambda: loop.now)
+        return loop
+
+    def test_timeouts_fire_in_order_with_one_source(self, loop: FakeMainLoop) -> None:
+        service = timers.TimerService()
+        calls: list[str] = []
+
+        service.set_timeout(30, calls.append, "c")
+        service.set_timeout(10, calls.append, "a")
+        service.set_timeout(20, calls.append, "b")
+
+        assert len(loop.sources) == 1
+
+        loop.run_until(15)
+        assert calls == ["a"]
+        loop.run_until(100)
+        assert calls == ["a", "b", "c"]
+        assert service.pending() == 0
+        assert loop.sources == {}
+
+    def test_close_deadlines_are_coalesced(self, loop: FakeMainLoop) -> None:
+        service = timers.TimerService()
+        callback = mock.Mock()
+
+        service.set_timeout(10, callback)
+        loop.now = 0.3
+        service.set_timeout(10, callback)
+
+        loop.run_until(11)
+
+        assert callback.call_count == 2
+        assert service.wakeups == 1
+        assert service.coalesced == 1
+
+    def test_cancel(self, loop: FakeMainLoop) -> None:
+        service = timers.TimerService()
+        callback = mock.Mock()
+
+        timer = service.set_timeout(10, callback)
+        service.set_timeout(20, callback, "later")
+        timer.cancel()
+
+        loop.run_until(15)
+        callback.assert_not_called()
+        # the source was moved to the remaining timer, no spurious wakeup happened
+        assert service.wakeups == 0
+
+        loop.run_until(25)
+        callback.assert_called_once_with("later")
+
+    def test_interval(self, loop: FakeMainLoop) -> None:
+        service = timers.TimerService()
+        callback = mock.Mock()
+
+        timer = service.set_interval(0.5, callback)
+
+        loop.run_until(2.1)
+        assert callback.call_count == 4
+
+        timer.cancel()
+        loop.run_until(10)
+        assert callback.call_count == 4
+        assert loop.sources == {}
+
+    def test_timer_added_by_callback_fires_in_next_wakeup(
+        self, loop: FakeMainLoop
+    ) -> None:
+        service = timers.TimerService()
+        calls: list[str] = []
+
+        def first():
+            calls.append("first")
+            service.set_timeout(0, calls.append, "second")
+
+        service.set_timeout(5, first)
+
+        assert service.run_due(5) == 1
+        assert calls == ["first"]
+        assert service.run_due(5) == 1
+        assert calls == ["first", "second"]
+
+    def test_callback_exception_does_not_stop_other_timers(
+        self, loop: FakeMainLoop
+    ) -> None:
+        service = timers.TimerService()
+        callback = mock.Mock()
+
+        service.set_timeout(1, mock.Mock(side_effect=Exception("broken plugin")))
+        service.set_timeout(1, callback)
+
+        loop.run_until(2)
+
+        callback.assert_called_once()
+
+    def test_suspend_detected_on_wakeup(
+        self, loop: FakeMainLoop, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        suspended = 0.0
+        monkeypatch.setattr(timers, "boot_time", lambda: loop.now + suspended)
+        service = timers.TimerService()
+        calls: list[str] = []
+        suspend_callback = mock.Mock(
+            side_effect=lambda seconds: calls.append("suspend")
+        )
+        service.suspend_callback = suspend_callback
+
+        service.set_timeout(10, calls.append, "timeout")
+        service.set_timeout(20, calls.append, "timeout")
+
+        loop.run_until(10)
+        suspend_callback.assert_not_called()
+
+        # The monotonic clock stops during suspend, the boot clock does not
+        suspended = 3600
+        loop.run_until(20)
+
+        suspend_callback.assert_called_once_with(3600)
+        assert calls == ["timeout", "suspend", "timeout"]
+
+    def test_small_clock_drift_is_not_a_suspend(
+        self, loop: FakeMainLoop, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        drift = 0.0
+        monkeypatch.setattr(timers, "boot_time", lambda: loop.now + drift)
+        service = timers.TimerService()
+        suspend_callback = mock.Mock()
+        service.suspend_callback = suspend_callback
+
+        service.set_timeout(10, lambda: None)
+        drift = timers.SUSPEND_THRESHOLD
+        loop.run_until(10)
+
+        suspend_callback.assert_not_called()
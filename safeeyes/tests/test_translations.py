@@ -0,0 +1,78 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gettext
+import pytest
+from safeeyes import translations
+from safeeyes import utility
+
+
+class FakeTranslations:
+    def __init__(self, language: str) -> None:
+        self.language = language
+        self.calls: list[str] = []
+
+    def gettext(self, message: str) -> str:
+        self.calls.append(message)
+        return f"{self.language}: {message}"
+
+
+class TestTranslations:
+    @pytest.fixture(autouse=True)
+    def fake_translations(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(translations, "_translations", translations._translations)
+        monkeypatch.setattr(translations, "_locale", translations._locale)
+        monkeypatch.setattr(translations, "_cache", {})
+        monkeypatch.setattr(
+            gettext,
+            "translation",
+            lambda domain, localedir, languages, fallback: FakeTranslations(
+                languages[0]
+            ),
+        )
+
+    def setup_locale(
+        self, monkeypatch: pytest.MonkeyPatch, locale: str
+    ) -> FakeTranslations:
+        monkeypatch.setattr(utility, "system_locale", lambda: locale)
+        return translations.setup()
+
+    def test_translate_is_cached(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        translator = self.setup_locale(monkeypatch, "de_DE")
+
+        assert translations.translate("Settings") == "de_DE: Settings"
+        assert translations.translate("Settings") == "de_DE: Settings"
+        assert translator.calls == ["Settings"]
+
+    def test_cache_is_per_locale(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        self.setup_locale(monkeypatch, "de_DE")
+        translations.translate("Settings")
+
+        # The same locale keeps the cache
+        translator = self.setup_locale(monkeypatch, "de_DE")
+        assert translations.translate("Settings") == "de_DE: Settings"
+        assert translator.calls == []
+
+        translator = self.setup_locale(monkeypatch, "fr_FR")
+        assert translations.translate("Settings") == "fr_FR: Settings"
+        assert translator.calls == ["Settings"]
+
+        # Switching back keeps the translations of the locale
+        translator = self.setup_locale(monkeypatch, "de_DE")
+        assert translations.translate("Settings") == "de_DE: Settings"
+        assert translator.calls == []
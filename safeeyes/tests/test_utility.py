@@ -0,0 +1,218 @@
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import pathlib
+import pytest
+import threading
+from safeeyes import model
+from safeeyes import utility
+
+
+class TestWriteJson:
+    def test_write(self, tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "safeeyes.json"
+
+        assert utility.write_json(str(path), {"b": 1, "a": [2]})
+
+        assert json.loads(path.read_text()) == {"a": [2], "b": 1}
+        assert os.listdir(tmp_path) == ["safeeyes.json"]
+
+    def test_unchanged_is_not_written(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        path = tmp_path / "safeeyes.json"
+        utility.write_json(str(path), {"a": 1})
+
+        def fail(*args) -> None:
+            raise AssertionError("the file was written")
+
+        monkeypatch.setattr(os, "replace", fail)
+
+        assert not utility.write_json(str(path), {"a": 1})
+
+    def test_failed_write_keeps_file(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        path = tmp_path / "safeeyes.json"
+        utility.write_json(str(path), {"a": 1})
+
+        def fail(fd: int) -> None:
+            raise OSError("disk full")
+
+        monkeypatch.setattr(os, "fsync", fail)
+
+        assert not utility.write_json(str(path), {"a": 2})
+        assert json.loads(path.read_text()) == {"a": 1}
+        assert os.listdir(tmp_path) == ["safeeyes.json"]
+
+    def test_interrupted_write_is_raised(
+        self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        path = tmp_path / "safeeyes.json"
+
+        def interrupt(fd: int) -> None:
+            raise KeyboardInterrupt()
+
+        monkeypatch.setattr(os, "fsync", interrupt)
+
+        with pytest.raises(KeyboardInterrupt):
+            utility.write_json(str(path), {"a": 1})
+        assert os.listdir(tmp_path) == []
+
+    def test_mode_is_kept(self, tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "safeeyes.json"
+        utility.write_json(str(path), {"a": 1})
+        path.chmod(0o640)
+
+        utility.write_json(str(path), {"a": 2})
+
+        assert path.stat().st_mode & 0o777 == 0o640
+
+    def test_concurrent_writes(self, tmp_path: pathlib.Path) -> None:
+        path = tmp_path / "session.json"
+        threads = [
+            threading.Thread(target=utility.write_json, args=(str(path), {"a": i}))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert json.loads(path.read_text())["a"] in range(8)
+        assert os.listdir(tmp_path) == ["session.json"]
+
+    def test_symlink_is_kept(self, tmp_path: pathlib.Path) -> None:
+        target = tmp_path / "dotfiles.json"
+        link = tmp_path / "safeeyes.json"
+        link.symlink_to(target)
+
+        utility.write_json(str(link), {"a": 1})
+
+        assert link.is_symlink()
+        assert json.loads(target.read_text()) == {"a": 1}
+
+
+class TestDependencyCache:
+    PLUGIN_CONFIG = {
+        "meta": {"name": "Example", "version": "0.0.1"},
+        "dependencies": {
+            "python_modules": [],
+            "shell_commands": ["example-command"],
+            "operating_systems": [],
+            "desktop_environments": [],
+            "resources": [],
+        },
+    }
+
+    @pytest.fixture(autouse=True)
+    def cache_directory(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> pathlib.Path:
+        (tmp_path / "bin").mkdir()
+        (tmp_path / "example").mkdir()
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        monkeypatch.setattr(utility, "CACHE_DIRECTORY", str(tmp_path / "cache"))
+        monkeypatch.setattr(
+            utility,
+            "DEPENDENCY_CACHE_PATH",
+            str(tmp_path / "cache" / "dependencies.json"),
+        )
+        monkeypatch.setattr(utility, "__dependency_cache", None)
+        monkeypatch.setattr(utility, "__dependency_cache_dirty", False)
+        return tmp_path
+
+    def check(self, tmp_path: pathlib.Path, plugin_config: dict = PLUGIN_CONFIG):
+        return utility.check_plugin_dependencies(
+            "example", plugin_config, {}, str(tmp_path / "example")
+        )
+
+    def test_result_is_cached(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> None:
+        assert self.check(tmp_path) is not None
+        utility.save_dependency_cache()
+
+        def fail(command: str) -> None:
+            raise AssertionError("the command was looked up")
+
+        # A warm start reads the cache file
+        monkeypatch.setattr(utility, "__dependency_cache", None)
+        monkeypatch.setattr(utility, "command_exist", fail)
+        assert self.check(tmp_path) is not None
+
+    def test_installed_command_invalidates(self, tmp_path: pathlib.Path) -> None:
+        assert self.check(tmp_path) is not None
+
+        command = tmp_path / "bin" / "example-command"
+        command.write_text("#!/bin/sh\n")
+        command.chmod(0o755)
+        # Some file systems only have a coarse mtime
+        os.utime(tmp_path / "bin", ns=(0, 0))
+
+        assert self.check(tmp_path) is None
+
+    def test_uncacheable_plugin(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> None:
+        plugin_config = json.loads(json.dumps(self.PLUGIN_CONFIG))
+        plugin_config["dependencies"]["cacheable"] = False
+        self.check(tmp_path, plugin_config)
+        utility.save_dependency_cache()
+
+        assert not os.path.exists(utility.DEPENDENCY_CACHE_PATH)
+
+    @pytest.mark.parametrize("retryable", [False, True])
+    def test_plugin_dependency(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path, retryable: bool
+    ) -> None:
+        checks = []
+
+        def check(*args) -> model.PluginDependency:
+            checks.append(args)
+            return model.PluginDependency("Missing", "https://example.com", retryable)
+
+        monkeypatch.setattr(utility, "__check_plugin_dependencies", check)
+        self.check(tmp_path)
+        utility.save_dependency_cache()
+
+        monkeypatch.setattr(utility, "__dependency_cache", None)
+        result = self.check(tmp_path)
+
+        assert result == model.PluginDependency(
+            "Missing", "https://example.com", retryable
+        )
+        assert len(checks) == (2 if retryable else 1)
+
+    def test_cache_is_written_once(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path
+    ) -> None:
+        writes = []
+        monkeypatch.setattr(utility, "write_json", lambda *args: writes.append(args))
+
+        for plugin_id in ("first", "second"):
+            utility.check_plugin_dependencies(
+                plugin_id, self.PLUGIN_CONFIG, {}, str(tmp_path / "example")
+            )
+        assert writes == []
+
+        utility.save_dependency_cache()
+        utility.save_dependency_cache()
+        assert len(writes) == 1
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# Safe Eyes is a utility to remind you to take break frequently
+# to protect your eyes from eye strain.
+
+# Copyright (C) 2025  Mel Dafert <m@dafert.at>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Timers shared by the core, the UI and the plugins.
+
+All timers are kept in a single heap ordered by their deadline, and only one GLib
+source is armed for the earliest of them. Timers whose deadlines are close to each
+other are fired in the same wakeup.
+
+Plugins can use the timers through context["api"]:
+ - set_timeout(seconds, callback, *args) -> Timer
+    Call the callback once after the given number of seconds
+ - set_interval(seconds, callback, *args) -> Timer
+    Call the callback every given number of seconds, until it is cancelled
+The returned Timer can be stopped using Timer.cancel().
+These must only be used from the main thread.
+
+On every wakeup, the service compares how far the monotonic clock and the boot clock
+advanced. If the boot clock advanced further, the system was suspended in between,
+and the suspend_callback is called before any timer fires.
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import time
+import typing
+
+import gi
+
+gi.require_version("GLib", "2.0")
+from gi.repository import GLib
+
+# Timers with a whole number of seconds may be fired up to this many seconds early,
+# which allows GLib to coalesce their wakeups
+COARSE_TOLERANCE = 0.5
+# Timers with sub-second intervals are fired at most this many seconds early
+PRECISE_TOLERANCE = 0.001
+# A difference between the clocks larger than this many seconds is a suspend
+SUSPEND_THRESHOLD = 5
+
+
+def monotonic_time() -> float:
+    """Return the clock all timer deadlines are measured against.
+
+    This clock is not affected by changes to the wall-clock time (NTP, DST, manual
+    changes), and, like GLib timeout sources, does not advance during suspend.
+    """
+    return time.monotonic()
+
+
+def boot_time() -> float:
+    """Return a monotonic clock that keeps counting while the system is suspended."""
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+def _is_precise(seconds: float) -> bool:
+    """Timers with sub-second intervals need millisecond GLib sources."""
+    return not float(seconds).is_integer()
+
+
+class Timer:
+    """A one-shot or periodic timer registered in the TimerService."""
+
+    deadline: float
+    interval: typing.Optional[float]
+    cancelled: bool = False
+
+    def __init__(
+        self,
+        service: "TimerService",
+        deadline: float,
+        interval: typing.Optional[float],
+        precise: bool,
+        callback: typing.Callable,
+        args: tuple,
+    ) -> None:
+        self.__service = service
+        self.deadline = deadline
+        self.interval = interval
+        self.precise = precise
+        self.callback = callback
+        self.args = args
+
+    def cancel(self) -> None:
+        """Stop the timer. Cancelling an already fired or cancelled timer is a no-op."""
+        if not self.cancelled:
+            self.cancelled = True
+            self.__service._on_cancel(self)
+
+    def is_pending(self) -> bool:
+        """Check whether the timer will still fire."""
+        return not self.cancelled
+
+    def _tolerance(self) -> float:
+        return PRECISE_TOLERANCE if self.precise else COARSE_TOLERANCE
+
+
+class TimerService:
+    """Keeps all timers in a heap and arms a single GLib source for them."""
+
+    # number of times the GLib source fired, and timers fired in the same wakeup
+    # as another timer
+    wakeups: int = 0
+    coalesced: int = 0
+
+    # called with the number of seconds the system was suspended, once a wakeup
+    # notices it
+    suspend_callback: typing.Optional[typing.Callable[[float], None]] = None
+
+    def __init__(self) -> None:
+        self.__dispatching = False
+        self.__heap: list[tuple[float, int, Timer]] = []
+        self.__counter = itertools.count()
+        self.__source_id: typing.Optional[int] = None
+        self.__armed_deadline: typing.Optional[float] = None
+        # (monotonic_time(), boot_time()) when the clocks were last compared
+        self.__last_clocks: typing.Optional[tuple[float, float]] = None
+
+    def set_timeout(self, seconds: float, callback: typing.Callable, *args) -> Timer:
+        """Call the callback once after the given number of seconds."""
+        return self.__add(
+            self.monotonic_time() + seconds, None, _is_precise(seconds), callback, args
+        )
+
+    def set_deadline(self, deadline: float, callback: typing.Callable, *args) -> Timer:
+        """Call the callback once the monotonic_time() deadline is reached."""
+        return self.__add(deadline, None, False, callback, args)
+
+    def set_interval(self, seconds: float, callback: typing.Callable, *args) -> Timer:
+        """Call the callback every given number of seconds until it is cancelled."""
+        if seconds <= 0:
+            raise ValueError("interval must be positive")
+        return self.__add(
+            self.monotonic_time() + seconds,
+            seconds,
+            _is_precise(seconds),
+            callback,
+            args,
+        )
+
+    def monotonic_time(self) -> float:
+        """Return the current time of the clock used for the deadlines."""
+        return monotonic_time()
+
+    def boot_time(self) -> float:
+        """Return the current time of the clock that counts during suspend."""
+        return boot_time()
+
+    def time(self) -> float:
+        """Return the wall-clock time as a timestamp, for display purposes."""
+        return time.time()
+
+    def pending(self) -> int:
+        """Return the number of timers that will still fire."""
+        return sum(1 for (_, _, timer) in self.__heap if not timer.cancelled)
+
+    def next_deadline(self) -> typing.Optional[float]:
+        """Return the deadline of the earliest pending timer."""
+        self.__purge()
+        if not self.__heap:
+            return None
+        return self.__heap[0][0]
+
+    def run_due(self, now: typing.Optional[float] = None) -> int:
+        """Fire all timers that are due at the given time, and return their count.
+
+        This is called from the GLib source, but can also be used to drive the
+        timers without a main loop.
+        """
+        if now is None:
+            now = self.monotonic_time()
+
+        self.__dispatching = True
+        try:
+            fired = self.__fire_due(now)
+        finally:
+            self.__dispatching = False
+
+        if fired > 1:
+            self.coalesced += fired - 1
+
+        self.__schedule()
+
+        return fired
+
+    def __fire_due(self, now: float) -> int:
+        # Collect the due timers first - timers added by the callbacks only fire in
+        # the next wakeup, so that the main loop gets to run in between
+        due = []
+        while self.__heap:
+            (deadline, _, timer) = self.__heap[0]
+            if not timer.cancelled and deadline - now > timer._tolerance():
+                break
+            heapq.heappop(self.__heap)
+            if not timer.cancelled:
+                due.append(timer)
+
+        fired = 0
+        for timer in due:
+            if timer.cancelled:
+                # cancelled by one of the previous callbacks
+                continue
+
+            if timer.interval is None:
+                timer.cancelled = True
+            else:
+                # Keep the period aligned to the original deadline, but do not try
+                # to catch up on periods that were missed
+                timer.deadline += timer.interval
+                if timer.deadline <= now:
+                    timer.deadline = now + timer.interval
+                self.__push(timer)
+
+            fired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                logging.exception("Error in timer callback %s", timer.callback)
+
+        return fired
+
+    def __add(
+        self,
+        deadline: float,
+        interval: typing.Optional[float],
+        precise: bool,
+        callback: typing.Callable,
+        args: tuple,
+    ) -> Timer:
+        timer = Timer(self, deadline, interval, precise, callback, args)
+        self.__push(timer)
+        self.__schedule()
+        return timer
+
+    def __push(self, timer: Timer) -> None:
+        heapq.heappush(self.__heap, (timer.deadline, next(self.__counter), timer))
+
+    def __purge(self) -> None:
+        while self.__heap and self.__heap[0][2].cancelled:
+            heapq.heappop(self.__heap)
+
+    def _on_cancel(self, timer: Timer) -> None:
+        if self.__armed_deadline is not None and timer.deadline <= (
+            self.__armed_deadline
+        ):
+            # The armed source was meant for this timer, avoid a spurious wakeup
+            self.__schedule(rearm=True)
+
+    def __schedule(self, rearm: bool = False) -> None:
+        """Make sure the GLib source is armed for the earliest timer."""
+        if self.__dispatching:
+            # run_due schedules once all due timers have fired
+            return
+
+        self.__purge()
+
+        if not self.__heap:
+            self.__disarm()
+            return
+
+        (deadline, _, timer) = self.__heap[0]
+        if self.__source_id is not None and self.__armed_deadline is not None:
+            if self.__armed_deadline == deadline or (
+                self.__armed_deadline < deadline and not rearm
+            ):
+                # The source fires early enough already
+                return
+            self.__disarm()
+
+        if self.__last_clocks is None:
+            self.__last_clocks = (self.monotonic_time(), self.boot_time())
+
+        remaining = max(0, deadline - self.monotonic_time())
+        self.__source_id = self._add_source(remaining, timer.precise)
+        self.__armed_deadline = deadline
+
+    def __disarm(self) -> None:
+        if self.__source_id is not None:
+            self._remove_source(self.__source_id)
+        self.__source_id = None
+        self.__armed_deadline = None
+
+    def _add_source(self, remaining: float, precise: bool) -> int:
+        """Arm the GLib source to wake up after the given number of seconds."""
+        if precise:
+            return GLib.timeout_add(math.ceil(remaining * 1000), self._on_wakeup)
+
+        # Let GLib coalesce the wakeup with other processes
+        seconds = max(0, math.ceil(remaining - COARSE_TOLERANCE))
+        return GLib.timeout_add_seconds(seconds, self._on_wakeup)
+
+    def _remove_source(self, source_id: int) -> None:
+        GLib.source_remove(source_id)
+
+    def check_suspend(self) -> float:
+        """Return how many seconds the system was suspended since the last check.
+
+        Calls the suspend_callback if that is more than SUSPEND_THRESHOLD.
+        """
+        clocks = (self.monotonic_time(), self.boot_time())
+        last_clocks = self.__last_clocks
+        self.__last_clocks = clocks
+        if last_clocks is None:
+            return 0
+
+        suspended = (clocks[1] - last_clocks[1]) - (clocks[0] - last_clocks[0])
+        if suspended <= SUSPEND_THRESHOLD:
+            return 0
+
+        logging.info("System was suspended for %d seconds", suspended)
+        if self.suspend_callback is not None:
+            self.suspend_callback(suspended)
+        return suspended
+
+    def _on_wakeup(self) -> bool:
+        self.__source_id = None
+        self.__armed_deadline = None
+        self.wakeups += 1
+
+        self.check_suspend()
+        self.run_due()
+
+        # This source is replaced by the one armed in __schedule
+        return GLib.SOURCE_REMOVE
@@ -16,24 +16,36 @@
 
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-"""Translation setup and helpers."""
+"""Translation setup and helpers.
+
+Translated messages are cached by the locale they were translated for and the
+message, so that translating the same message again is only a dict lookup, and
+switching back to a locale keeps its translations.
+"""
 
 import locale
 import gettext
 import sys
+import typing
 from safeeyes import utility
 
 _translations = gettext.NullTranslations()
+# the locale of _translations
+_locale: typing.Optional[str] = None
+# (locale, message) -> translated message
+_cache: dict[tuple[typing.Optional[str], str], str] = {}
 
 
 def setup():
-    global _translations
+    global _translations, _locale
+    system_locale = utility.system_locale()
     _translations = gettext.translation(
         "safeeyes",
         localedir=utility.LOCALE_PATH,
-        languages=[utility.system_locale(), "en_US"],
+        languages=[system_locale, "en_US"],
         fallback=True,
     )
+    _locale = system_locale
     try:
         # locale.bindtextdomain is required for Glade files
         locale.bindtextdomain("safeeyes", utility.LOCALE_PATH)
@@ -49,4 +61,10 @@ def setup():
 
 def translate(message: str) -> str:
     """Translate the message using the current translator."""
-    return _translations.gettext(message)
+    key = (_locale, message)
+    try:
+        return _cache[key]
+    except KeyError:
+        translated = _translations.gettext(message)
+        _cache[key] = translated
+        return translated
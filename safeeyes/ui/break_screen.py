@@ -69,9 +69,10 @@ class BreakScreen:
     def initialize(self, config):
         """Initialize the internal properties from configuration."""
         logging.info("Initialize the break screen")
-        self.enable_postpone = config.get("allow_postpone", False)
-        self.keycode_shortcut_postpone = config.get("shortcut_postpone", 65)
-        self.keycode_shortcut_skip = config.get("shortcut_skip", 9)
+        settings = config.snapshot()
+        self.enable_postpone = settings.allow_postpone
+        self.keycode_shortcut_postpone = settings.shortcut_postpone
+        self.keycode_shortcut_skip = settings.shortcut_skip
 
         if self.context["is_wayland"] and (
             self.keycode_shortcut_postpone != 65 or self.keycode_shortcut_skip != 9
@@ -83,8 +84,8 @@ class BreakScreen:
                 )
             )
 
-        self.shortcut_disable_time = config.get("shortcut_disable_time", 2)
-        self.strict_break = config.get("strict_break", False)
+        self.shortcut_disable_time = settings.shortcut_disable_time
+        self.strict_break = settings.strict_break
 
     def skip_break(self):
         """Skip the break from the break screen."""
@@ -145,6 +145,22 @@ class SettingsDialog:
         self.switch_persist.set_active(config.get("persist_state"))
         self.infobar_long_break_shown = False
 
+        # Settings locked by the administrator can not be changed
+        for widget, key in (
+            (self.spin_short_break_duration, "short_break_duration"),
+            (self.spin_long_break_duration, "long_break_duration"),
+            (self.spin_short_break_interval, "short_break_interval"),
+            (self.spin_long_break_interval, "long_break_interval"),
+            (self.spin_time_to_prepare, "pre_break_warning_time"),
+            (self.spin_disable_keyboard_shortcut, "shortcut_disable_time"),
+            (self.switch_strict_break, "strict_break"),
+            (self.switch_random_order, "random_order"),
+            (self.switch_postpone, "allow_postpone"),
+            (self.switch_persist, "persist_state"),
+        ):
+            if config.is_locked(key):
+                widget.set_sensitive(False)
+
     def __create_break_item(self, break_config, is_short):
         """Create an entry for break to be listed in the break tab."""
         parent_box = self.box_long_breaks
@@ -322,8 +338,14 @@ class SettingsDialog:
         Enable or disable the self.spin_postpone_duration based on the
         state of the postpone switch.
         """
-        self.spin_postpone_duration.set_sensitive(self.switch_postpone.get_active())
-        self.dropdown_postpone_unit.set_sensitive(self.switch_postpone.get_active())
+        self.spin_postpone_duration.set_sensitive(
+            self.switch_postpone.get_active()
+            and not self.config.is_locked("postpone_duration")
+        )
+        self.dropdown_postpone_unit.set_sensitive(
+            self.switch_postpone.get_active()
+            and not self.config.is_locked("postpone_unit")
+        )
 
     def on_spin_short_break_interval_change(self, spin_button, *value):
         """Event handler for value change of short break interval."""
@@ -30,6 +30,7 @@ import re
 import sys
 import shutil
 import subprocess
+import tempfile
 import threading
 import typing
 from logging.handlers import RotatingFileHandler
@@ -58,11 +59,26 @@ STYLE_SHEET_DIRECTORY = os.path.join(CONFIG_DIRECTORY, "style")
 CONFIG_FILE_PATH = os.path.join(CONFIG_DIRECTORY, "safeeyes.json")
 CONFIG_RESOURCE = os.path.join(CONFIG_DIRECTORY, "resource")
 SESSION_FILE_PATH = os.path.join(CONFIG_DIRECTORY, "session.json")
+HISTORY_FILE_PATH = os.path.join(CONFIG_DIRECTORY, "history.sqlite")
+BREAKS_DIRECTORY = os.path.join(CONFIG_DIRECTORY, "breaks.d")
+CACHE_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(HOME_DIRECTORY, ".cache"),
+    "safeeyes",
+)
+STARTUP_CACHE_PATH = os.path.join(CACHE_DIRECTORY, "startup.json")
+# increase when the content of the startup cache changes
+STARTUP_CACHE_VERSION = 1
+DEPENDENCY_CACHE_PATH = os.path.join(CACHE_DIRECTORY, "dependencies.json")
+# increase when the content of the dependency cache changes
+DEPENDENCY_CACHE_VERSION = 2
 OLD_STYLE_SHEET_PATH = os.path.join(STYLE_SHEET_DIRECTORY, "safeeyes_style.css")
 CUSTOM_STYLE_SHEET_PATH = os.path.join(
     STYLE_SHEET_DIRECTORY, "safeeyes_custom_style.css"
 )
 SYSTEM_CONFIG_FILE_PATH = os.path.join(BIN_DIRECTORY, "config/safeeyes.json")
+# config layers set by the administrator, between the system and the user config,
+# in increasing order of precedence
+POLICY_CONFIG_FILE_PATHS = [os.path.join("/etc", "safeeyes", "safeeyes.json")]
 SYSTEM_STYLE_SHEET_PATH = os.path.join(BIN_DIRECTORY, "config/style/safeeyes_style.css")
 LOG_FILE_PATH = os.path.join(HOME_DIRECTORY, "safeeyes.log")
 SYSTEM_PLUGINS_DIR = os.path.join(BIN_DIRECTORY, "plugins")
@@ -162,13 +178,103 @@ def load_json(json_path):
     return json_obj
 
 
-def write_json(json_path, json_obj):
-    """Write the JSON object at the given path."""
+# path -> ((st_mtime_ns, st_size), content) of the config layers read so far
+__config_layers: dict[str, tuple[tuple[int, int], typing.Optional[dict]]] = {}
+
+
+def load_config_layer(json_path) -> typing.Optional[dict]:
+    """Load a config layer from the given path.
+
+    The parsed layer is reused as long as the file does not change, so it must not
+    be modified.
+    """
+    try:
+        stat_result = os.stat(json_path)
+    except OSError:
+        __config_layers.pop(json_path, None)
+        return None
+    stat = (stat_result.st_mtime_ns, stat_result.st_size)
+
+    cached = __config_layers.get(json_path)
+    if cached is not None and cached[0] == stat:
+        return cached[1]
+
+    layer = load_json(json_path)
+    if layer is not None and not isinstance(layer, dict):
+        logging.warning("Ignoring the config %s, it is not an object", json_path)
+        layer = None
+    __config_layers[json_path] = (stat, layer)
+    return layer
+
+
+def write_json(json_path, json_obj) -> bool:
+    """Write the JSON object at the given path.
+
+    The file is not written if its content would not change. Otherwise, the file is
+    replaced atomically, so that it is never left half-written. Return whether the
+    file was written.
+    """
     try:
-        with open(json_path, "w") as json_file:
-            json.dump(json_obj, json_file, indent=4, sort_keys=True)
+        content = json.dumps(json_obj, indent=4, sort_keys=True).encode("utf-8")
     except BaseException:
-        pass
+        logging.exception("Failed to write %s", json_path)
+        return False
+    return write_file(json_path, content)
+
+
+# the umask of the process, read once as it can only be read by changing it
+__umask = os.umask(0o022)
+os.umask(__umask)
+
+
+def write_file(file_path, content: bytes) -> bool:
+    """Replace the file at the given path with the content, like write_json."""
+    # Replace the target of a symlink, not the symlink itself
+    file_path = os.path.realpath(file_path)
+    directory = os.path.dirname(file_path)
+    try:
+        if os.path.isfile(file_path):
+            if sha256sum(file_path) == hashlib.sha256(content).hexdigest():
+                return False
+
+        # Every write uses its own temporary file, writes may happen from several
+        # threads
+        (fd, temp_path) = tempfile.mkstemp(
+            prefix=os.path.basename(file_path) + ".", suffix=".tmp", dir=directory
+        )
+    except OSError:
+        logging.exception("Failed to write %s", file_path)
+        return False
+
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        else:
+            # mkstemp creates the file only readable by the user
+            os.chmod(temp_path, 0o666 & ~__umask)
+        os.replace(temp_path, file_path)
+    except BaseException as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if not isinstance(e, OSError):
+            raise
+        logging.exception("Failed to write %s", file_path)
+        return False
+
+    # Make the rename itself durable
+    try:
+        directory_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+    except OSError:
+        logging.exception("Failed to sync %s", directory)
+    return True
 
 
 def delete(file_path):
@@ -179,8 +285,108 @@ def delete(file_path):
         pass
 
 
+# plugin id -> {"key": ..., "result": ...}, None until the cache file is read
+__dependency_cache: typing.Optional[dict[str, dict]] = None
+# whether __dependency_cache changed since it was written
+__dependency_cache_dirty = False
+
+
 def check_plugin_dependencies(plugin_id, plugin_config, plugin_settings, plugin_path):
-    """Check the plugin dependencies."""
+    """Check the plugin dependencies.
+
+    The result is cached in DEPENDENCY_CACHE_PATH, as long as the plugin, the
+    directories in $PATH and sys.path, and the desktop environment do not change.
+    Retryable errors are not cached, and neither is the result of plugins that set
+    "cacheable": false in their dependencies, because they check something else,
+    like a running service. The cache is written by save_dependency_cache.
+    """
+    global __dependency_cache
+    global __dependency_cache_dirty
+    from safeeyes.model import PluginDependency
+
+    if not plugin_config["dependencies"].get("cacheable", True):
+        return __check_plugin_dependencies(
+            plugin_id, plugin_config, plugin_settings, plugin_path
+        )
+
+    if __dependency_cache is None:
+        cache = load_json(DEPENDENCY_CACHE_PATH)
+        if (
+            isinstance(cache, dict)
+            and cache.get("version") == DEPENDENCY_CACHE_VERSION
+            and isinstance(cache.get("plugins"), dict)
+        ):
+            __dependency_cache = cache["plugins"]
+        else:
+            __dependency_cache = {}
+
+    key = __dependency_cache_key(plugin_config, plugin_settings, plugin_path)
+    cached = __dependency_cache.get(plugin_id)
+    if cached is not None and cached.get("key") == key:
+        dependency = cached.get("dependency")
+        if isinstance(dependency, dict):
+            return PluginDependency(
+                message=dependency["message"], link=dependency.get("link")
+            )
+        return cached.get("result")
+
+    result = __check_plugin_dependencies(
+        plugin_id, plugin_config, plugin_settings, plugin_path
+    )
+    if result is None or isinstance(result, str):
+        __dependency_cache[plugin_id] = {"key": key, "result": result}
+    elif isinstance(result, PluginDependency) and not result.retryable:
+        __dependency_cache[plugin_id] = {
+            "key": key,
+            "dependency": {"message": result.message, "link": result.link},
+        }
+    elif __dependency_cache.pop(plugin_id, None) is None:
+        # Not cached before either, nothing to write
+        return result
+    __dependency_cache_dirty = True
+    return result
+
+
+def save_dependency_cache() -> None:
+    """Write the results of check_plugin_dependencies, if they changed."""
+    global __dependency_cache_dirty
+    if not __dependency_cache_dirty or __dependency_cache is None:
+        return
+    __dependency_cache_dirty = False
+    try:
+        mkdir(CACHE_DIRECTORY)
+    except OSError:
+        return
+    write_json(
+        DEPENDENCY_CACHE_PATH,
+        {"version": DEPENDENCY_CACHE_VERSION, "plugins": __dependency_cache},
+    )
+
+
+def __dependency_cache_key(plugin_config, plugin_settings, plugin_path) -> list:
+    # Installing a command or a Python module changes the mtime of the directory
+    # it is installed to, so only the directories have to be checked
+    path_dirs = os.environ.get("PATH", os.defpath).split(os.pathsep)
+    return [
+        plugin_config["meta"]["version"],
+        # the plugin manager adds the path of the plugin to the settings
+        {key: value for key, value in plugin_settings.items() if key != "path"},
+        __stat_key(os.path.join(plugin_path, "config.json")),
+        __stat_key(os.path.join(plugin_path, "dependency_checker.py")),
+        __stat_key(CONFIG_RESOURCE),
+        [__stat_key(path) for path in path_dirs if path],
+        [__stat_key(path) for path in sys.path if path],
+        DESKTOP_ENVIRONMENT,
+        IS_WAYLAND,
+        # the messages are translated
+        [
+            os.environ.get(name)
+            for name in ("LANGUAGE", "LC_ALL", "LC_MESSAGES", "LANG")
+        ],
+    ]
+
+
+def __check_plugin_dependencies(plugin_id, plugin_config, plugin_settings, plugin_path):
     from safeeyes.translations import translate as _
 
     # Check the desktop environment
@@ -392,16 +598,24 @@ def sha256sum(filename):
 
 
 def load_css_file(style_sheet_path, priority, required=True):
+    """Add the stylesheet to the display, and return its provider."""
     if not os.path.isfile(style_sheet_path):
         if required:
             logging.warning("Failed loading required stylesheet")
-        return
+        return None
 
     css_provider = Gtk.CssProvider()
     css_provider.load_from_path(style_sheet_path)
 
     display = Gdk.Display.get_default()
     Gtk.StyleContext.add_provider_for_display(display, css_provider, priority)
+    return css_provider
+
+
+def unload_css_provider(css_provider):
+    """Remove a provider returned by load_css_file from the display."""
+    display = Gdk.Display.get_default()
+    Gtk.StyleContext.remove_provider_for_display(display, css_provider)
 
 
 def initialize_safeeyes():
@@ -610,6 +824,11 @@ def initialize_logging(debug):
         root_logger.propagate = False
 
 
+# plugin id -> (config.json of the plugin, plugins directory), for the plugins that
+# were read by merge_plugins or restored from the startup cache
+__plugin_configs: dict[str, tuple[dict, str]] = {}
+
+
 def __open_plugin_config(plugins_dir, plugin_id):
     """Open the given plugin's configuration."""
     plugin_config_path = os.path.join(plugins_dir, plugin_id, "config.json")
@@ -617,7 +836,22 @@ def __open_plugin_config(plugins_dir, plugin_id):
     if not os.path.isfile(plugin_config_path) or not os.path.isfile(plugin_module_path):
         # Either the config.json or plugin.py is not available
         return None
-    return load_json(plugin_config_path)
+    plugin_config = load_json(plugin_config_path)
+    if plugin_config is not None:
+        __plugin_configs[plugin_id] = (plugin_config, plugins_dir)
+    return plugin_config
+
+
+def forget_plugin_config(plugin_id) -> None:
+    """Read the config.json of the given plugin again the next time it is needed."""
+    __plugin_configs.pop(plugin_id, None)
+
+
+def get_plugin_config(plugin_id) -> typing.Optional[tuple[dict, str]]:
+    """Return the config.json and the plugins directory of the given plugin, if
+    they were read already.
+    """
+    return __plugin_configs.get(plugin_id)
 
 
 def __update_plugin_config(plugin, plugin_config, config):
@@ -703,6 +937,71 @@ def merge_plugins(config):
         __add_plugin_config(plugin_id, plugin_config, config)
 
 
+def __stat_key(path) -> list:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path, None]
+    return [path, stat.st_mtime_ns, stat.st_ino, stat.st_size]
+
+
+def startup_cache_key() -> list:
+    """Return the state of the files the merged config is read from.
+
+    This only needs to stat the files, not to read them.
+    """
+    paths = [CONFIG_FILE_PATH, SYSTEM_CONFIG_FILE_PATH]
+    for plugins_dir in (SYSTEM_PLUGINS_DIR, USER_PLUGINS_DIR):
+        paths.append(plugins_dir)
+        try:
+            plugin_ids = sorted(os.listdir(plugins_dir))
+        except OSError:
+            continue
+        for plugin_id in plugin_ids:
+            # Files in the plugin directory are replaced when a plugin is updated,
+            # but config.json may also be edited in place
+            paths.append(os.path.join(plugins_dir, plugin_id))
+            paths.append(os.path.join(plugins_dir, plugin_id, "config.json"))
+    return [__stat_key(path) for path in paths]
+
+
+def load_startup_cache(key) -> typing.Optional[dict]:
+    """Load the merged config stored by write_startup_cache, if the key matches.
+
+    The cached plugin configs are returned by get_plugin_config afterwards.
+    """
+    cache = load_json(STARTUP_CACHE_PATH)
+    if (
+        not isinstance(cache, dict)
+        or cache.get("version") != STARTUP_CACHE_VERSION
+        or cache.get("key") != key
+    ):
+        return None
+
+    for plugin_id, (plugin_config, plugins_dir) in cache["plugins"].items():
+        __plugin_configs[plugin_id] = (plugin_config, plugins_dir)
+    logging.info("Using the cached configuration")
+    return cache
+
+
+def write_startup_cache(key, user_config, system_config):
+    """Store the merged config and the plugin configs read while merging it."""
+    try:
+        mkdir(CACHE_DIRECTORY)
+    except OSError:
+        return
+    write_json(
+        STARTUP_CACHE_PATH,
+        {
+            "version": STARTUP_CACHE_VERSION,
+            "key": key,
+            "user_config": user_config,
+            "system_config": system_config,
+            "plugins": __plugin_configs,
+        },
+    )
+
+
 def open_session():
     """Open the last session."""
     logging.info("Reading the session file")